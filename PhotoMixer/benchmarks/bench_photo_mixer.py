@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the PhotoMixer hot paths
+
+Times and memory-profiles background removal, resizing, every blend mode,
+opacity handling, linear-light compositing and end-to-end mix_photos on
+synthetic images. Results are written as JSON. When
+a baseline exists, the run fails if any case got slower or hungrier than the
+configured thresholds.
+
+Peak memory is measured with tracemalloc, which sees NumPy and Python
+allocations but not Pillow's internal image buffers.
+
+Usage:
+  python benchmarks/bench_photo_mixer.py                      # 1, 12, 24, 100 MP
+  python benchmarks/bench_photo_mixer.py --megapixels 1 12 --cases remove_background
+  python benchmarks/bench_photo_mixer.py --save-baseline      # record a new baseline
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import PIL
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+import photo_mixer
+from compositing import composite
+from synthetic import make_background, make_foreground, make_large
+
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+BLEND_FUNCTIONS = {
+    "normal": photo_mixer.blend_with_alpha,
+    "multiply": photo_mixer.blend_mode_multiply,
+    "screen": photo_mixer.blend_mode_screen,
+    "overlay": photo_mixer.blend_mode_overlay,
+}
+
+
+class Inputs:
+    """Synthetic inputs for one image size, built once and shared by all cases."""
+
+    def __init__(self, megapixels, work_dir):
+        self.megapixels = megapixels
+        self.foreground = make_large(make_foreground, megapixels, seed=0)
+        self.background = make_large(make_background, megapixels, seed=1)
+        self.removed = photo_mixer.remove_background(self.foreground)
+        self.cutout = photo_mixer.resize_to_fit(self.removed, self.background)
+        # Faded in place by fade_point, which keeps alpha unchanged at 1.0
+        self.fade_target = self.cutout.copy()
+        self.position = (
+            (self.background.width - self.cutout.width) // 2,
+            (self.background.height - self.cutout.height) // 2,
+        )
+
+        self.background_path = os.path.join(work_dir, f"bg_{megapixels}.jpg")
+        self.foreground_path = os.path.join(work_dir, f"fg_{megapixels}.png")
+        self.output_path = os.path.join(work_dir, f"out_{megapixels}.jpg")
+        self.background.save(self.background_path, quality=95)
+        self.foreground.save(self.foreground_path, compress_level=1)
+        self._background16 = None
+
+    @property
+    def background16(self):
+        """The background scaled to 16 bits, built on first use."""
+        if self._background16 is None:
+            self._background16 = np.asarray(self.background).astype(np.uint16) * 257
+        return self._background16
+
+
+def _blend_16bit(inputs):
+    """Linear-light blend onto a copy of the 16-bit background."""
+    output = inputs.background16.copy()
+    composite(
+        output,
+        np.asarray(inputs.cutout),
+        inputs.position,
+        "normal",
+        "linear",
+        opacity=0.8,
+    )
+    return output
+
+
+def _blend_case(mode):
+    function = BLEND_FUNCTIONS[mode]
+    return lambda inputs: function(inputs.background, inputs.cutout, inputs.position)
+
+
+def _fade_with_point(foreground, opacity):
+    """The former opacity step: a Python callback per alpha level, then putalpha."""
+    alpha = foreground.split()[3].point(lambda p: int(p * opacity))
+    foreground.putalpha(alpha)
+    return foreground
+
+
+CASES = {
+    "remove_background": lambda inputs: photo_mixer.remove_background(
+        inputs.foreground
+    ),
+    "resize_to_fit": lambda inputs: photo_mixer.resize_to_fit(
+        inputs.removed, inputs.background
+    ),
+    **{f"blend_{mode}": _blend_case(mode) for mode in BLEND_FUNCTIONS},
+    # Opacity is folded into the blend; compare blend_faded with blend_normal
+    # plus fade_point, the separate alpha pass it replaced (per-pixel cost
+    # does not depend on the opacity value)
+    "fade_point": lambda inputs: _fade_with_point(inputs.fade_target, 1.0),
+    "blend_faded": lambda inputs: photo_mixer.blend_images(
+        inputs.background, inputs.cutout, inputs.position, "normal", opacity=0.8
+    ),
+    # Linear light costs two table lookups per channel on top of blend_faded;
+    # blend_linear_16 keeps the background at 16 bits throughout
+    "blend_linear": lambda inputs: photo_mixer.blend_images(
+        inputs.background,
+        inputs.cutout,
+        inputs.position,
+        "normal",
+        precision="linear",
+        opacity=0.8,
+    ),
+    "blend_linear_16": _blend_16bit,
+    "mix_photos": lambda inputs: photo_mixer.mix_photos(
+        inputs.background_path,
+        inputs.foreground_path,
+        inputs.output_path,
+        verbose=False,
+        exit_on_error=False,
+    ),
+    "mix_photos_linear": lambda inputs: photo_mixer.mix_photos(
+        inputs.background_path,
+        inputs.foreground_path,
+        inputs.output_path,
+        verbose=False,
+        exit_on_error=False,
+        precision="linear",
+    ),
+}
+
+
+def measure(case, inputs, repeat):
+    """Best and mean wall time over ``repeat`` runs, plus traced peak memory."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case(inputs)
+        timings.append(time.perf_counter() - started)
+
+    # A separate run, since tracing slows allocation-heavy code down
+    tracemalloc.start()
+    try:
+        case(inputs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(timings),
+        "mean_seconds": sum(timings) / len(timings),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+
+def environment():
+    """Versions and machine details recorded alongside the results."""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(megapixels, case_names, repeat):
+    """Run every selected case at every size and return the result records."""
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for mp in megapixels:
+            print(f"Preparing {mp} MP inputs...")
+            inputs = Inputs(mp, work_dir)
+            for name in case_names:
+                record = {"case": name, "megapixels": mp}
+                record.update(measure(CASES[name], inputs, repeat))
+                results.append(record)
+                print(
+                    f"  {name:<20} {record['seconds']:>8.3f}s"
+                    f" {record['peak_mb']:>9.1f} MB"
+                )
+            del inputs
+    return results
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """
+    Compare results against a baseline.
+
+    Returns:
+        List of human-readable regression descriptions (empty if none)
+    """
+    previous = {(r["case"], r["megapixels"]): r for r in baseline["results"]}
+    regressions = []
+
+    print(f"{'case':<20} {'MP':>5} {'time':>8} {'memory':>8}")
+    for record in results:
+        before = previous.get((record["case"], record["megapixels"]))
+        if before is None:
+            continue
+        time_ratio = record["seconds"] / max(before["seconds"], 1e-9)
+        memory_ratio = record["peak_mb"] / max(before["peak_mb"], 1e-9)
+        print(
+            f"{record['case']:<20} {record['megapixels']:>5}"
+            f" {time_ratio:>7.2f}x {memory_ratio:>7.2f}x"
+        )
+
+        label = f"{record['case']} @ {record['megapixels']} MP"
+        if time_ratio > 1 + time_threshold:
+            regressions.append(
+                f"{label}: {before['seconds']:.3f}s -> {record['seconds']:.3f}s"
+            )
+        # Ignore sub-megabyte noise in small cases
+        if (
+            memory_ratio > 1 + memory_threshold
+            and record["peak_mb"] - before["peak_mb"] > 1
+        ):
+            regressions.append(
+                f"{label}: {before['peak_mb']:.1f} MB -> {record['peak_mb']:.1f} MB"
+            )
+    return regressions
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as output:
+        json.dump(data, output, indent=2)
+        output.write("\n")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Benchmark suite for the PhotoMixer hot paths",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--megapixels",
+        type=float,
+        nargs="+",
+        default=[1, 12, 24, 100],
+        help="Image sizes to benchmark (default: 1 12 24 100)",
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=list(CASES),
+        default=list(CASES),
+        help="Cases to run (default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case")
+    parser.add_argument(
+        "--output", default=DEFAULT_RESULTS, help="Where to write the JSON results"
+    )
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare with"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Also write these results as the new baseline",
+    )
+    parser.add_argument(
+        "--time-threshold",
+        type=float,
+        default=0.20,
+        help="Allowed slowdown before failing, as a fraction (default: 0.20)",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        default=0.10,
+        help="Allowed peak-memory growth before failing, as a fraction (default: 0.10)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    megapixels = [int(mp) if mp == int(mp) else mp for mp in args.megapixels]
+
+    data = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": environment(),
+        "repeat": args.repeat,
+        "results": run(megapixels, args.cases, args.repeat),
+    }
+    write_json(args.output, data)
+    print(f"✓ Results written to {args.output}")
+
+    if args.save_baseline:
+        write_json(args.baseline, data)
+        print(f"✓ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found - run with --save-baseline to record one")
+        return
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(
+        data["results"], baseline, args.time_threshold, args.memory_threshold
+    )
+    if regressions:
+        print("✗ Performance regressions:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
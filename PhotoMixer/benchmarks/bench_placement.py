@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Cost of automatic placement on large backgrounds
+
+For each background size, times building the saliency map (once per
+background), fetching it from the cache, and scoring the default candidate
+positions and scales, then the whole mix with centered and with automatic
+placement. Fails when scoring takes longer than the budget.
+
+Usage:
+  python benchmarks/bench_placement.py
+  python benchmarks/bench_placement.py --megapixels 1 12 24 48 --budget 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from photo_mixer import fit_size, mix_images
+from placement import SaliencyCache, SaliencyMap, choose_placement
+from synthetic import (
+    make_background,
+    make_foreground,
+    make_large,
+    size_for_megapixels,
+)
+
+
+def best_time(repeat, function, *args, **kwargs):
+    """Best wall time of function(*args, **kwargs) in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--megapixels",
+        type=float,
+        nargs="+",
+        default=[1, 12, 24],
+        help="Background sizes (default: 1 12 24)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=10,
+        help="Most ms scoring the candidates may take (default: 10)",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"  {'MP':>5} {'map':>9} {'cached':>9} {'scoring':>9} {'candidates':>10} "
+        f"{'center mix':>10} {'auto mix':>10}"
+    )
+    failed = False
+    for mp in args.megapixels:
+        background = make_large(make_background, mp, seed=1)
+        width, height = size_for_megapixels(mp)
+        foreground = make_foreground(width // 2, height // 2, seed=0)
+        frame_size = fit_size(foreground.size, background.size)
+        subject_box = (0, 0, *frame_size)
+
+        cache = SaliencyCache()
+        key = ("bench", mp)
+        build = best_time(args.repeat, SaliencyMap.from_image, background)
+        saliency = cache.get(background, key)
+        cached = best_time(args.repeat, cache.get, background, key)
+        scoring = best_time(
+            args.repeat, choose_placement, saliency, frame_size, subject_box
+        )
+        candidates = choose_placement(saliency, frame_size, subject_box).candidates
+        center = best_time(args.repeat, mix_images, background, foreground)
+        auto = best_time(
+            args.repeat, mix_images, background, foreground, placement="auto"
+        )
+
+        ok = scoring * 1000 <= args.budget
+        failed |= not ok
+        print(
+            f"{'✓' if ok else '✗'} {mp:>5g} {build * 1000:>6.1f} ms "
+            f"{cached * 1000:>6.3f} ms {scoring * 1000:>6.2f} ms {candidates:>10} "
+            f"{center:>9.3f}s {auto:>9.3f}s"
+        )
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Throughput of MixPool with shared-memory and pickled image transport
+
+One decoded background is mixed with the same foreground several times on a
+process pool, once per transport. The shared background is copied into
+shared memory once up front; the foreground is staged per job. Reports the
+wall time per job, the worker's own time per job (the difference is
+transport and scheduling overhead), and the bytes per job that went through
+the pool's pipes or were copied.
+
+Usage:
+  python benchmarks/bench_pool.py
+  python benchmarks/bench_pool.py --megapixels 24 --workers 4 --jobs 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from pool import TRANSPORTS, MixPool
+from synthetic import (
+    make_background,
+    make_foreground,
+    make_large,
+    size_for_megapixels,
+)
+
+
+def measure(transport, background, foreground, workers, jobs):
+    """Wall and worker seconds per job, and the last job's TransferStats."""
+    with MixPool(workers=workers, transport=transport) as pool:
+        shared = pool.share(background) if transport == "shared" else background
+        # Warm the workers up so pool start-up is not timed
+        list(pool.map([(shared, foreground)] * pool.workers))
+
+        started = time.perf_counter()
+        results = list(pool.map([(shared, foreground)] * jobs))
+        elapsed = time.perf_counter() - started
+        if transport == "shared":
+            shared.close()
+    worker_seconds = sum(result.stats.seconds for result in results)
+    return elapsed / jobs, worker_seconds / jobs, results[-1].stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--megapixels",
+        type=float,
+        nargs="+",
+        default=[1, 24],
+        help="Background sizes (default: 1 24)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: CPUs)"
+    )
+    parser.add_argument("--jobs", type=int, default=4, help="Timed jobs per case")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"  {workers} worker(s), {args.jobs} job(s) per case")
+    print(
+        f"  {'MP':>4} {'transport':<9} {'per job':>8} {'worker':>8} "
+        f"{'piped MB':>9} {'copied MB':>10}"
+    )
+    for mp in args.megapixels:
+        background = np.asarray(make_large(make_background, mp, seed=1))
+        width, height = size_for_megapixels(mp / 4)
+        foreground = np.asarray(make_foreground(width, height, seed=0))
+        for transport in TRANSPORTS:
+            per_job, worker, stats = measure(
+                transport, background, foreground, workers, args.jobs
+            )
+            print(
+                f"  {mp:>4} {transport:<9} {per_job:>7.3f}s {worker:>7.3f}s "
+                f"{stats.pickled_bytes / 1e6:>9.1f} {stats.copied_bytes / 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark and golden-image check for remove_background
+
+Compares the current implementation against golden alpha masks produced by
+the original implementation, then times the original ("before") against the
+current one ("after").
+
+Usage:
+  python benchmarks/bench_remove_background.py              # check + benchmark
+  python benchmarks/bench_remove_background.py --check      # golden check only
+  python benchmarks/bench_remove_background.py --update-golden
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from photo_mixer import remove_background
+from synthetic import make_foreground, size_for_megapixels
+
+GOLDEN_DIR = os.path.join(BENCH_DIR, "golden")
+GOLDEN_CASES = [
+    ("studio", 320, 240, 0),
+    ("portrait", 240, 360, 1),
+    ("tiny", 9, 7, 2),
+]
+GOLDEN_THRESHOLDS = [0, 15, 30, 60, 100]
+
+
+def golden_path(name, threshold):
+    return os.path.join(GOLDEN_DIR, f"remove_background_{name}_t{threshold}.png")
+
+
+def golden_inputs():
+    for name, width, height, seed in GOLDEN_CASES:
+        image = make_foreground(width, height, seed)
+        for threshold in GOLDEN_THRESHOLDS:
+            yield name, image, threshold
+
+
+def update_golden():
+    """Regenerate golden masks from the original implementation."""
+    from reference import remove_background as reference_remove_background
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name, image, threshold in golden_inputs():
+        mask = reference_remove_background(image, threshold).getchannel("A")
+        mask.save(golden_path(name, threshold), optimize=True)
+        print(f"  ✓ {golden_path(name, threshold)}")
+
+
+def check_golden():
+    """Compare current masks with the golden masks. Returns True if all match."""
+    ok = True
+    for name, image, threshold in golden_inputs():
+        expected = np.array(Image.open(golden_path(name, threshold)))
+        actual = np.array(remove_background(image, threshold).getchannel("A"))
+        mismatches = int(np.count_nonzero(expected != actual))
+        status = "✓" if mismatches == 0 else "✗"
+        print(f"  {status} {name} threshold={threshold}: {mismatches} mismatched px")
+        ok = ok and mismatches == 0
+    return ok
+
+
+def time_call(function, image, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(image, 30)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark(megapixels, repeat):
+    """Time the original and current implementations at several sizes."""
+    try:
+        from reference import remove_background as reference_remove_background
+    except ImportError:
+        reference_remove_background = None
+        print("  (SciPy not installed - skipping the 'before' timings)")
+
+    print(f"  {'MP':>5} {'before':>9} {'after':>9} {'speedup':>8}")
+    for mp in megapixels:
+        image = make_foreground(*size_for_megapixels(mp), seed=0)
+        after = time_call(remove_background, image, repeat)
+        if reference_remove_background is None:
+            print(f"  {mp:>5} {'-':>9} {after:>8.3f}s {'-':>8}")
+            continue
+        before = time_call(reference_remove_background, image, repeat)
+        print(f"  {mp:>5} {before:>8.3f}s {after:>8.3f}s {before / after:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="Golden check only")
+    parser.add_argument(
+        "--update-golden",
+        action="store_true",
+        help="Regenerate golden masks from the original implementation",
+    )
+    parser.add_argument(
+        "--megapixels",
+        type=float,
+        nargs="+",
+        default=[1, 12, 24],
+        help="Image sizes to benchmark (default: 1 12 24)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        update_golden()
+        return
+
+    print("Golden check:")
+    if not check_golden():
+        print("✗ Output differs from the original implementation")
+        sys.exit(1)
+
+    if not args.check:
+        print(f"Benchmark (best of {args.repeat}):")
+        benchmark(args.megapixels, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Load test for server mode
+
+Sends concurrent /mix requests to a running server and reports throughput,
+client-side p50/p99 latency and the server's own /stats.
+
+Usage:
+  python src/photo_mixer.py --serve --workers 4 &
+  python benchmarks/bench_server.py bg.jpg fg.png --requests 200 --concurrency 8
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from server import DEFAULT_HOST, DEFAULT_PORT, percentile
+
+
+def multipart_body(files, fields):
+    """Encode files ({name: bytes}) and fields ({name: str}) as form data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, data in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+            f'filename="{name}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode()
+            + data
+            + b"\r\n"
+        )
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            f"\r\n\r\n{value}\r\n".encode()
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def send(host, port, method, path, body=None, content_type=None):
+    """Send one request on a fresh connection; returns (status, body, seconds)."""
+    headers = {"Connection": "close"}
+    if content_type:
+        headers["Content-Type"] = content_type
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection(host, port, timeout=300)
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+    finally:
+        connection.close()
+    return response.status, data, time.perf_counter() - started
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load test for server mode")
+    parser.add_argument("background", help="Background image to upload")
+    parser.add_argument("foreground", help="Foreground image to upload")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--requests", "-n", type=int, default=50)
+    parser.add_argument("--concurrency", "-c", type=int, default=4)
+    parser.add_argument("--blend-mode", default="normal")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    with (
+        open(args.background, "rb") as background,
+        open(args.foreground, "rb") as foreground,
+    ):
+        files = {"background": background.read(), "foreground": foreground.read()}
+    body, content_type = multipart_body(files, {"blend_mode": args.blend_mode})
+
+    def request(_):
+        return send(args.host, args.port, "POST", "/mix", body, content_type)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(seconds for status, _, seconds in results if status == 200)
+
+    print(f"Requests: {args.requests} at concurrency {args.concurrency}")
+    print(f"  Statuses: {statuses}")
+    print(f"  Throughput: {statuses.get(200, 0) / elapsed:.2f} images/sec")
+    if latencies:
+        print(f"  Client p50: {percentile(latencies, 0.50) * 1000:.1f} ms")
+        print(f"  Client p99: {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+    _, stats, _ = send(args.host, args.port, "GET", "/stats")
+    print(f"  Server stats: {json.dumps(json.loads(stats))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Start-up time of the photo_mixer CLI on paths that never touch an image
+
+Runs ``--help``, an unknown option and a missing input file in fresh
+interpreters and reports the best time of each, less the time a bare
+interpreter takes to start. Fails when any of them is over the budget, or
+when importing photo_mixer loads one of the heavy dependencies that should
+only be loaded by the stages that use them.
+
+Usage:
+  python benchmarks/bench_startup.py
+  python benchmarks/bench_startup.py --runs 20 --budget 80
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+SCRIPT = os.path.join(SRC_DIR, "photo_mixer.py")
+
+# Modules importing photo_mixer must not load
+HEAVY_MODULES = ("numpy", "PIL.Image", "scipy", "multiprocessing", "concurrent.futures")
+
+CASES = [
+    ("help", [SCRIPT, "--help"]),
+    ("bad_option", [SCRIPT, "--no-such-option"]),
+    ("missing_file", [SCRIPT, "-b", "missing.jpg", "-f", "missing.png"]),
+    ("import", ["-c", "import photo_mixer"]),
+]
+
+
+def best_time(args, runs):
+    """Best wall time in ms of running the interpreter with args."""
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], cwd=SRC_DIR, capture_output=True, check=False
+        )
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def heavy_imports():
+    """Heavy modules that importing photo_mixer loads."""
+    code = (
+        "import sys, photo_mixer\n"
+        f"print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return output.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Runs per case")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=150,
+        help="Most ms each case may take over a bare interpreter (default: 150)",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    loaded = heavy_imports()
+    if loaded:
+        print(f"  ✗ importing photo_mixer loads {', '.join(loaded)}")
+        failed = True
+    else:
+        print("  ✓ importing photo_mixer loads no heavy dependencies")
+
+    bare = best_time(["-c", "pass"], args.runs)
+    print(f"  bare interpreter: {bare:.0f} ms")
+    for name, case_args in CASES:
+        extra = best_time(case_args, args.runs) - bare
+        ok = extra <= args.budget
+        failed |= not ok
+        print(f"  {'✓' if ok else '✗'} {name:<13} +{extra:>5.0f} ms")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Scaling of a single mix_images call from 1 to N threads
+
+Mixes one synthetic foreground onto one background with every thread count
+and reports the best wall time of the whole mix and of its three threaded
+stages (background removal, resizing and blending), with the speed-up over
+one thread. Every result is checked to be identical to the one-thread result.
+
+Usage:
+  python benchmarks/bench_threads.py
+  python benchmarks/bench_threads.py --megapixels 24 --threads 1 2 4 8 16 32
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from instrumentation import StageCollector
+from photo_mixer import mix_images
+from synthetic import (
+    make_background,
+    make_foreground,
+    make_large,
+    size_for_megapixels,
+)
+
+STAGES = ("remove_background", "resize", "blend")
+
+
+def measure(background, foreground, threads, repeat):
+    """Best total and per-stage seconds, and the result of the last run."""
+    best = {name: float("inf") for name in ("total",) + STAGES}
+    for _ in range(repeat):
+        collector = StageCollector()
+        started = time.perf_counter()
+        result = mix_images(background, foreground, threads=threads, hooks=[collector])
+        best["total"] = min(best["total"], time.perf_counter() - started)
+        for record in collector.records:
+            if record.stage in best:
+                best[record.stage] = min(best[record.stage], record.wall_seconds)
+    return best, np.asarray(result)
+
+
+def default_threads():
+    """1, 2, 4, ... up to the CPU count (which is always included)."""
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cpus:
+        counts.append(counts[-1] * 2)
+    if cpus > 1:
+        counts.append(cpus)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--megapixels",
+        type=float,
+        nargs="+",
+        default=[12],
+        help="Background sizes; the foreground is the same size (default: 12)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=default_threads(),
+        help="Thread counts to time (default: 1, 2, 4, ... up to the CPU count)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    args = parser.parse_args()
+
+    print(f"  {os.cpu_count()} CPU(s)")
+    for mp in args.megapixels:
+        background = make_large(make_background, mp, seed=1)
+        width, height = size_for_megapixels(mp)
+        foreground = make_foreground(width, height, seed=0)
+        print(f"\n  {mp} MP")
+        print(
+            f"  {'threads':>7} {'total':>8} {'speed-up':>8} "
+            + " ".join(f"{name:>17}" for name in STAGES)
+        )
+        baseline = None
+        for threads in args.threads:
+            best, result = measure(background, foreground, threads, args.repeat)
+            if baseline is None:
+                baseline, expected = best, result
+            elif not np.array_equal(result, expected):
+                print(f"  ✗ {threads} threads changed the result")
+                sys.exit(1)
+            stages = " ".join(
+                f"{best[name]:>7.3f}s ({baseline[name] / best[name]:>4.1f}x)"
+                for name in STAGES
+            )
+            speedup = baseline["total"] / best["total"]
+            print(f"  {threads:>7} {best['total']:>7.3f}s {speedup:>7.1f}x {stages}")
+
+
+if __name__ == "__main__":
+    main()
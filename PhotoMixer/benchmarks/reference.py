@@ -0,0 +1,173 @@
+"""
+Reference - The original remove_background, kept verbatim as the "before"
+implementation for equivalence checks and benchmarks. Requires SciPy.
+"""
+
+import numpy as np
+from PIL import Image
+from scipy import ndimage
+
+
+def remove_background(image, threshold=30, corner_samples=10):
+    """
+    Aggressively remove background from image, keeping only the subject.
+    Uses multiple aggressive detection methods.
+
+    Args:
+        image: PIL Image (will be converted to RGBA)
+        threshold: Color difference threshold for background detection (0-255)
+        corner_samples: Number of pixels to sample from corners for background color
+    """
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+
+    img_array = np.array(image).astype(np.float32)
+    height, width = img_array.shape[:2]
+    img_rgb = img_array[:, :, :3]
+
+    # Calculate lightness and saturation for all pixels
+    lightness = np.mean(img_rgb, axis=2)
+    saturation = np.std(img_rgb, axis=2)
+
+    # AGGRESSIVE METHOD: Remove all light/gray areas (common office backgrounds)
+    # 1. Remove very light areas (lightness > 180) - these are almost certainly background
+    very_light_mask = lightness > (
+        200 - threshold * 0.5
+    )  # More aggressive with lower threshold
+
+    # 2. Remove low saturation areas (grayish backgrounds) that are also light
+    gray_background = (saturation < 25) & (lightness > 160)
+
+    # 3. Sample edges to find background color
+    edge_width = max(10, min(30, width // 8, height // 8))
+    edge_pixels = []
+
+    # Sample all edges more aggressively
+    if edge_width > 0:
+        edge_pixels.extend(img_array[0:edge_width, :].reshape(-1, 4)[:, :3])
+        edge_pixels.extend(
+            img_array[height - edge_width : height, :].reshape(-1, 4)[:, :3]
+        )
+        edge_pixels.extend(img_array[:, 0:edge_width].reshape(-1, 4)[:, :3])
+        edge_pixels.extend(
+            img_array[:, width - edge_width : width].reshape(-1, 4)[:, :3]
+        )
+
+    if len(edge_pixels) > 0:
+        edge_pixels = np.array(edge_pixels)
+        bg_color = np.median(edge_pixels, axis=0)
+
+        # Calculate color difference from background
+        color_diff = np.sqrt(np.sum((img_rgb - bg_color) ** 2, axis=2))
+        color_similar = color_diff < threshold
+
+        # Combine: background is similar to edge color OR very light OR gray
+        background_mask = color_similar | very_light_mask | gray_background
+    else:
+        # Fallback: just use lightness and saturation
+        background_mask = very_light_mask | gray_background
+        color_diff = np.zeros((height, width))
+
+    # FIRST: Identify and protect subject areas BEFORE removing background
+    # Subject typically has: medium to dark colors, some saturation, different from edges
+    subject_criteria = (
+        (lightness < 220)  # Not too light (but allow some light skin tones)
+        & (saturation > 10)  # Has some color (not pure gray)
+    )
+
+    # If we have background color, subject should be different from it
+    if len(edge_pixels) > 0:
+        subject_criteria = subject_criteria & (color_diff > threshold * 0.5)
+
+    # Additional protection: very dark or very colorful areas are definitely subject
+    very_dark = lightness < 120
+    very_colorful = saturation > 25
+    definitely_subject = very_dark | very_colorful
+
+    # Combine subject protection
+    subject_mask = subject_criteria | definitely_subject
+
+    # Start with all background as transparent, but PROTECT subject
+    final_alpha = np.where(background_mask & ~subject_mask, 0.0, 1.0)
+
+    # Make sure subject areas stay fully opaque
+    final_alpha = np.where(subject_mask, 1.0, final_alpha)
+
+    # Remove everything near edges that looks like background, BUT protect subject
+    edge_distance = np.minimum(
+        np.minimum(np.arange(height)[:, None], np.arange(width)[None, :]),
+        np.minimum(
+            height - 1 - np.arange(height)[:, None],
+            width - 1 - np.arange(width)[None, :],
+        ),
+    )
+    near_edge = edge_distance < max(10, min(width, height) // 15)
+    # Near edges, remove light/gray areas ONLY if they're NOT subject
+    edge_background = near_edge & (very_light_mask | gray_background) & ~subject_mask
+    final_alpha = np.where(edge_background, 0.0, final_alpha)
+
+    # Smooth edges only for subject (not background)
+    # Only smooth areas that are partially transparent but might be subject
+    uncertain = (final_alpha > 0.1) & (final_alpha < 0.9)
+    if len(edge_pixels) > 0:
+        smooth_mask = np.clip((color_diff - threshold * 0.5) / (threshold * 1.5), 0, 1)
+        final_alpha = np.where(
+            uncertain, np.maximum(final_alpha, smooth_mask * 0.8), final_alpha
+        )
+
+    # Cleanup pass: Remove small background particles BUT protect subject
+    # Only clean up areas that are NOT clearly subject
+    uncertain_areas = ~subject_mask
+
+    # Remove small isolated background particles ONLY in uncertain areas
+    kernel_size = 2  # Smaller kernel to be less aggressive
+    if np.any(uncertain_areas):
+        binary_mask = final_alpha > 0.5
+        # Only process uncertain areas - don't touch subject
+        uncertain_mask = binary_mask & uncertain_areas
+        if np.any(uncertain_mask):
+            uncertain_cleaned = ndimage.binary_opening(
+                uncertain_mask, structure=np.ones((kernel_size, kernel_size))
+            )
+            # Apply only to uncertain areas, keep subject intact
+            final_alpha = np.where(
+                uncertain_areas & ~uncertain_cleaned & (final_alpha < 0.5),
+                0.0,
+                final_alpha,
+            )
+
+    # Fill small holes in subject (closing operation) - but be very careful
+    # Only close in areas that are mostly subject
+    if np.any(subject_mask):
+        subject_alpha = final_alpha > 0.7  # Only close in mostly-opaque areas
+        closed = ndimage.binary_closing(
+            subject_alpha,
+            structure=np.ones((2, 2)),  # Very small kernel
+        )
+        # Only fill tiny holes (areas that were subject but had small gaps)
+        small_holes = (
+            closed & ~subject_alpha & (final_alpha > 0.1) & (final_alpha < 0.5)
+        )
+        final_alpha = np.where(small_holes, 0.6, final_alpha)
+
+    # Additional cleanup: Remove light/gray particles ONLY if they're NOT subject
+    light_particles = (final_alpha < 0.3) & very_light_mask & ~subject_mask
+    gray_particles = (final_alpha < 0.3) & gray_background & ~subject_mask
+    final_alpha = np.where(light_particles | gray_particles, 0.0, final_alpha)
+
+    # Final pass: Remove pixels too similar to background, BUT protect subject
+    if len(edge_pixels) > 0:
+        too_similar = (
+            (color_diff < threshold * 0.7)
+            & (final_alpha < 0.8)
+            & ~subject_mask  # Don't remove if it's subject
+        )
+        final_alpha = np.where(too_similar, 0.0, final_alpha)
+
+    # Final protection: Ensure all subject areas are fully opaque
+    final_alpha = np.where(subject_mask, 1.0, final_alpha)
+
+    # Update alpha channel
+    img_array[:, :, 3] = (final_alpha * 255.0).astype(np.uint8)
+
+    return Image.fromarray(img_array.astype(np.uint8), "RGBA")
@@ -0,0 +1,401 @@
+"""
+Batch Mode - Mix many background/foreground pairs in one run over a process pool
+
+Each worker gets a few jobs at a time and writes every result on a background
+thread while it composites the next one.
+"""
+
+import csv
+import os
+import time
+from dataclasses import dataclass, field
+
+from cutout import CUTOUT_SUFFIX
+from encoding import Encoder, OutputOptions, output_paths
+from input_index import copy_render
+
+IMAGE_EXTENSIONS = (
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".webp",
+    ".bmp",
+    ".tif",
+    ".tiff",
+    ".ppm",
+    ".pgm",
+)
+
+# Most jobs handed to a worker at once; writing one result overlaps with
+# mixing the next only within a chunk
+MAX_CHUNK_SIZE = 4
+
+# mix_photos options that do not change the output, left out of render keys
+UNKEYED_OPTIONS = ("mask_cache", "hooks", "trace_memory", "threads")
+
+
+@dataclass
+class BatchJob:
+    """A single background/foreground pair to mix."""
+
+    background: str
+    foreground: str
+    output: str = None
+
+
+@dataclass
+class BatchResult:
+    """Aggregate outcome of a batch run."""
+
+    succeeded: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    elapsed: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    reused: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def throughput(self):
+        """Successfully mixed images per second of wall time."""
+        if self.elapsed <= 0:
+            return 0.0
+        return len(self.succeeded) / self.elapsed
+
+    def summary(self):
+        """Human-readable summary of the run."""
+        total = len(self.succeeded) + len(self.failed)
+        lines = [
+            f"Processed {total} pair(s) in {self.elapsed:.2f}s",
+            f"  ✓ Succeeded: {len(self.succeeded)}",
+            f"  ✗ Failed: {len(self.failed)}",
+            f"  Throughput: {self.throughput:.2f} images/sec",
+        ]
+        if self.cache_hits or self.cache_misses:
+            lines.append(
+                f"  Mask cache: {self.cache_hits} hit(s), {self.cache_misses} miss(es)"
+            )
+        if self.reused:
+            lines.append(f"  Reused earlier renders: {self.reused}")
+        if self.near_duplicates:
+            lines.append(f"  Near-duplicate inputs: {self.near_duplicates}")
+        for job, error in self.failed:
+            lines.append(f"    - {job.background} + {job.foreground}: {error}")
+        return "\n".join(lines)
+
+
+def list_images(directory, extensions=IMAGE_EXTENSIONS):
+    """List image files in a directory, sorted by name."""
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(extensions)
+        and os.path.isfile(os.path.join(directory, name))
+    ]
+
+
+def load_manifest(manifest_path):
+    """
+    Load batch jobs from a CSV manifest.
+
+    Each row is ``background,foreground[,output]``. Blank lines and lines
+    starting with ``#`` are ignored, as is a ``background,foreground`` header.
+    Relative paths are resolved against the manifest's directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+
+    with open(manifest_path, newline="") as manifest:
+        for row in csv.reader(manifest):
+            row = [column.strip() for column in row]
+            if not row or not row[0] or row[0].startswith("#"):
+                continue
+            if row[0].lower() == "background":
+                continue
+            if len(row) < 2:
+                raise ValueError(f"Manifest row needs background and foreground: {row}")
+
+            background = os.path.join(base_dir, row[0])
+            foreground = os.path.join(base_dir, row[1])
+            output = row[2] if len(row) > 2 and row[2] else None
+            jobs.append(BatchJob(background, foreground, output))
+
+    return jobs
+
+
+def cross_product_jobs(background_dir, foreground_dir):
+    """Build a job for every background x foreground combination."""
+    backgrounds = list_images(background_dir)
+    # Prepared cutouts (see photo_mixer.py --prepare) work as foregrounds too
+    foregrounds = list_images(foreground_dir, IMAGE_EXTENSIONS + (CUTOUT_SUFFIX,))
+    return [
+        BatchJob(background, foreground)
+        for background in backgrounds
+        for foreground in foregrounds
+    ]
+
+
+def output_name(filename):
+    """
+    Path of a job's output relative to the output directory.
+
+    Relative paths keep their subdirectories. Absolute paths and paths
+    leading out of the output directory are reduced to their file name.
+    """
+    name = os.path.normpath(filename)
+    if os.path.isabs(name) or name == os.pardir or name.startswith(os.pardir + os.sep):
+        return os.path.basename(name)
+    return name
+
+
+def _chunks(jobs, size):
+    """Group an iterable of jobs into lists of at most size jobs."""
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _run_chunk(chunk, mix_options, output_options):
+    """
+    Worker entry point: mix a few pairs, writing each in the background.
+
+    Returns:
+        (outcomes, stats): (error or None, seconds spent mixing) for every
+        (job, output_path) in the chunk, and the chunk's mask cache counters
+    """
+    # Imported in the worker so the module is loaded once per process
+    from photo_mixer import mix_photos
+
+    outcomes = []
+    with Encoder(output_options, threads=1) as encoder:
+        for job, output_path in chunk:
+            started = time.perf_counter()
+            try:
+                mix_photos(
+                    job.background,
+                    job.foreground,
+                    output_path,
+                    verbose=False,
+                    exit_on_error=False,
+                    encoder=encoder,
+                    **mix_options,
+                )
+            except Exception as error:
+                outcomes.append((error, None))
+            else:
+                outcomes.append((None, time.perf_counter() - started))
+
+        # Only mixed jobs were queued, in order
+        write_errors = iter(error for _, error in encoder.wait())
+        outcomes = [
+            (next(write_errors) if error is None else error, seconds)
+            for error, seconds in outcomes
+        ]
+
+    # The mask cache is pickled per chunk, so its counters cover this chunk only
+    mask_cache = mix_options.get("mask_cache")
+    return outcomes, {
+        "cache_hits": mask_cache.hits if mask_cache else 0,
+        "cache_misses": mask_cache.misses if mask_cache else 0,
+    }
+
+
+def run_batch(
+    jobs,
+    output_dir,
+    workers=None,
+    output_options=None,
+    chunk_size=None,
+    index=None,
+    **mix_options,
+):
+    """
+    Mix every job over a process pool, writing results into output_dir.
+
+    A failing pair is recorded and reported without stopping the rest of the
+    run. Jobs go to the workers in chunks; within a chunk each result is
+    encoded on a background thread while the next pair is mixed. At most
+    ``2 * workers`` chunks are in flight at a time so that large manifests
+    are streamed rather than queued up front.
+
+    With an index, the inputs of each job are hashed as it is queued. A job
+    whose inputs and settings were rendered before (in this run or an
+    earlier one) is answered by copying that render's files; a job matching
+    one still being mixed waits for it.
+
+    Every output must be unique: a job whose output file (or one of its
+    downscaled copies) is already written by an earlier job fails instead
+    of overwriting it.
+
+    Args:
+        jobs: Iterable of BatchJob
+        output_dir: Directory to write mixed images to; a job's relative
+            output path keeps its subdirectories (see output_name)
+        workers: Number of worker processes (default: CPU count)
+        output_options: encoding.OutputOptions for every result (default:
+            format from the extension, JPEG quality 95)
+        chunk_size: Jobs per chunk (default: up to MAX_CHUNK_SIZE, smaller
+            when there are too few jobs to keep every worker busy)
+        index: Optional input_index.InputIndex to reuse earlier renders;
+            saved when the run ends
+        **mix_options: Keyword arguments for mix_photos (blend_mode,
+            opacity, bg_threshold, ...)
+
+    Returns:
+        BatchResult with per-item outcomes and throughput
+    """
+    # Imported here so importing this module (the CLI does) stays cheap
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    # Imported lazily to avoid a circular import with the CLI module
+    from photo_mixer import (
+        REMOVAL_BACKENDS,
+        REMOVE_BACKGROUND_VERSION,
+        default_output_filename,
+    )
+
+    workers = workers or os.cpu_count() or 1
+    output_options = output_options or OutputOptions()
+    if chunk_size is None:
+        count = len(jobs) if hasattr(jobs, "__len__") else 0
+        chunk_size = max(1, min(MAX_CHUNK_SIZE, count // (workers * 2)))
+    max_in_flight = workers * 2
+    result = BatchResult()
+    started = time.perf_counter()
+
+    settings = {
+        name: value
+        for name, value in mix_options.items()
+        if name not in UNKEYED_OPTIONS
+    }
+    backend = REMOVAL_BACKENDS.get(mix_options.get("removal_backend", "heuristic"))
+    settings["removal_version"] = REMOVE_BACKGROUND_VERSION
+    settings["backend_version"] = backend.version if backend else None
+    settings["output_options"] = output_options
+    # Jobs waiting for a render of the same key that is still being mixed
+    waiting = {}
+    # Every file some job of this run writes, so no two jobs write the same one
+    claimed = set()
+
+    def succeeded(job, output_path, message):
+        result.succeeded.append((job, output_path))
+        print(f"  ✓ {output_path} ({message})")
+
+    def failed(job, error):
+        result.failed.append((job, str(error)))
+        print(f"  ✗ {job.background} + {job.foreground}: {error}")
+
+    def reuse(job, output_path, sources):
+        targets = [target for target, _ in output_paths(output_path, output_options)]
+        try:
+            copy_render(sources, targets)
+        except OSError as error:
+            failed(job, error)
+            return
+        result.reused += 1
+        succeeded(job, output_path, f"same as {os.path.basename(sources[0])}")
+
+    def plan(job):
+        """
+        The job with its output path and render key, or None if it was
+        reused or failed.
+        """
+        filename = job.output or default_output_filename(
+            job.background, job.foreground, output_options.extension
+        )
+        output_path = os.path.join(output_dir, output_name(filename))
+        targets = [
+            os.path.abspath(path)
+            for path, _ in output_paths(output_path, output_options)
+        ]
+        taken = next((path for path in targets if path in claimed), None)
+        if taken is not None:
+            failed(job, f"Output {taken} is already written by another job")
+            return None
+        claimed.update(targets)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        if index is None:
+            return job, output_path, None
+        try:
+            key = index.render_key(
+                job.background,
+                job.foreground,
+                format=output_options.format_for(output_path),
+                **settings,
+            )
+        except OSError:
+            # Unreadable inputs are left to the worker to report
+            return job, output_path, None
+        if key in waiting:
+            waiting[key].append((job, output_path))
+            return None
+        sources = index.find_render(key)
+        if sources is not None:
+            reuse(job, output_path, sources)
+            return None
+        waiting[key] = []
+        return job, output_path, key
+
+    def finished(job, output_path, key, error, seconds):
+        if error is not None:
+            failed(job, error)
+        else:
+            succeeded(job, output_path, f"{seconds:.2f}s")
+        if key is None:
+            return
+        if error is None:
+            sources = [path for path, _ in output_paths(output_path, output_options)]
+            index.add_render(key, sources)
+        for waiting_job, waiting_path in waiting.pop(key):
+            if error is None:
+                reuse(waiting_job, waiting_path, sources)
+            else:
+                failed(waiting_job, error)
+
+    chunks = _chunks(filter(None, map(plan, jobs)), chunk_size)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+
+            def submit_next():
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return False
+                pairs = [(job, output_path) for job, output_path, _ in chunk]
+                future = executor.submit(_run_chunk, pairs, mix_options, output_options)
+                pending[future] = chunk
+                return True
+
+            while len(pending) < max_in_flight and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = pending.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        outcomes, stats = future.result()
+                        result.cache_hits += stats["cache_hits"]
+                        result.cache_misses += stats["cache_misses"]
+                    else:
+                        outcomes = [(error, None)] * len(chunk)
+
+                    for (job, output_path, key), (error, seconds) in zip(
+                        chunk, outcomes
+                    ):
+                        finished(job, output_path, key, error, seconds)
+                    submit_next()
+    finally:
+        if index is not None:
+            result.near_duplicates = len(index.near_duplicates)
+            index.save()
+
+    result.elapsed = time.perf_counter() - started
+    return result
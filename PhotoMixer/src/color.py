@@ -0,0 +1,231 @@
+"""
+Color - ICC profiles and 16-bit images for linear-light compositing
+
+Linear-light compositing (``precision='linear'``) keeps the background in its
+own color space and at the depth it was stored with: the foreground is
+converted into the background's embedded ICC profile with LittleCMS
+(Pillow's ImageCms), and the result carries that profile. Images without a
+profile are taken to be sRGB. Blending itself decodes values with the sRGB
+curve, which is exact for sRGB and Display P3 and a close approximation for
+other RGB spaces.
+
+Pillow holds 16-bit grayscale images but no 16-bit RGB mode, and decodes
+48-bit PNG and TIFF files at 8 bits per channel. read_deep recovers the full
+16 bits of such files as a ``DeepImage``; uint16 NumPy arrays are accepted as
+well. 16-bit results are returned as ``DeepImage`` and written as 48-bit PNG.
+"""
+
+import io
+import os
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+ImageCms = lazy_import("PIL.ImageCms")
+
+# PIL modes with more than 8 bits per sample (16-bit grayscale decodes as I;16)
+HIGH_DEPTH_MODES = ("I;16", "I;16L", "I;16B", "I;16N", "I")
+
+# Raw-mode suffix that unpacks the low byte of each 16-bit sample, by the
+# suffix Pillow unpacks the high byte with (N is native byte order)
+_LOW_BYTE_SUFFIXES = {
+    ";16B": ";16L",
+    ";16L": ";16B",
+    ";16N": ";16B" if sys.byteorder == "little" else ";16L",
+}
+
+
+@dataclass
+class DeepImage:
+    """
+    A 16-bit RGB image, which PIL has no mode for.
+
+    Args:
+        array: uint16 array of shape (H, W, 3)
+        info: Metadata like PIL's ``Image.info`` (here only 'icc_profile')
+    """
+
+    array: "np.ndarray"
+    info: dict = field(default_factory=dict)
+
+    @property
+    def size(self):
+        """(width, height) like a PIL image."""
+        return self.array.shape[1], self.array.shape[0]
+
+    def to_image(self):
+        """The image rounded to 8 bits per channel, as an RGB PIL image."""
+        image = Image.fromarray(to_8bit(self.array), "RGB")
+        image.info.update(self.info)
+        return image
+
+    def resize(self, size):
+        """A copy resized with Lanczos filtering, on float32 channels."""
+        channels = [
+            Image.fromarray(self.array[:, :, index].astype(np.float32)).resize(
+                size, Image.Resampling.LANCZOS
+            )
+            for index in range(3)
+        ]
+        array = np.rint(np.clip(np.stack(channels, axis=-1), 0, 65535))
+        return DeepImage(array.astype(np.uint16), dict(self.info))
+
+
+def to_16bit(array):
+    """Scale 8-bit values to 16 bits exactly (255 becomes 65535)."""
+    return array.astype(np.uint16) * np.uint16(257)
+
+
+def to_8bit(array):
+    """Round 16-bit values to the nearest 8-bit value."""
+    return ((array.astype(np.uint32) * 255 + 32767) // 65535).astype(np.uint8)
+
+
+def deep_image(source):
+    """
+    A 16-bit source as a DeepImage (always a copy), or None if it has at
+    most 8 bits.
+
+    Args:
+        source: uint16 array of shape (H, W), (H, W, 3) or (H, W, 4) (alpha
+            is dropped), or a 16-bit grayscale PIL image
+
+    Raises:
+        ValueError: If a uint16 array has an unsupported shape
+    """
+    if isinstance(source, np.ndarray):
+        if source.dtype != np.uint16:
+            return None
+        if source.ndim == 2:
+            source = source[:, :, np.newaxis]
+        if source.ndim != 3 or source.shape[2] not in (1, 3, 4):
+            raise ValueError(
+                f"Expected a uint16 array of shape (H, W), (H, W, 3) or "
+                f"(H, W, 4), not {source.shape}"
+            )
+        if source.shape[2] == 1:
+            return DeepImage(source.repeat(3, 2))
+        return DeepImage(np.array(source[:, :, :3]))
+    if isinstance(source, Image.Image) and source.mode in HIGH_DEPTH_MODES:
+        values = np.clip(np.asarray(source), 0, 65535).astype(np.uint16)
+        image = DeepImage(values[:, :, np.newaxis].repeat(3, 2))
+        if "icc_profile" in source.info:
+            image.info["icc_profile"] = source.info["icc_profile"]
+        return image
+    return None
+
+
+def _rawmode(tile):
+    return tile.args if isinstance(tile.args, str) else tile.args[0]
+
+
+def _low_byte_tile(tile):
+    """The tile with its raw mode's byte order reversed."""
+    rawmode = _rawmode(tile)
+    rawmode = rawmode[:-4] + _LOW_BYTE_SUFFIXES[rawmode[-4:]]
+    if isinstance(tile.args, str):
+        return tile._replace(args=rawmode)
+    return tile._replace(args=(rawmode, *tile.args[1:]))
+
+
+def read_deep(source):
+    """
+    Decode a 48-bit RGB (or 64-bit RGBA, alpha dropped) PNG or TIFF file at
+    its full 16 bits per channel.
+
+    Pillow unpacks such files to 8 bits by keeping the high byte of every
+    sample. Decoding the file a second time with its raw mode's byte order
+    reversed keeps the low bytes instead. Decompression, PNG unfiltering
+    and TIFF predictors still see whole 16-bit samples, so both passes
+    agree, at the cost of decoding twice.
+
+    Args:
+        source: File path, encoded bytes or seekable binary file object
+
+    Returns:
+        DeepImage, or None if the file is not 16-bit RGB(A) (16-bit
+        grayscale files decode as I;16; see deep_image)
+
+    Raises:
+        OSError, ValueError: If the file cannot be read or decoded
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    start = None if isinstance(source, (str, os.PathLike)) else source.tell()
+
+    passes = []
+    for low_bytes in (False, True):
+        if start is not None:
+            source.seek(start)
+        with Image.open(source) as image:
+            if image.mode not in ("RGB", "RGBA") or not image.tile:
+                return None
+            if any(
+                _rawmode(tile)[-4:] not in _LOW_BYTE_SUFFIXES for tile in image.tile
+            ):
+                return None
+            if low_bytes:
+                image.tile = [_low_byte_tile(tile) for tile in image.tile]
+            passes.append(np.asarray(image)[:, :, :3])
+            info = image.info
+
+    high, low = passes
+    array = high.astype(np.uint16) << 8
+    array |= low
+    image = DeepImage(array)
+    if info.get("icc_profile"):
+        image.info["icc_profile"] = info["icc_profile"]
+    return image
+
+
+@lru_cache(maxsize=1)
+def srgb_profile():
+    """The built-in sRGB profile, as ICC bytes."""
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+
+def image_profile(image):
+    """The ICC profile embedded in an image, or None."""
+    info = getattr(image, "info", None) or {}
+    return info.get("icc_profile") or None
+
+
+@lru_cache(maxsize=16)
+def _transform(source, target):
+    return ImageCms.buildTransform(
+        ImageCms.ImageCmsProfile(io.BytesIO(source)),
+        ImageCms.ImageCmsProfile(io.BytesIO(target)),
+        "RGBA",
+        "RGBA",
+        renderingIntent=ImageCms.Intent.RELATIVE_COLORIMETRIC,
+    )
+
+
+def convert_profile(image, source, target):
+    """
+    Convert an RGBA image from one ICC profile to another; alpha is kept.
+
+    Args:
+        image: RGBA PIL image
+        source: ICC profile bytes of the image (None for sRGB)
+        target: ICC profile bytes to convert to (None for sRGB)
+
+    Returns:
+        The converted image, or image itself when both profiles are the same
+
+    Raises:
+        ValueError: If a profile cannot be read or used for RGB
+    """
+    source = source or srgb_profile()
+    target = target or srgb_profile()
+    if source == target:
+        return image
+    try:
+        transform = _transform(source, target)
+    except (ImageCms.PyCMSError, OSError) as error:
+        raise ValueError(f"Cannot use ICC profile: {error}") from error
+    return ImageCms.applyTransform(image, transform)
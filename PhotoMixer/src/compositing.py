@@ -0,0 +1,679 @@
+"""
+Compositing - Shared kernel for blending an RGBA foreground onto an RGB background
+
+All blend modes share the same overlap-region logic and scratch buffers; a mode
+only supplies the per-pixel color formula. Three precisions are available:
+
+- ``float``: float32 math, bit-for-bit identical to the original blend functions
+- ``fixed``: uint16 fixed-point math on 8-bit data with rounding, no floats at all
+- ``linear``: float32 math in linear light on 8- or 16-bit data; sRGB values are
+  decoded and re-encoded through lookup tables (``decode_table`` and
+  ``encode_table``), and the result is rounded once, to the background's depth
+
+New modes plug in through ``register_blend_mode``.
+
+Opacity is applied inside the kernel: the foreground's alpha channel is mapped
+through a shared 256-entry table (``alpha_table``) while it is loaded into the
+working buffer, so faded foregrounds need no separate alpha pass.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+from lazy import lazy_import
+from parallel import rows_per_band, run_bands
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+PRECISIONS = ("float", "fixed", "linear")
+
+# Bytes of scratch per overlapping pixel for each precision: four 3-channel
+# working buffers plus the alpha plane (and, in linear light, the encoding
+# table indices and encoded values)
+WORKING_BYTES_PER_PIXEL = {
+    "float": 4 * 3 * 4 + 4,
+    "fixed": 4 * 3 * 2 + 2,
+    "linear": 4 * 3 * 4 + 4 + 3 * 4 + 3 * 2,
+}
+
+# Entries in the tables that encode linear light back to sRGB, per output
+# depth: enough that every 8- and 16-bit value survives a round trip exactly
+ENCODE_TABLE_BITS = {"uint8": 16, "uint16": 20}
+
+# When fewer than this fraction of the overlapping foreground pixels are
+# visible, only those pixels are gathered and blended
+SPARSE_COVERAGE = 0.5
+
+# Bytes per pixel for the uint8 background/foreground strips cut out of the
+# PIL images (crop + array copy of RGB and RGBA, plus the paste-back image)
+STRIP_BYTES_PER_PIXEL = 2 * 3 + 2 * 4 + 3
+
+
+@dataclass(frozen=True)
+class BlendMode:
+    """A named blend formula with float and (optional) fixed-point variants."""
+
+    name: str
+    blend_float: object
+    blend_fixed: object = None
+
+
+BLEND_MODES = {}
+
+
+def register_blend_mode(name, blend_float, blend_fixed=None):
+    """
+    Register a blend mode so it can be used by ``composite`` and the CLI.
+
+    Both callables have the signature ``fn(bg, fg, out, scratch)`` and must
+    write the blended color (before alpha) into ``out``. ``bg`` must be left
+    untouched; ``fg`` and ``scratch`` may be overwritten.
+
+    Args:
+        name: Mode name used on the command line
+        blend_float: Formula on float32 arrays in the 0-255 range
+        blend_fixed: Formula on uint16 arrays holding 8-bit values; modes
+            without one fall back to the float formula in ``fixed`` precision
+    """
+    BLEND_MODES[name] = BlendMode(name, blend_float, blend_fixed)
+    return BLEND_MODES[name]
+
+
+class Workspace:
+    """Scratch buffers reused across composites, grown on demand."""
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype):
+        """Return an uninitialized array of the given shape backed by a cached buffer."""
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buffer = self._buffers.get((name, dtype))
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[(name, dtype)] = buffer
+        return buffer[:size].reshape(shape)
+
+    @property
+    def nbytes(self):
+        """Total bytes currently held by the workspace."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+
+def overlap_region(bg_shape, fg_shape, position):
+    """
+    Compute the overlapping slices of a foreground placed on a background.
+
+    Returns:
+        (bg_slices, fg_slices) tuple, or None if the images do not overlap
+    """
+    x, y = position
+    fg_height, fg_width = fg_shape[:2]
+    bg_height, bg_width = bg_shape[:2]
+
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(bg_width, x + fg_width), min(bg_height, y + fg_height)
+    if x1 >= x2 or y1 >= y2:
+        return None
+
+    fg_x1, fg_y1 = x1 - x, y1 - y
+    fg_x2, fg_y2 = fg_x1 + (x2 - x1), fg_y1 + (y2 - y1)
+
+    return (
+        (slice(y1, y2), slice(x1, x2)),
+        (slice(fg_y1, fg_y2), slice(fg_x1, fg_x2)),
+    )
+
+
+def _div255(values, scratch):
+    """Divide uint16 values (at most 255 * 255) by 255 with rounding, in place."""
+    values += 128
+    np.right_shift(values, 8, out=scratch)
+    values += scratch
+    values >>= 8
+
+
+# Float formulas - operation order matches the original per-mode functions so
+# the float path produces identical pixels.
+
+
+def _normal_float(bg, fg, out, scratch):
+    np.copyto(out, fg)
+
+
+def _multiply_float(bg, fg, out, scratch):
+    # Multiply: A * B / 255
+    np.multiply(bg, fg, out=out)
+    out /= 255.0
+
+
+def _screen_float(bg, fg, out, scratch):
+    # Screen: 255 - (255 - A) * (255 - B) / 255
+    np.subtract(255.0, bg, out=out)
+    np.subtract(255.0, fg, out=fg)
+    out *= fg
+    out /= 255.0
+    np.subtract(255.0, out, out=out)
+
+
+def _overlay_float(bg, fg, out, scratch):
+    # Overlay: multiply if base < 128, screen if base >= 128
+    np.multiply(2.0, bg, out=out)
+    out *= fg
+    out /= 255.0
+
+    np.subtract(255.0, bg, out=scratch)
+    np.multiply(2.0, scratch, out=scratch)
+    np.subtract(255.0, fg, out=fg)
+    scratch *= fg
+    scratch /= 255.0
+    np.subtract(255.0, scratch, out=scratch)
+
+    np.copyto(out, scratch, where=bg >= 128.0)
+
+
+# Fixed-point formulas on uint16 - every intermediate stays below 2 ** 16.
+# Lanes that overflow in the overlay branches are discarded by the mask.
+
+
+def _normal_fixed(bg, fg, out, scratch):
+    np.copyto(out, fg)
+
+
+def _multiply_fixed(bg, fg, out, scratch):
+    np.multiply(bg, fg, out=out)
+    _div255(out, scratch)
+
+
+def _screen_fixed(bg, fg, out, scratch):
+    np.subtract(255, bg, out=out)
+    np.subtract(255, fg, out=fg)
+    out *= fg
+    _div255(out, scratch)
+    np.subtract(255, out, out=out)
+
+
+def _overlay_fixed(bg, fg, out, scratch):
+    np.left_shift(bg, 1, out=out)
+    out *= fg
+
+    np.subtract(255, bg, out=scratch)
+    scratch <<= 1
+    np.subtract(255, fg, out=fg)
+    scratch *= fg
+
+    _div255(out, fg)
+    _div255(scratch, fg)
+    np.subtract(255, scratch, out=scratch)
+
+    np.copyto(out, scratch, where=bg >= 128)
+
+
+register_blend_mode("normal", _normal_float, _normal_fixed)
+register_blend_mode("multiply", _multiply_float, _multiply_fixed)
+register_blend_mode("screen", _screen_float, _screen_fixed)
+register_blend_mode("overlay", _overlay_float, _overlay_fixed)
+
+
+@lru_cache(maxsize=64)
+def alpha_table(opacity=1.0, precision="float"):
+    """
+    Lookup table from 8-bit foreground alpha to working alpha at an opacity.
+
+    Faded alpha is ``int(alpha * opacity)``, the value the 8-bit opacity step
+    always produced. The float table holds that divided by 255 (0-1 range);
+    the fixed table holds it as uint16 (0-255 range). Tables are shared and
+    read-only.
+
+    Args:
+        opacity: Opacity from 0.0 to 1.0
+        precision: 'float' or 'fixed'
+    """
+    levels = np.array([int(value * opacity) for value in range(256)], np.uint16)
+    if precision == "float":
+        table = levels.astype(np.float32)
+        table /= np.float32(255.0)
+    else:
+        table = levels
+    table.flags.writeable = False
+    return table
+
+
+def _composite_float(bg_region, fg_region, blend, workspace, alphas):
+    shape = bg_region.shape
+    bg = workspace.get("bg", shape, np.float32)
+    fg = workspace.get("fg", shape, np.float32)
+    out = workspace.get("out", shape, np.float32)
+    scratch = workspace.get("scratch", shape, np.float32)
+    alpha = workspace.get("alpha", shape[:2] + (1,), np.float32)
+
+    np.copyto(bg, bg_region)
+    np.copyto(fg, fg_region[:, :, :3])
+    np.take(alphas, fg_region[:, :, 3:4], out=alpha)
+
+    blend(bg, fg, out, scratch)
+
+    # result = blended * alpha + background * (1 - alpha)
+    out *= alpha
+    np.subtract(1.0, alpha, out=alpha)
+    bg *= alpha
+    out += bg
+
+    np.copyto(bg_region, out, casting="unsafe")
+
+
+def srgb_to_linear(values):
+    """Decode sRGB values in 0-1 to linear light in 0-1 (IEC 61966-2-1)."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(
+        values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4
+    )
+
+
+def linear_to_srgb(values):
+    """Encode linear light in 0-1 to sRGB values in 0-1 (IEC 61966-2-1)."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(
+        values <= 0.0031308,
+        values * 12.92,
+        1.055 * np.maximum(values, 0.0031308) ** (1 / 2.4) - 0.055,
+    )
+
+
+@lru_cache(maxsize=8)
+def decode_table(dtype):
+    """
+    Lookup table from every uint8 or uint16 sRGB value to linear light.
+
+    Linear values are float32 on the same 0-255 scale as the other
+    precisions, so every blend formula works on them unchanged.
+    """
+    top = np.iinfo(dtype).max
+    table = (255 * srgb_to_linear(np.arange(top + 1) / top)).astype(np.float32)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=8)
+def encode_table(dtype):
+    """
+    Lookup table from linear light, sampled at ``2 ** ENCODE_TABLE_BITS``
+    evenly spaced levels over 0-255, to rounded uint8 or uint16 sRGB values.
+    """
+    dtype = np.dtype(dtype)
+    top = np.iinfo(dtype).max
+    size = 2 ** ENCODE_TABLE_BITS[dtype.name]
+    levels = np.arange(size) / (size - 1)
+    table = np.rint(top * linear_to_srgb(levels)).astype(dtype)
+    table.flags.writeable = False
+    return table
+
+
+def encode_linear(values, target, workspace):
+    """
+    Round float32 linear light (0-255 scale) to sRGB values in target.
+
+    ``values`` is overwritten.
+    """
+    table = encode_table(target.dtype)
+    np.multiply(values, np.float32((table.size - 1) / 255), out=values)
+    np.rint(values, out=values)
+    np.clip(values, 0, table.size - 1, out=values)
+    index = workspace.get("index", values.shape, np.int32)
+    np.copyto(index, values, casting="unsafe")
+    encoded = workspace.get("encoded", values.shape, target.dtype)
+    np.take(table, index, out=encoded)
+    np.copyto(target, encoded)
+
+
+def _composite_linear(bg_region, fg_region, blend, workspace, alphas):
+    # float32 backgrounds are already linear (see composite_layers)
+    shape = bg_region.shape
+    bg = workspace.get("bg", shape, np.float32)
+    fg = workspace.get("fg", shape, np.float32)
+    out = workspace.get("out", shape, np.float32)
+    scratch = workspace.get("scratch", shape, np.float32)
+    alpha = workspace.get("alpha", shape[:2] + (1,), np.float32)
+
+    if bg_region.dtype == np.float32:
+        np.copyto(bg, bg_region)
+    else:
+        np.take(decode_table(bg_region.dtype), bg_region, out=bg)
+    np.take(decode_table(np.dtype(np.uint8)), fg_region[:, :, :3], out=fg)
+    np.take(alphas, fg_region[:, :, 3:4], out=alpha)
+
+    blend(bg, fg, out, scratch)
+
+    # result = blended * alpha + background * (1 - alpha), in linear light
+    out *= alpha
+    np.subtract(1.0, alpha, out=alpha)
+    bg *= alpha
+    out += bg
+
+    if bg_region.dtype == np.float32:
+        np.copyto(bg_region, out)
+    else:
+        encode_linear(out, bg_region, workspace)
+
+
+def _composite_fixed(bg_region, fg_region, blend, workspace, alphas):
+    shape = bg_region.shape
+    bg = workspace.get("bg", shape, np.uint16)
+    fg = workspace.get("fg", shape, np.uint16)
+    out = workspace.get("out", shape, np.uint16)
+    scratch = workspace.get("scratch", shape, np.uint16)
+    alpha = workspace.get("alpha", shape[:2] + (1,), np.uint16)
+
+    np.copyto(bg, bg_region)
+    np.copyto(fg, fg_region[:, :, :3])
+    np.take(alphas, fg_region[:, :, 3:4], out=alpha)
+
+    blend(bg, fg, out, scratch)
+
+    # result = (blended * alpha + background * (255 - alpha)) / 255
+    out *= alpha
+    np.subtract(255, alpha, out=alpha)
+    bg *= alpha
+    out += bg
+    _div255(out, scratch)
+
+    np.copyto(bg_region, out, casting="unsafe")
+
+
+def composite(
+    bg_array,
+    fg_array,
+    position,
+    mode="normal",
+    precision="float",
+    workspace=None,
+    opacity=1.0,
+    threads=1,
+):
+    """
+    Composite an RGBA foreground onto an RGB background array, in place.
+
+    Only the overlapping region is converted to working precision, using
+    scratch buffers from ``workspace`` (pass one in to reuse buffers across
+    calls). Pixels that are transparent at the given opacity are skipped.
+    With several threads, bands of rows are blended at the same time, each
+    with its own scratch buffers; every formula is per pixel, so the result
+    is the same.
+
+    Args:
+        bg_array: Writable uint8 array of shape (H, W, 3) (or uint16 in
+            'linear' precision)
+        fg_array: uint8 array of shape (h, w, 4)
+        position: (x, y) of the foreground's top-left corner on the background
+        mode: Registered blend mode name
+        precision: 'float', 'fixed' or 'linear'
+        workspace: Optional Workspace for scratch buffers
+        opacity: Foreground opacity from 0.0 to 1.0, applied to its alpha
+        threads: Most threads to blend on (see parallel.py)
+
+    Returns:
+        bg_array
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    blend_mode = BLEND_MODES[mode]
+
+    region = overlap_region(bg_array.shape, fg_array.shape, position)
+    if region is None:
+        return bg_array
+    bg_slices, fg_slices = region
+
+    workspace = workspace or Workspace()
+    bg_region = bg_array[bg_slices]
+    fg_region = fg_array[fg_slices]
+
+    if threads > 1:
+
+        def blend_band(start, stop):
+            # The first band reuses the caller's buffers, the others get their own
+            composite(
+                bg_region[start:stop],
+                fg_region[start:stop],
+                (0, 0),
+                mode,
+                precision,
+                workspace if start == 0 else None,
+                opacity,
+            )
+
+        height, width = bg_region.shape[:2]
+        run_bands(blend_band, height, threads, rows_per_band(width))
+        return bg_array
+
+    if precision == "linear":
+        composite_region = _composite_linear
+        blend = blend_mode.blend_float
+        alphas = alpha_table(opacity, "float")
+    elif precision == "fixed" and blend_mode.blend_fixed is not None:
+        composite_region = _composite_fixed
+        blend = blend_mode.blend_fixed
+        alphas = alpha_table(opacity, "fixed")
+    else:
+        composite_region = _composite_float
+        blend = blend_mode.blend_float
+        alphas = alpha_table(opacity, "float")
+
+    # Faded alpha never decreases as alpha grows, so the pixels that stay
+    # visible at this opacity are those at or above the first nonzero entry
+    cutoff = int(np.count_nonzero(alphas == 0))
+    if cutoff > 255:
+        return bg_array
+
+    # Transparent pixels leave the background untouched, so a mostly
+    # transparent foreground only blends its visible pixels (every formula is
+    # per pixel, so the result is the same)
+    visible = fg_region[:, :, 3] >= cutoff
+    count = int(np.count_nonzero(visible))
+    if count == 0:
+        return bg_array
+    if count < SPARSE_COVERAGE * visible.size:
+        bg_pixels = bg_region[visible][:, np.newaxis]
+        fg_pixels = fg_region[visible][:, np.newaxis]
+        composite_region(bg_pixels, fg_pixels, blend, workspace, alphas)
+        bg_region[visible] = bg_pixels[:, 0]
+    else:
+        composite_region(bg_region, fg_region, blend, workspace, alphas)
+
+    return bg_array
+
+
+def _dirty_regions(rects):
+    """
+    Merge overlapping (x1, y1, x2, y2) rectangles into disjoint regions.
+
+    Returns:
+        List of (region, member_indices) with members in their original order
+    """
+    regions = [(rect, [index]) for index, rect in enumerate(rects)]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                (ax1, ay1, ax2, ay2), a_members = regions[i]
+                (bx1, by1, bx2, by2), b_members = regions[j]
+                if ax1 < bx2 and bx1 < ax2 and ay1 < by2 and by1 < ay2:
+                    union = (min(ax1, bx1), min(ay1, by1), max(ax2, bx2), max(ay2, by2))
+                    regions[i] = (union, sorted(a_members + b_members))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+def composite_layers(bg_array, layers, precision="float", workspace=None):
+    """
+    Composite a stack of RGBA foregrounds onto an RGB background, in place.
+
+    Overlapping layer rectangles are merged into dirty regions. Each region
+    is converted to working precision once, every layer touching it is
+    blended there in order without rounding in between, and the result is
+    written back once. Pixels no layer covers are never touched.
+
+    Args:
+        bg_array: Writable uint8 array of shape (H, W, 3) (or uint16 in
+            'linear' precision)
+        layers: Sequence of (fg_array, position, mode, opacity), bottom layer
+            first
+        precision: 'float', 'fixed' or 'linear' ('fixed' works on 8-bit data,
+            so it blends directly into bg_array)
+        workspace: Optional Workspace for scratch buffers
+
+    Returns:
+        bg_array
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    workspace = workspace or Workspace()
+
+    rects = []
+    visible = []
+    for fg_array, position, mode, opacity in layers:
+        region = overlap_region(bg_array.shape, fg_array.shape, position)
+        if region is None:
+            continue
+        rows, cols = region[0]
+        rects.append((cols.start, rows.start, cols.stop, rows.stop))
+        visible.append((fg_array, position, mode, opacity))
+
+    for (x1, y1, x2, y2), members in _dirty_regions(rects):
+        target = bg_array[y1:y2, x1:x2]
+        if precision == "float":
+            work = workspace.get("layers", target.shape, np.float32)
+            np.copyto(work, target)
+        elif precision == "linear":
+            work = workspace.get("layers", target.shape, np.float32)
+            np.take(decode_table(target.dtype), target, out=work)
+        else:
+            work = target
+
+        for index in members:
+            fg_array, (x, y), mode, opacity = visible[index]
+            composite(
+                work, fg_array, (x - x1, y - y1), mode, precision, workspace, opacity
+            )
+
+        if precision == "linear":
+            encode_linear(work, target, workspace)
+        elif work is not target:
+            np.copyto(target, work, casting="unsafe")
+
+    return bg_array
+
+
+def blend_images(
+    background, foreground, position, mode="normal", precision="float", opacity=1.0
+):
+    """Blend PIL images with a registered mode and return a new RGB image."""
+    bg_array = np.array(
+        background if background.mode == "RGB" else background.convert("RGB")
+    )
+    fg_array = np.asarray(
+        foreground if foreground.mode == "RGBA" else foreground.convert("RGBA")
+    )
+    composite(bg_array, fg_array, position, mode, precision, opacity=opacity)
+    return Image.fromarray(bg_array, "RGB")
+
+
+def strip_rows(width, precision="float", memory_limit=None):
+    """
+    Number of rows per strip that keeps compositing within a memory budget.
+
+    Args:
+        width: Width of the overlapping region in pixels
+        precision: 'float', 'fixed' or 'linear'
+        memory_limit: Working-memory budget in bytes (None for unbounded)
+    """
+    if not memory_limit:
+        return None
+    bytes_per_row = width * (WORKING_BYTES_PER_PIXEL[precision] + STRIP_BYTES_PER_PIXEL)
+    return max(1, int(memory_limit // bytes_per_row))
+
+
+def composite_tiled(
+    background,
+    foreground,
+    position,
+    mode="normal",
+    precision="float",
+    memory_limit=None,
+    workspace=None,
+    opacity=1.0,
+    threads=1,
+):
+    """
+    Composite onto a PIL background in horizontal strips, in place.
+
+    Only strips that intersect the foreground are cut out of the background
+    and converted to working precision, one at a time, so working memory is
+    bounded by ``memory_limit`` regardless of the background's size. The
+    background is never copied as a whole.
+
+    Args:
+        background: RGB PIL image, or (H, W, 3) array blended through views
+            of its strips, modified in place
+        foreground: RGBA PIL image
+        position: (x, y) of the foreground's top-left corner on the background
+        mode: Registered blend mode name
+        precision: 'float', 'fixed' or 'linear'
+        memory_limit: Working-memory budget in bytes (None for a single strip)
+        workspace: Optional Workspace for scratch buffers
+        opacity: Foreground opacity from 0.0 to 1.0, applied to its alpha
+        threads: Most threads to blend each strip on (each thread's scratch
+            buffers add to the memory used)
+
+    Returns:
+        background
+    """
+    is_array = isinstance(background, np.ndarray)
+    region = overlap_region(
+        background.shape if is_array else (background.height, background.width),
+        (foreground.height, foreground.width),
+        position,
+    )
+    if region is None:
+        return background
+    (bg_rows, bg_cols), (fg_rows, fg_cols) = region
+
+    height = bg_rows.stop - bg_rows.start
+    rows = strip_rows(bg_cols.stop - bg_cols.start, precision, memory_limit) or height
+    workspace = workspace or Workspace()
+
+    for offset in range(0, height, rows):
+        strip_height = min(rows, height - offset)
+        bg_box = (
+            bg_cols.start,
+            bg_rows.start + offset,
+            bg_cols.stop,
+            bg_rows.start + offset + strip_height,
+        )
+        fg_box = (
+            fg_cols.start,
+            fg_rows.start + offset,
+            fg_cols.stop,
+            fg_rows.start + offset + strip_height,
+        )
+
+        fg_strip = np.asarray(foreground.crop(fg_box))
+        if is_array:
+            bg_strip = background[bg_box[1] : bg_box[3], bg_box[0] : bg_box[2]]
+            composite(
+                bg_strip, fg_strip, (0, 0), mode, precision, workspace, opacity, threads
+            )
+            continue
+        bg_strip = np.array(background.crop(bg_box))
+        composite(
+            bg_strip, fg_strip, (0, 0), mode, precision, workspace, opacity, threads
+        )
+        background.paste(Image.fromarray(bg_strip, "RGB"), bg_box[:2])
+
+    return background
@@ -0,0 +1,375 @@
+"""
+Encoding - Output formats, quality presets and background encoding of mixed images
+
+``OutputOptions`` describes how a result is written: the format (JPEG, PNG or
+WebP, by default taken from the file extension), encoder settings, and any
+extra downscaled copies (such as a thumbnail next to the full-size image).
+``Encoder`` writes results on a thread pool, so encoding one image overlaps
+with compositing the next; Pillow's encoders release the GIL while they work.
+
+Embedded ICC profiles are written along with the pixels. 16-bit results
+(``color.DeepImage``) are written as 48-bit PNG by ``encode_png16``, since
+Pillow cannot encode 16-bit RGB; their downscaled copies are 8-bit.
+"""
+
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass, field, replace
+
+from color import DeepImage
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+# Output formats and the extension used when a name has to be made up
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+FORMAT_NAMES = {"jpeg": "JPEG", "jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+@dataclass
+class OutputOptions:
+    """
+    How mixed images are encoded.
+
+    Args:
+        format: 'JPEG', 'PNG' or 'WEBP', or None to use the file extension
+            (JPEG when the extension is unknown)
+        quality: JPEG/WebP quality (1-100)
+        optimize: Extra encoder pass for smaller JPEG/PNG files
+        progressive: Write progressive JPEGs
+        compress_level: PNG zlib level (0 = fastest, 9 = smallest)
+        method: WebP effort (0 = fastest, 6 = smallest)
+        lossless: Write lossless WebP
+        sizes: Longest-side pixel sizes of extra downscaled copies, written
+            next to the full image as ``<name>_<size>.<ext>``
+    """
+
+    format: str = None
+    quality: int = 95
+    optimize: bool = False
+    progressive: bool = False
+    compress_level: int = 6
+    method: int = 4
+    lossless: bool = False
+    sizes: tuple = field(default_factory=tuple)
+
+    def format_for(self, path):
+        """Format to write path in."""
+        if self.format:
+            return self.format
+        extension = os.path.splitext(path)[1].lower()
+        return Image.registered_extensions().get(extension, "JPEG")
+
+    @property
+    def extension(self):
+        """File extension for made-up output names."""
+        return FORMAT_EXTENSIONS[self.format or "JPEG"]
+
+    def save_options(self, format):
+        """Keyword arguments for Image.save in the given format."""
+        if format == "JPEG":
+            return {
+                "quality": self.quality,
+                "optimize": self.optimize,
+                "progressive": self.progressive,
+            }
+        if format == "PNG":
+            return {"optimize": self.optimize, "compress_level": self.compress_level}
+        if format == "WEBP":
+            return {
+                "quality": self.quality,
+                "method": self.method,
+                "lossless": self.lossless,
+            }
+        return {"quality": self.quality}
+
+
+PRESETS = {
+    # What the mixer always wrote: JPEG quality 95 unless the extension says
+    # otherwise
+    "default": OutputOptions(),
+    "web": OutputOptions(quality=85, optimize=True, progressive=True),
+    "fast": OutputOptions(quality=90, compress_level=1, method=0),
+    "small": OutputOptions(format="WEBP", quality=80, method=6),
+    "archive": OutputOptions(format="PNG", compress_level=9),
+}
+
+
+def preset(name, **overrides):
+    """A copy of a named preset with some fields replaced."""
+    return replace(PRESETS[name], **overrides)
+
+
+def sized_path(path, size):
+    """Path of the copy of path downscaled to ``size`` pixels."""
+    root, extension = os.path.splitext(path)
+    return f"{root}_{size}{extension}"
+
+
+def output_paths(path, options):
+    """Every file written for one result, as (path, size or None for full)."""
+    return [(path, None)] + [(sized_path(path, size), size) for size in options.sizes]
+
+
+def _png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def encode_png16(array, compress_level=6, icc_profile=None):
+    """
+    Encode a uint16 (H, W, 3) array as a 48-bit PNG.
+
+    Rows use the PNG "up" filter (the byte-wise difference from the row
+    above), which compresses photographic data far better than no filter
+    and needs no per-pixel loop.
+
+    Args:
+        array: uint16 array of shape (H, W, 3)
+        compress_level: zlib level (0 = fastest, 9 = smallest)
+        icc_profile: ICC profile bytes to embed, or None
+
+    Returns:
+        Encoded PNG bytes
+    """
+    height, width = array.shape[:2]
+    raw = np.ascontiguousarray(array, dtype=">u2").view(np.uint8)
+    raw = raw.reshape(height, width * 6)
+    rows = np.empty((height, width * 6 + 1), dtype=np.uint8)
+    rows[:, 0] = 2
+    rows[0, 1:] = raw[0]
+    np.subtract(raw[1:], raw[:-1], out=rows[1:, 1:])
+
+    header = struct.pack(">IIBBBBB", width, height, 16, 2, 0, 0, 0)
+    chunks = [_png_chunk(b"IHDR", header)]
+    if icc_profile:
+        profile = b"ICC Profile\0\0" + zlib.compress(icc_profile)
+        chunks.append(_png_chunk(b"iCCP", profile))
+    chunks.append(_png_chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level)))
+    chunks.append(_png_chunk(b"IEND", b""))
+    return b"\x89PNG\r\n\x1a\n" + b"".join(chunks)
+
+
+class PngStripWriter:
+    """
+    Write an 8-bit RGB PNG one strip of rows at a time.
+
+    Rows use the "up" filter like encode_png16; the last row of each strip
+    is kept to filter the first row of the next. The file is written under a
+    temporary name and renamed into place by close(), so a mix that fails
+    halfway leaves no partial output.
+
+    Args:
+        path: Destination path
+        size: (width, height) of the whole image
+        compress_level: zlib level (0 = fastest, 9 = smallest)
+        icc_profile: ICC profile bytes to embed, or None
+    """
+
+    def __init__(self, path, size, compress_level=6, icc_profile=None):
+        self.path = path
+        self.size = size
+        self.rows_written = 0
+        self._temp_path = f"{path}.part"
+        self._file = open(self._temp_path, "wb")  # noqa: SIM115 - closed by close()
+        self._compressor = zlib.compressobj(compress_level)
+        self._previous = np.zeros(size[0] * 3, dtype=np.uint8)
+
+        header = struct.pack(">IIBBBBB", size[0], size[1], 8, 2, 0, 0, 0)
+        self._file.write(b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header))
+        if icc_profile:
+            profile = b"ICC Profile\0\0" + zlib.compress(icc_profile)
+            self._file.write(_png_chunk(b"iCCP", profile))
+
+    def write(self, rows):
+        """Append rows, a uint8 array of shape (rows, width, 3)."""
+        raw = np.ascontiguousarray(rows, dtype=np.uint8).reshape(len(rows), -1)
+        filtered = np.empty((len(raw), raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(raw[0], self._previous, out=filtered[0, 1:])
+        np.subtract(raw[1:], raw[:-1], out=filtered[1:, 1:])
+        self._previous = raw[-1].copy()
+        self.rows_written += len(raw)
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._file.write(_png_chunk(b"IDAT", data))
+
+    def close(self):
+        """
+        Finish the file and move it into place.
+
+        Raises:
+            ValueError: If fewer or more rows were written than the height
+        """
+        if self.rows_written != self.size[1]:
+            self.abort()
+            raise ValueError(
+                f"Wrote {self.rows_written} of {self.size[1]} rows to {self.path}"
+            )
+        self._file.write(_png_chunk(b"IDAT", self._compressor.flush()))
+        self._file.write(_png_chunk(b"IEND", b""))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        """Discard the partly written file."""
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_image(image, path, options, size=None):
+    """
+    Encode an image to a file.
+
+    Args:
+        image: PIL Image, or DeepImage (written as 48-bit PNG at full size)
+        path: Destination path
+        options: OutputOptions
+        size: Longest side of a downscaled copy to write instead (never
+            upscaled), or None for full size
+
+    Returns:
+        path
+
+    Raises:
+        OSError, KeyError or ValueError: If the image cannot be written
+    """
+    format = options.format_for(path)
+    if isinstance(image, DeepImage):
+        if size is None:
+            if format != "PNG":
+                raise ValueError(f"16-bit images can only be written as PNG: {path}")
+            data = encode_png16(
+                image.array, options.compress_level, image.info.get("icc_profile")
+            )
+            with open(path, "wb") as file:
+                file.write(data)
+            return path
+        image = image.to_image()
+    if size and max(image.size) > size:
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    save_options = options.save_options(format)
+    if image.info.get("icc_profile"):
+        save_options["icc_profile"] = image.info["icc_profile"]
+    image.save(path, format=format, **save_options)
+    return path
+
+
+def write_outputs(image, path, options):
+    """Write the full image and its extra sizes one after another."""
+    return [
+        write_image(image, target, options, size)
+        for target, size in output_paths(path, options)
+    ]
+
+
+class Encoder:
+    """
+    Write images on a background thread pool.
+
+    ``submit`` returns as soon as the work is queued, so the caller can go
+    on compositing the next image. Every size of every image is a separate
+    task, so a thumbnail and the full image are encoded in parallel.
+
+    Args:
+        options: OutputOptions (default: the 'default' preset)
+        threads: Encoder threads (default: CPU count)
+    """
+
+    def __init__(self, options=None, threads=None):
+        # Imported here so importing this module (the CLI does) stays cheap
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.options = options or OutputOptions()
+        self.executor = ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 1)
+        self._pending = []
+
+    def submit(self, image, path):
+        """
+        Queue an image (and its extra sizes) to be written to path.
+
+        The image must not be modified until its writes are done.
+
+        Returns:
+            Future that resolves to the written paths, or to the first
+            error, once every file is done
+        """
+        from concurrent.futures import Future
+
+        parts = [
+            self.executor.submit(write_image, image, target, self.options, size)
+            for target, size in output_paths(path, self.options)
+        ]
+        combined = Future()
+        remaining = len(parts)
+        lock = threading.Lock()
+
+        def part_done(_):
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                if remaining:
+                    return
+            errors = [part.exception() for part in parts if part.exception()]
+            if errors:
+                combined.set_exception(errors[0])
+            else:
+                combined.set_result([part.result() for part in parts])
+
+        for part in parts:
+            part.add_done_callback(part_done)
+        self._pending.append((path, combined))
+        return combined
+
+    def record(self, path):
+        """
+        Record an image already written to path (such as one streamed to disk
+        strip by strip), so wait() still reports one result per image.
+        """
+        from concurrent.futures import Future
+
+        done = Future()
+        done.set_result([path])
+        self._pending.append((path, done))
+        return done
+
+    def wait(self):
+        """
+        Wait for every queued write.
+
+        Returns:
+            List of (path, error or None) per submitted image, in order
+        """
+        results = [(path, future.exception()) for path, future in self._pending]
+        self._pending = []
+        return results
+
+    def close(self):
+        """Wait for queued writes and stop the threads."""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
@@ -0,0 +1,275 @@
+"""
+Input Index - Recognize duplicate inputs and reuse outputs already rendered
+
+Feeds often deliver the same photo under several file names. The index keeps
+an exact content hash (BLAKE2b of the file's bytes) and a perceptual hash (a
+64-bit difference hash of the downscaled luminance) of every input it has
+seen, and the output files of every render keyed by (background, foreground,
+settings). A batch job whose inputs and settings match an earlier render is
+answered by copying that render's files instead of mixing again.
+
+By default only byte-identical inputs count as the same. With
+``near_distance``, images of the same pixel size whose perceptual hashes
+differ in at most that many of their 64 bits count as the same too, which
+catches re-encoded and re-tagged copies; such matches also ignore small
+changes in color or brightness, so it is opt-in.
+
+The index is one JSON file, rewritten atomically by ``save``. Files already
+hashed are recognized by path, size and modification time, so unchanged
+inputs are not read again. Only one process should write an index at a time
+(batch mode uses it from the parent process only).
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "index.json"
+)
+INDEX_FORMAT_VERSION = 1
+
+# Read size when hashing file contents
+_HASH_CHUNK_BYTES = 1 << 20
+
+# The difference hash compares neighbors on a 9x8 luminance thumbnail
+_DHASH_SIZE = (9, 8)
+
+
+@dataclass
+class InputHashes:
+    """
+    Hashes of one input file.
+
+    Args:
+        content: Hex BLAKE2b digest of the file's bytes
+        perceptual: 64-bit difference hash, or None if the file is not an
+            image Pillow can read (such as a prepared cutout)
+        size: (width, height) of the image, or None with no perceptual hash
+    """
+
+    content: str
+    perceptual: int = None
+    size: tuple = None
+
+
+def content_hash(path):
+    """Hex BLAKE2b digest of a file's bytes."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        while chunk := file.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image):
+    """
+    64-bit difference hash of an image.
+
+    Each bit says whether a pixel of a 9x8 grayscale thumbnail is brighter
+    than its right-hand neighbor, so the hash survives re-encoding, resizing
+    and small color changes. Only a JPEG's reduced-size DCT is decoded.
+
+    Args:
+        image: PIL Image, freshly opened (so a JPEG can be draft-decoded)
+
+    Returns:
+        (hash, (width, height)) with the size of the full image
+    """
+    size = image.size
+    image.draft("L", (_DHASH_SIZE[0] * 8, _DHASH_SIZE[1] * 8))
+    thumbnail = image.convert("L").resize(_DHASH_SIZE, Image.Resampling.BOX)
+    pixels = thumbnail.tobytes()
+    width = _DHASH_SIZE[0]
+    value = 0
+    for row in range(_DHASH_SIZE[1]):
+        line = pixels[row * width : (row + 1) * width]
+        for left, right in itertools.pairwise(line):
+            value = (value << 1) | (left > right)
+    return value, size
+
+
+def hash_distance(first, second):
+    """Number of differing bits between two perceptual hashes."""
+    return (first ^ second).bit_count()
+
+
+class InputIndex:
+    """
+    On-disk index of input hashes and rendered outputs.
+
+    Args:
+        path: JSON file holding the index (created by ``save``)
+        near_distance: Largest perceptual hash distance at which two images
+            of the same size count as the same input, or None to match
+            byte-identical files only
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, near_distance=None):
+        self.path = path
+        self.near_distance = near_distance
+        # Content hashes of inputs matched to a different known image
+        self.near_duplicates = set()
+        self._files = {}
+        self._inputs = {}
+        self._renders = {}
+        self._load()
+        # Perceptual hashes of known inputs by image size, for near matches
+        self._by_size = {}
+        for content, entry in self._inputs.items():
+            self._add_near(content, entry)
+
+    def _load(self):
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            # A missing or unreadable index only costs re-hashing
+            return
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            return
+        self._files = data.get("files", {})
+        self._inputs = data.get("inputs", {})
+        self._renders = data.get("renders", {})
+
+    def _add_near(self, content, entry):
+        if entry.get("perceptual") is not None:
+            size = tuple(entry["size"])
+            perceptual = int(entry["perceptual"], 16)
+            self._by_size.setdefault(size, []).append((perceptual, content))
+
+    def hashes(self, path):
+        """
+        Hash an input file, or look its hashes up if it has not changed.
+
+        Raises:
+            OSError: If the file cannot be read
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        known = self._files.get(path)
+        if known and known[:2] == signature and known[2] in self._inputs:
+            entry = self._inputs[known[2]]
+            return _entry_hashes(known[2], entry)
+
+        content = content_hash(path)
+        entry = self._inputs.get(content)
+        if entry is None:
+            entry = {}
+            try:
+                with Image.open(path) as image:
+                    perceptual, size = perceptual_hash(image)
+                entry = {"perceptual": f"{perceptual:016x}", "size": list(size)}
+            except (OSError, ValueError, Image.DecompressionBombError):
+                pass
+            self._inputs[content] = entry
+            self._add_near(content, entry)
+        self._files[path] = signature + [content]
+        return _entry_hashes(content, entry)
+
+    def input_id(self, path):
+        """
+        Identity of an input for render keys: its content hash, or with
+        near matching, that of the first known image it nearly duplicates.
+        """
+        hashes = self.hashes(path)
+        if self.near_distance is None or hashes.perceptual is None:
+            return hashes.content
+        for perceptual, content in self._by_size.get(hashes.size, ()):
+            if hash_distance(perceptual, hashes.perceptual) <= self.near_distance:
+                if content != hashes.content:
+                    self.near_duplicates.add(hashes.content)
+                return content
+        return hashes.content
+
+    def render_key(self, background, foreground, **settings):
+        """
+        Key of a render of two input files with the given settings.
+
+        Args:
+            background: Background path
+            foreground: Foreground path
+            **settings: Everything else that changes the output (blend
+                mode, opacity, threshold, output format, ...); values must
+                have a stable repr
+
+        Raises:
+            OSError: If an input cannot be read
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(
+            f"{self.input_id(background)}:{self.input_id(foreground)}".encode()
+        )
+        for name in sorted(settings):
+            digest.update(f";{name}={settings[name]!r}".encode())
+        return digest.hexdigest()
+
+    def find_render(self, key):
+        """
+        Output files of an earlier render, or None if there is none or any of
+        its files has been changed or removed since.
+        """
+        files = self._renders.get(key)
+        if files is not None:
+            for path, size, mtime_ns in files:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    break
+                if [stat.st_size, stat.st_mtime_ns] != [size, mtime_ns]:
+                    break
+            else:
+                return [path for path, _, _ in files]
+            del self._renders[key]
+        return None
+
+    def add_render(self, key, paths):
+        """Record the output files (full size first) of a finished render."""
+        files = []
+        for path in paths:
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            files.append([path, stat.st_size, stat.st_mtime_ns])
+        self._renders[key] = files
+
+    def save(self):
+        """Write the index atomically."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "files": self._files,
+            "inputs": self._inputs,
+            "renders": self._renders,
+        }
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(data, temp_file, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def _entry_hashes(content, entry):
+    if entry.get("perceptual") is None:
+        return InputHashes(content)
+    return InputHashes(content, int(entry["perceptual"], 16), tuple(entry["size"]))
+
+
+def copy_render(sources, targets):
+    """Copy a render's files to new paths (skipping any that are the same file)."""
+    for source, target in zip(sources, targets):
+        if os.path.abspath(source) != os.path.abspath(target):
+            shutil.copyfile(source, target)
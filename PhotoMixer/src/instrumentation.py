@@ -0,0 +1,198 @@
+"""
+Instrumentation - Per-stage timing and memory measurements for the mixing pipeline
+
+The pipeline reports progress messages and finished stages to hooks. A hook
+is any object with ``on_message(text)`` and ``on_stage(record)`` methods
+(subclass ``Hook`` to get no-op defaults). Built-in hooks print the progress
+lines (``ConsoleProgress``), write one JSON object per stage
+(``JsonLinesWriter``) or keep the records in memory (``StageCollector``).
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB (None if unknown)."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT / 2**20
+
+
+@dataclass
+class StageRecord:
+    """Measurements for one pipeline stage."""
+
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    rss_peak_mb: float = None
+    rss_growth_mb: float = None
+    traced_peak_mb: float = None
+    info: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        """Plain dict suitable for JSON serialization."""
+        return asdict(self)
+
+
+class Hook:
+    """Base class for instrumentation hooks; override the events you need."""
+
+    def on_message(self, text):
+        """A human-readable progress message."""
+
+    def on_stage(self, record):
+        """A stage finished; ``record`` is a StageRecord."""
+
+
+class ConsoleProgress(Hook):
+    """Print progress messages to stdout."""
+
+    def on_message(self, text):
+        print(text)
+
+
+class StageCollector(Hook):
+    """Keep every StageRecord in ``records``."""
+
+    def __init__(self):
+        self.records = []
+
+    def on_stage(self, record):
+        self.records.append(record)
+
+
+class JsonLinesWriter(Hook):
+    """
+    Append one JSON object per finished stage to a file (or stderr).
+
+    The file is opened lazily in append mode and each line is written in a
+    single call, so the writer can be pickled into worker processes that all
+    share one metrics file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._stream = None
+
+    def __getstate__(self):
+        return {"path": self.path, "_stream": None}
+
+    def on_stage(self, record):
+        if self._stream is None:
+            if self.path is None:
+                self._stream = sys.stderr
+            else:
+                self._stream = open(self.path, "a", buffering=1)
+        self._stream.write(json.dumps(record.to_dict()) + "\n")
+        self._stream.flush()
+
+
+class Instrumentation:
+    """
+    Measure pipeline stages and report them to hooks.
+
+    Use as a context manager around a run; on exit a ``total`` record covering
+    the whole run is reported.
+
+    Args:
+        hooks: Iterable of hooks to notify
+        trace_memory: Also measure Python/NumPy allocation peaks with
+            tracemalloc (slows allocation-heavy stages down)
+        context: Extra fields added to the ``info`` of every record
+    """
+
+    def __init__(self, hooks=(), trace_memory=False, context=None):
+        self.hooks = list(hooks)
+        self.trace_memory = trace_memory
+        self.context = dict(context or {})
+        self._started_tracing = False
+        self._start = None
+        self._traced_start = 0
+        self._traced_peak = 0
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def message(self, text):
+        """Send a progress message to every hook."""
+        for hook in self.hooks:
+            hook.on_message(text)
+
+    def _emit(self, record):
+        for hook in self.hooks:
+            hook.on_stage(record)
+
+    def _snapshot(self):
+        return time.perf_counter(), time.process_time(), peak_rss_mb()
+
+    def _record(self, name, start, info, traced_peak_mb=None):
+        wall, cpu, rss = self._snapshot()
+        start_wall, start_cpu, start_rss = start
+        return StageRecord(
+            stage=name,
+            wall_seconds=wall - start_wall,
+            cpu_seconds=cpu - start_cpu,
+            rss_peak_mb=rss,
+            rss_growth_mb=None if rss is None else rss - start_rss,
+            traced_peak_mb=traced_peak_mb,
+            info={**self.context, "pid": os.getpid(), **info},
+        )
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.trace_memory:
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+            self._traced_peak = self._traced_start
+        self._start = self._snapshot()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        traced = None
+        if self.trace_memory:
+            traced = (self._traced_peak - self._traced_start) / 2**20
+        info = {"status": "ok" if exc_type is None else "error"}
+        self._emit(self._record("total", self._start, info, traced))
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Measure the enclosed block as one stage.
+
+        Yields the stage's ``info`` dict so the block can add details (sizes,
+        cache outcome, ...) to the record.
+        """
+        traced_start = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = self._snapshot()
+
+        yield info
+
+        traced = None
+        if traced_start is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            self._traced_peak = max(self._traced_peak, peak)
+            traced = (peak - traced_start) / 2**20
+        self._emit(self._record(name, start, info, traced))
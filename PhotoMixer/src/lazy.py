@@ -0,0 +1,62 @@
+"""
+Lazy Imports - Defer loading heavy dependencies until they are first used
+
+NumPy and Pillow take most of the mixer's start-up time, yet ``--help``,
+argument errors and missing-file errors never touch them. Modules bind them
+with ``np = lazy_import("numpy")`` instead of ``import numpy as np``; the
+real import happens the first time an attribute is looked up, after which the
+module's attributes are copied in, so later lookups cost the same as on the
+real module.
+
+``importlib.util.LazyLoader`` is not used because it is not safe to trigger
+from several threads at once before Python 3.12, and the mixer's encoder and
+server threads can be the first to touch NumPy or Pillow.
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+_lock = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """Stands in for a module until one of its attributes is first used."""
+
+    def _load(self):
+        module = self.__dict__.get("_module")
+        if module is None:
+            with _lock:
+                module = self.__dict__.get("_module")
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__.update(module.__dict__)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attribute):
+        # Only reached for attributes not copied in yet, which after the
+        # first load means the module's own lazily created attributes
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """
+    A module that is imported on first attribute access.
+
+    Thread-safe: the first use from any thread imports the module once.
+
+    Args:
+        name: Absolute module name, such as 'numpy' or 'PIL.Image'
+
+    Returns:
+        The module itself if it is already imported, otherwise a stand-in
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
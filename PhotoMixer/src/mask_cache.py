@@ -0,0 +1,101 @@
+"""
+Mask Cache - Persistent on-disk cache of background-removal alpha masks
+
+Masks are keyed by a hash of the foreground's pixels plus every parameter that
+affects removal (threshold, algorithm version, ...), stored as compressed
+grayscale PNGs and evicted least-recently-used first once the cache grows past
+its size limit. Writes are atomic, so several worker processes can share one
+cache directory.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "masks"
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class MaskCache:
+    """LRU-evicted directory of alpha masks with hit/miss counters."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, image, **params):
+        """Build a cache key from an image's pixels and the removal parameters."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.mode}:{image.size}".encode())
+        for name in sorted(params):
+            digest.update(f";{name}={params[name]}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Return the cached mask as an 'L' image, or None on a miss."""
+        path = self._path(key)
+        try:
+            with Image.open(path) as mask:
+                mask.load()
+            # Refresh the access time so eviction is least-recently-used
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return mask
+
+    def put(self, key, mask):
+        """Store a mask ('L' image) and evict old entries if over the size limit."""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                mask.save(temp_file, format="PNG", compress_level=1)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """Remove least-recently-used masks until the cache fits its size limit."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".png"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """Human-readable hit/miss counters."""
+        return f"Mask cache: {self.hits} hit(s), {self.misses} miss(es)"
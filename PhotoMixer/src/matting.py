@@ -0,0 +1,202 @@
+"""
+Matting - Soft subject edges for the binary masks of background removal
+
+The heuristic classifier labels every pixel subject or background, so
+anti-aliased or blurred outlines come out as hard, jagged steps.
+``refine_alpha`` treats such a mask as a trimap: pixels farther than a few
+pixels from the mask boundary keep their label, and the band around the
+boundary is re-estimated with a color guided filter (He, Sun and Tang), which
+makes alpha a locally linear function of the image colors there.
+
+The filter coefficients are computed on a copy reduced by a whole factor (the
+"fast guided filter") and interpolated back only at the band's pixels, so the
+cost is a handful of box filters at reduced resolution plus per-pixel work
+along the boundary.
+"""
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+# Band half-width as a fraction of the longest side, and its bounds in pixels
+BAND_FRACTION = 1 / 200
+MIN_BAND_RADIUS = 2
+MAX_BAND_RADIUS = 32
+
+# Filter radius, in pixels of the reduced copy
+FILTER_RADIUS = 3
+
+# Guided filter regularization on colors in 0-1: larger values smooth more,
+# smaller ones follow color edges more closely
+EPSILON = 1e-3
+
+
+def _window_sums(array, radius):
+    """Sums over windows of 2 * radius + 1 rows, clipped at the first and last row."""
+    rows = array.shape[0]
+    cumulative = np.zeros((rows + 1,) + array.shape[1:], dtype=np.float64)
+    np.cumsum(array, axis=0, out=cumulative[1:])
+    index = np.arange(rows)
+    return (
+        cumulative[np.minimum(index + radius + 1, rows)]
+        - cumulative[np.maximum(index - radius, 0)]
+    )
+
+
+def box_mean(array, radius):
+    """
+    Mean over (2 * radius + 1)-pixel square windows, clipped at the edges.
+
+    Works on (H, W) and (H, W, C) arrays in time independent of the radius.
+    """
+    sums = _window_sums(_window_sums(array, radius).swapaxes(0, 1), radius)
+    sums = sums.swapaxes(0, 1)
+    height, width = array.shape[:2]
+    counts = np.outer(
+        _window_sums(np.ones(height), radius), _window_sums(np.ones(width), radius)
+    )
+    if array.ndim == 3:
+        counts = counts[:, :, None]
+    return (sums / counts).astype(np.float32)
+
+
+def guided_filter_coefficients(guide, source, radius, epsilon=EPSILON):
+    """
+    Coefficients of the color guided filter.
+
+    The filtered output at a pixel is ``sum(a * guide) + b``, with ``a`` and
+    ``b`` already averaged over the windows containing that pixel.
+
+    Args:
+        guide: (H, W, 3) float32 colors in 0-1
+        source: (H, W) float32 image to filter (here the mask, 0-1)
+        radius: Window radius in pixels
+        epsilon: Regularization
+
+    Returns:
+        (a, b) as (H, W, 3) and (H, W) float32 arrays
+    """
+    mean_guide = box_mean(guide, radius)
+    mean_source = box_mean(source, radius)
+    covariance = box_mean(guide * source[:, :, None], radius)
+    covariance -= mean_guide * mean_source[:, :, None]
+
+    # Per-pixel 3x3 color covariance (symmetric, regularized) and its inverse
+    # through cofactors, which is far faster than a batched solve
+    def variance(i, j):
+        value = box_mean(guide[:, :, i] * guide[:, :, j], radius)
+        value -= mean_guide[:, :, i] * mean_guide[:, :, j]
+        if i == j:
+            value += epsilon
+        return value
+
+    rr, rg, rb = variance(0, 0), variance(0, 1), variance(0, 2)
+    gg, gb, bb = variance(1, 1), variance(1, 2), variance(2, 2)
+    inv_rr = gg * bb - gb * gb
+    inv_rg = gb * rb - rg * bb
+    inv_rb = rg * gb - gg * rb
+    inv_gg = rr * bb - rb * rb
+    inv_gb = rb * rg - rr * gb
+    inv_bb = rr * gg - rg * rg
+    determinant = rr * inv_rr + rg * inv_rg + rb * inv_rb
+
+    cov_r, cov_g, cov_b = (covariance[:, :, i] for i in range(3))
+    a = np.stack(
+        [
+            inv_rr * cov_r + inv_rg * cov_g + inv_rb * cov_b,
+            inv_rg * cov_r + inv_gg * cov_g + inv_gb * cov_b,
+            inv_rb * cov_r + inv_gb * cov_g + inv_bb * cov_b,
+        ],
+        axis=-1,
+    )
+    a /= determinant[:, :, None]
+    b = mean_source - np.einsum("ijk,ijk->ij", a, mean_guide)
+    return box_mean(a, radius), box_mean(b, radius)
+
+
+def _bilinear(values, ys, xs):
+    """Sample (H, W[, C]) values at fractional pixel coordinates, clamped."""
+    height, width = values.shape[:2]
+    y0 = np.clip(np.floor(ys), 0, max(height - 2, 0)).astype(np.intp)
+    x0 = np.clip(np.floor(xs), 0, max(width - 2, 0)).astype(np.intp)
+    y1 = np.minimum(y0 + 1, height - 1)
+    x1 = np.minimum(x0 + 1, width - 1)
+    fy = np.clip(ys - y0, 0, 1).astype(np.float32)
+    fx = np.clip(xs - x0, 0, 1).astype(np.float32)
+    if values.ndim == 3:
+        fy, fx = fy[:, None], fx[:, None]
+    top = values[y0, x0] * (1 - fx) + values[y0, x1] * fx
+    bottom = values[y1, x0] * (1 - fx) + values[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def band_radius(size):
+    """Half-width in pixels of the band refined around the mask boundary."""
+    radius = round(max(size) * BAND_FRACTION)
+    return min(MAX_BAND_RADIUS, max(MIN_BAND_RADIUS, radius))
+
+
+def refine_alpha(rgb, mask, radius=None, epsilon=EPSILON):
+    """
+    Soften a binary subject mask along its boundary.
+
+    Args:
+        rgb: (H, W, 3) uint8 image
+        mask: (H, W) bool or uint8 mask, nonzero for the subject
+        radius: Half-width of the refined band in pixels (default: scaled
+            with the image, see band_radius)
+        epsilon: Guided filter regularization
+
+    Returns:
+        (H, W) uint8 alpha; equal to the mask (as 0/255) outside the band
+    """
+    height, width = mask.shape
+    mask = mask.astype(bool)
+    alpha = mask * np.uint8(255)
+    radius = radius or band_radius((width, height))
+
+    # Work at a whole-factor reduction that leaves the filter a few pixels wide
+    factor = max(1, radius // FILTER_RADIUS)
+    small_rgb = Image.fromarray(rgb)
+    small_mask = Image.fromarray(alpha)
+    if factor > 1:
+        small_rgb = small_rgb.reduce(factor)
+        small_mask = small_mask.reduce(factor)
+    guide = np.asarray(small_rgb, dtype=np.float32) / 255
+    source = np.asarray(small_mask, dtype=np.float32) / 255
+
+    # The band: reduced pixels with both labels within the radius
+    coverage = box_mean(source, -(-radius // factor))
+    band = (coverage > 0) & (coverage < 1)
+    if not band.any():
+        return alpha
+
+    # Only the band's bounding box (plus the filter's reach) is filtered
+    rows, cols = np.nonzero(band)
+    reach = 2 * FILTER_RADIUS + 1
+    top, left = max(0, rows.min() - reach), max(0, cols.min() - reach)
+    bottom = min(source.shape[0], rows.max() + reach + 1)
+    right = min(source.shape[1], cols.max() + reach + 1)
+    a, b = guided_filter_coefficients(
+        guide[top:bottom, left:right],
+        source[top:bottom, left:right],
+        min(FILTER_RADIUS, radius),
+        epsilon,
+    )
+
+    # Full-resolution pixels of every band pixel's factor x factor block
+    offsets = np.arange(factor)
+    ys = (rows[:, None, None] * factor + offsets[None, :, None]).repeat(factor, 2)
+    xs = (cols[:, None, None] * factor + offsets[None, None, :]).repeat(factor, 1)
+    inside = (ys < height) & (xs < width)
+    ys, xs = ys[inside], xs[inside]
+
+    # Reduced-copy coordinates of the full-resolution pixel centres
+    small_ys = (ys + 0.5) / factor - 0.5 - top
+    small_xs = (xs + 0.5) / factor - 0.5 - left
+    colors = rgb[ys, xs].astype(np.float32) / 255
+    refined = np.einsum("ij,ij->i", _bilinear(a, small_ys, small_xs), colors)
+    refined += _bilinear(b, small_ys, small_xs)
+    alpha[ys, xs] = np.rint(np.clip(refined, 0, 1) * 255).astype(np.uint8)
+    return alpha
@@ -0,0 +1,170 @@
+"""
+Parallel - Split the work on one image into bands processed on a thread pool
+
+NumPy's array operations and Pillow's resampling release the GIL while they
+run, so the stages of a single mix can use several cores from threads: the
+image is cut into bands of rows, every band is processed on its own thread,
+and the results are written into disjoint slices of one output. Per-pixel
+stages split anywhere; a stage that looks at a neighbourhood reads ``halo``
+extra rows on each side of its band and keeps only its own rows.
+
+Resampling is split into its two passes, which is how Pillow computes it
+anyway: the horizontal pass over bands of rows, then the vertical pass over
+bands of columns. Each band then uses exactly the filter coefficients of a
+whole-image resize, so the result is bit-identical (bands of output rows
+would not be: Pillow's coefficients depend on the band's offset).
+"""
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+# Fewest pixels worth a band of their own; smaller work is not split
+MIN_BAND_PIXELS = 64 * 1024
+
+
+def band_ranges(length, threads, minimum=1):
+    """
+    Split range(length) into at most ``threads`` near-equal bands.
+
+    Args:
+        length: Number of rows (or other items) to split
+        threads: Most bands to make
+        minimum: Fewest rows per band; fewer, larger bands are made when the
+            length is too short
+
+    Returns:
+        List of (start, stop) pairs covering range(length) in order
+    """
+    count = max(1, min(threads, length // max(1, minimum)))
+    return [
+        (length * index // count, length * (index + 1) // count)
+        for index in range(count)
+        if length * (index + 1) // count > length * index // count
+    ]
+
+
+def run_bands(function, length, threads=1, minimum=1):
+    """
+    Call ``function(start, stop)`` for every band of range(length).
+
+    Bands run on a thread pool when there is more than one, and inline
+    otherwise. The function must only write to its own band of the output.
+
+    Args:
+        function: Band worker
+        length: Number of rows to split
+        threads: Most bands (and threads) to use
+        minimum: Fewest rows per band
+
+    Returns:
+        The function's results, in band order
+
+    Raises:
+        Exception: The first error raised by a band, once all bands are done
+    """
+    bands = band_ranges(length, threads, minimum)
+    if len(bands) <= 1:
+        return [function(start, stop) for start, stop in bands]
+
+    # Imported here so importing this module (the CLI does) stays cheap
+    from concurrent.futures import ThreadPoolExecutor
+
+    # A fresh pool per call, so a process forked while none is running never
+    # inherits a pool whose threads do not exist in the child
+    with ThreadPoolExecutor(max_workers=len(bands)) as executor:
+        futures = [executor.submit(function, start, stop) for start, stop in bands]
+    return [future.result() for future in futures]
+
+
+def rows_per_band(width):
+    """Fewest rows per band for rows of the given width in pixels."""
+    return max(1, MIN_BAND_PIXELS // max(1, width))
+
+
+def halo_band(array, start, stop, halo):
+    """
+    Rows start-halo to stop+halo of an array, clipped to its edges.
+
+    Returns:
+        (rows, top, bottom): the rows, and how many halo rows were available
+        above and below the band (less than halo at the array's edges)
+    """
+    first = max(0, start - halo)
+    last = min(len(array), stop + halo)
+    return array[first:last], start - first, last - stop
+
+
+# Modes Pillow resizes through premultiplied alpha, and the premultiplied mode
+_PREMULTIPLIED = {"RGBA": "RGBa", "LA": "La"}
+
+# 8-bit modes Pillow resamples with the filter it is given (it falls back to
+# NEAREST for palette and bilevel images, which cannot be split this way)
+_SPLIT_MODES = ("L", "LA", "La", "RGB", "RGBA", "RGBa")
+
+
+def resize_image(image, size, resample=None, box=None, threads=1):
+    """
+    Resize an image like ``Image.resize``, bit-identically, on several threads.
+
+    Args:
+        image: PIL Image
+        size: (width, height) of the result
+        resample: Pillow resampling filter (default: LANCZOS); NEAREST, and
+            modes other than L, LA, RGB and RGBA, run on one thread
+        box: Source region to resize, as in Image.resize (default: all of it)
+        threads: Most threads to use; small images use fewer
+
+    Returns:
+        Resized PIL Image
+    """
+    if resample is None:
+        resample = Image.Resampling.LANCZOS
+    width, height = size
+    if (
+        threads <= 1
+        or resample == Image.Resampling.NEAREST
+        or image.mode not in _SPLIT_MODES
+        or max(image.width, width) * max(image.height, height) < 2 * MIN_BAND_PIXELS
+    ):
+        return image.resize(size, resample, box=box)
+
+    mode = image.mode
+    if mode in _PREMULTIPLIED:
+        image = image.convert(_PREMULTIPLIED[mode])
+    left, top, right, bottom = box or (0, 0, image.width, image.height)
+
+    # Horizontal pass over bands of source rows (a band keeps its height, so
+    # Pillow skips the vertical pass)
+    horizontal = Image.new(image.mode, (width, image.height))
+
+    def resize_rows(start, stop):
+        band = image.crop((0, start, image.width, stop))
+        band = band.resize(
+            (width, stop - start), resample, box=(left, 0, right, band.height)
+        )
+        return band, start
+
+    for band, start in run_bands(
+        resize_rows, image.height, threads, rows_per_band(image.width)
+    ):
+        horizontal.paste(band, (0, start))
+
+    # Vertical pass over bands of columns (and no horizontal pass)
+    result = Image.new(image.mode, size)
+
+    def resize_columns(start, stop):
+        band = horizontal.crop((start, 0, stop, horizontal.height))
+        band = band.resize(
+            (band.width, height), resample, box=(0, top, band.width, bottom)
+        )
+        return band, start
+
+    for band, start in run_bands(
+        resize_columns, width, threads, rows_per_band(image.height)
+    ):
+        result.paste(band, (start, 0))
+
+    if mode in _PREMULTIPLIED:
+        result = result.convert(mode)
+    return result
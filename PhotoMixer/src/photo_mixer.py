@@ -3,12 +3,64 @@
 Photo Mixer - Combines a background image with a foreground photo
 """
 
+import io
 import os
-from PIL import Image
 import sys
+import threading
+import time
 import argparse
-import numpy as np
-from scipy import ndimage
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+
+from lazy import lazy_import
+from instrumentation import ConsoleProgress, Instrumentation, JsonLinesWriter
+from mask_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, MaskCache
+from input_index import DEFAULT_INDEX_PATH, InputIndex
+from cutout import CUTOUT_SUFFIX, Cutout, is_cutout_path
+from encoding import (
+    FORMAT_NAMES,
+    PRESETS,
+    OutputOptions,
+    PngStripWriter,
+    encode_png16,
+    preset,
+    write_outputs,
+)
+from color import (
+    DeepImage,
+    convert_profile,
+    deep_image,
+    image_profile,
+    read_deep,
+    srgb_profile,
+    to_16bit,
+)
+from matting import refine_alpha
+from parallel import halo_band, resize_image, rows_per_band, run_bands
+from placement import (
+    DEFAULT_SCALES,
+    PLACEMENTS,
+    SALIENCY_CACHE,
+    choose_placement,
+    source_key,
+)
+from strips import StripReader
+from sweep import contact_sheet, parse_thresholds
+from compositing import (
+    BLEND_MODES,
+    PRECISIONS,
+    Workspace,
+    blend_images,
+    composite,
+    composite_layers,
+    composite_tiled,
+    strip_rows,
+)
+
+# NumPy and Pillow are imported on first use, so --help and argument or path
+# errors return without loading them
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
 
 
 def get_image_path(prompt):
@@ -30,135 +82,467 @@ def get_image_path(prompt):
 
 def blend_with_alpha(background, foreground, position):
     """Blend foreground onto background using proper alpha compositing."""
-    # Convert to numpy arrays for pixel-level operations
-    bg_array = np.array(background.convert("RGB"))
-    fg_array = np.array(foreground.convert("RGBA"))
+    return blend_images(background, foreground, position, "normal")
 
-    x, y = position
-    fg_height, fg_width = fg_array.shape[:2]
-    bg_height, bg_width = bg_array.shape[:2]
 
-    # Calculate the region to blend
-    x1 = max(0, x)
-    y1 = max(0, y)
-    x2 = min(bg_width, x + fg_width)
-    y2 = min(bg_height, y + fg_height)
+def blend_mode_multiply(background, foreground, position):
+    """Multiply blend mode with proper alpha handling."""
+    return blend_images(background, foreground, position, "multiply")
 
-    # Calculate offsets in foreground image
-    fg_x1 = x1 - x
-    fg_y1 = y1 - y
-    fg_x2 = fg_x1 + (x2 - x1)
-    fg_y2 = fg_y1 + (y2 - y1)
 
-    # Extract the regions
-    bg_region = bg_array[y1:y2, x1:x2].copy().astype(np.float32)
-    fg_region = fg_array[fg_y1:fg_y2, fg_x1:fg_x2].astype(np.float32)
+def blend_mode_screen(background, foreground, position):
+    """Screen blend mode with proper alpha handling."""
+    return blend_images(background, foreground, position, "screen")
 
-    # Extract alpha channel and normalize to 0-1
-    alpha = fg_region[:, :, 3:4] / 255.0
-    fg_rgb = fg_region[:, :, :3]
 
-    # Alpha compositing: result = foreground * alpha + background * (1 - alpha)
-    blended = (fg_rgb * alpha + bg_region * (1 - alpha)).astype(np.uint8)
+def blend_mode_overlay(background, foreground, position):
+    """Overlay blend mode with proper alpha handling."""
+    return blend_images(background, foreground, position, "overlay")
 
-    # Paste the blended region back
-    bg_array[y1:y2, x1:x2] = blended
 
-    return Image.fromarray(bg_array, "RGB")
+REMOVAL_ORDERS = ("remove-first", "resize-first", "auto")
 
+# Bump whenever remove_background's output changes, so cached masks are ignored
+REMOVE_BACKGROUND_VERSION = 1
 
-def blend_mode_multiply(background, foreground, position):
-    """Multiply blend mode with proper alpha handling."""
-    bg_array = np.array(background.convert("RGB")).astype(np.float32)
-    fg_array = np.array(foreground.convert("RGBA")).astype(np.float32)
+# Lightness for every possible R + G + B sum, and color distance for every
+# possible 4x squared distance to a (half-integer) median edge color. Both are
+# computed with the same float32 operations the per-pixel formulas use, so
+# comparing these tables against a threshold gives bit-identical masks.
+_LIGHTNESS_BY_SUM = None
+_COLOR_DIFF_BY_DIST4 = None
 
-    x, y = position
-    fg_height, fg_width = fg_array.shape[:2]
-    bg_height, bg_width = bg_array.shape[:2]
 
-    x1, y1 = max(0, x), max(0, y)
-    x2, y2 = min(bg_width, x + fg_width), min(bg_height, y + fg_height)
-    fg_x1, fg_y1 = x1 - x, y1 - y
-    fg_x2, fg_y2 = fg_x1 + (x2 - x1), fg_y1 + (y2 - y1)
+def _removal_tables():
+    """Build (once) the lightness and color-distance lookup tables."""
+    global _LIGHTNESS_BY_SUM, _COLOR_DIFF_BY_DIST4
+    if _LIGHTNESS_BY_SUM is None:
+        sums = np.zeros((3 * 255 + 1, 3), dtype=np.float32)
+        sums[:, 0] = np.arange(3 * 255 + 1)
+        _LIGHTNESS_BY_SUM = np.mean(sums, axis=1)
 
-    bg_region = bg_array[y1:y2, x1:x2]
-    fg_region = fg_array[fg_y1:fg_y2, fg_x1:fg_x2]
+        dist4 = np.arange(3 * 510 * 510 + 1) / 4
+        _COLOR_DIFF_BY_DIST4 = np.sqrt(dist4.astype(np.float32))
+    return _LIGHTNESS_BY_SUM, _COLOR_DIFF_BY_DIST4
 
-    alpha = fg_region[:, :, 3:4] / 255.0
-    fg_rgb = fg_region[:, :, :3]
 
-    # Multiply: A * B / 255
-    multiplied = bg_region * fg_rgb / 255.0
-    # Blend with alpha
-    blended = (multiplied * alpha + bg_region * (1 - alpha)).astype(np.uint8)
+def _count_below(table, limit):
+    """For a non-decreasing table: table[v] < limit exactly when v < result."""
+    return int(np.count_nonzero(table < limit))
 
-    bg_array[y1:y2, x1:x2] = blended
-    return Image.fromarray(bg_array, "RGB")
 
+def _count_not_above(table, limit):
+    """For a non-decreasing table: table[v] > limit exactly when v >= result."""
+    return int(np.count_nonzero(~(table > limit)))
 
-def blend_mode_screen(background, foreground, position):
-    """Screen blend mode with proper alpha handling."""
-    bg_array = np.array(background.convert("RGB")).astype(np.float32)
-    fg_array = np.array(foreground.convert("RGBA")).astype(np.float32)
 
-    x, y = position
-    fg_height, fg_width = fg_array.shape[:2]
-    bg_height, bg_width = bg_array.shape[:2]
+def _edge_color2(img_rgb):
+    """
+    Twice the median color of the image's edge bands, as int32 (or None).
+
+    The median of integer pixels is a multiple of 0.5, so twice it is exact.
+    """
+    height, width = img_rgb.shape[:2]
+    edge_width = max(10, min(30, width // 8, height // 8))
+    edge_pixels = np.concatenate(
+        [
+            img_rgb[0:edge_width, :].reshape(-1, 3),
+            img_rgb[height - edge_width : height, :].reshape(-1, 3),
+            img_rgb[:, 0:edge_width].reshape(-1, 3),
+            img_rgb[:, width - edge_width : width].reshape(-1, 3),
+        ]
+    )
+    if len(edge_pixels) == 0:
+        return None
+    return np.rint(np.median(edge_pixels, axis=0) * 2).astype(np.int32)
 
-    x1, y1 = max(0, x), max(0, y)
-    x2, y2 = min(bg_width, x + fg_width), min(bg_height, y + fg_height)
-    fg_x1, fg_y1 = x1 - x, y1 - y
-    fg_x2, fg_y2 = fg_x1 + (x2 - x1), fg_y1 + (y2 - y1)
 
-    bg_region = bg_array[y1:y2, x1:x2]
-    fg_region = fg_array[fg_y1:fg_y2, fg_x1:fg_x2]
+@dataclass
+class RemovalFeatures:
+    """
+    The threshold-independent per-pixel features of background removal.
 
-    alpha = fg_region[:, :, 3:4] / 255.0
-    fg_rgb = fg_region[:, :, :3]
+    Args:
+        channel_sum: R + G + B as int32 (lightness is compared through it)
+        dist4: 4x the squared distance to the edge color as int32, or None
+            when the image has no edge to sample
+        likely_subject: Medium-dark and colorful pixels, kept unless they are
+            close to the edge color
+        sure_subject: Very dark or very colorful pixels, always kept
+        gray_background: Light, unsaturated pixels, always background
+    """
 
-    # Screen: 255 - (255 - A) * (255 - B) / 255
-    screened = 255.0 - ((255.0 - bg_region) * (255.0 - fg_rgb) / 255.0)
-    # Blend with alpha
-    blended = (screened * alpha + bg_region * (1 - alpha)).astype(np.uint8)
+    channel_sum: "np.ndarray"
+    dist4: "np.ndarray"
+    likely_subject: "np.ndarray"
+    sure_subject: "np.ndarray"
+    gray_background: "np.ndarray"
 
-    bg_array[y1:y2, x1:x2] = blended
-    return Image.fromarray(bg_array, "RGB")
 
+def _removal_features(img_rgb, bg_color2):
+    """
+    Compute the RemovalFeatures of any (..., 3) uint8 array.
 
-def blend_mode_overlay(background, foreground, position):
-    """Overlay blend mode with proper alpha handling."""
-    bg_array = np.array(background.convert("RGB")).astype(np.float32)
-    fg_array = np.array(foreground.convert("RGBA")).astype(np.float32)
+    Each pixel depends only on its own color and the edge color from
+    ``_edge_color2``.
+    """
+    lightness_table, _ = _removal_tables()
+
+    # Everything below works on exact integers in int32 buffers, updated in
+    # place: lightness is compared through the channel sum, saturation (the
+    # std of R, G, B) through 9 * variance and color distance through its
+    # square, so no float frames or square roots are needed.
+    red, green, blue = (img_rgb[..., i].astype(np.int32) for i in range(3))
+    channel_sum = red + green
+    channel_sum += blue
+    squares = red * red
+    scratch = np.multiply(green, green)
+    squares += scratch
+    np.multiply(blue, blue, out=scratch)
+    squares += scratch
+
+    # saturation = sqrt(spread) / 3 with spread = 3 * sum(c^2) - (sum c)^2
+    spread = squares * 3
+    np.multiply(channel_sum, channel_sum, out=scratch)
+    spread -= scratch
+    low_saturation = spread < 25**2 * 9
+    has_color = spread > 10**2 * 9
+    very_colorful = spread > 25**2 * 9
+
+    # The float32 std can land either side of a threshold only when the exact
+    # value sits on it; evaluate those few pixels exactly as np.std does
+    on_threshold = (spread == 10**2 * 9) | (spread == 25**2 * 9)
+    if np.any(on_threshold):
+        saturation = np.std(img_rgb[on_threshold].astype(np.float32), axis=-1)
+        low_saturation[on_threshold] = saturation < 25
+        has_color[on_threshold] = saturation > 10
+        very_colorful[on_threshold] = saturation > 25
+    del spread
+
+    # Remove low saturation areas (grayish backgrounds) that are also light
+    gray_background = low_saturation
+    gray_background &= channel_sum >= _count_not_above(lightness_table, 160)
+
+    # Subject typically has: medium to dark colors, some saturation, different from edges
+    likely_subject = channel_sum < _count_below(lightness_table, 220)
+    likely_subject &= has_color
+
+    # Very dark or very colorful areas are definitely subject
+    sure_subject = very_colorful
+    sure_subject |= channel_sum < _count_below(lightness_table, 120)
+
+    dist4 = None
+    if bg_color2 is not None:
+        # 4 * squared distance = sum((2c - 2bg)^2)
+        #                      = 4 * sum(c^2) - sum(c * 4 * 2bg) + sum(2bg^2)
+        dist4 = np.multiply(squares, 4, out=squares)
+        for channel, value in zip((red, green, blue), bg_color2):
+            np.multiply(channel, 4 * int(value), out=scratch)
+            dist4 -= scratch
+        dist4 += int(np.dot(bg_color2, bg_color2))
+
+    return RemovalFeatures(
+        channel_sum, dist4, likely_subject, sure_subject, gray_background
+    )
+
+
+def _threshold_cutoffs(threshold):
+    """
+    The integer feature cutoffs a threshold stands for.
+
+    Returns:
+        (light, similar, distinct): pixels with channel_sum >= light are very
+        light, with dist4 < similar close to the edge color, and with
+        dist4 >= distinct different enough from it to be subject
+    """
+    lightness_table, color_diff_table = _removal_tables()
+    return (
+        # More aggressive with lower threshold
+        _count_not_above(lightness_table, 200 - threshold * 0.5),
+        _count_below(color_diff_table, threshold),
+        _count_not_above(color_diff_table, threshold * 0.5),
+    )
+
+
+def _features_alpha(features, threshold):
+    """
+    Classify pixels as subject (True) or background (False) at a threshold.
+    """
+    light, similar, distinct = _threshold_cutoffs(threshold)
+
+    # AGGRESSIVE METHOD: Remove all light/gray areas (common office backgrounds)
+    background_mask = features.channel_sum >= light
+    background_mask |= features.gray_background
+
+    if features.dist4 is not None:
+        # Background is similar to edge color OR very light OR gray, and the
+        # subject should be different from the background color
+        background_mask |= features.dist4 < similar
+        subject_mask = features.dist4 >= distinct
+        subject_mask &= features.likely_subject
+    else:
+        # Fallback: just use lightness and saturation
+        subject_mask = features.likely_subject.copy()
+    subject_mask |= features.sure_subject
+
+    # Keep the subject and everything that does not look like background. The
+    # alpha is strictly binary, so edge clearing, smoothing, particle cleanup
+    # and hole filling can never change it and are not performed.
+    subject_mask |= ~background_mask
+    return subject_mask
+
+
+def _subject_alpha(img_rgb, threshold, bg_color2, threads=1):
+    """
+    Classify pixels as subject (True) or background (False).
+
+    Works on any (..., 3) uint8 array; each pixel depends only on its own
+    color, the threshold and the edge color from ``_edge_color2``, so with
+    several threads the first axis is split into bands classified at the
+    same time.
+    """
+    if threads <= 1:
+        return _features_alpha(_removal_features(img_rgb, bg_color2), threshold)
+
+    _removal_tables()
+    alpha = np.empty(img_rgb.shape[:-1], dtype=bool)
+
+    def classify(start, stop):
+        features = _removal_features(img_rgb[start:stop], bg_color2)
+        alpha[start:stop] = _features_alpha(features, threshold)
+
+    pixels_per_row = img_rgb[0, ..., 0].size if len(img_rgb) else 1
+    run_bands(classify, len(img_rgb), threads, rows_per_band(pixels_per_row))
+    return alpha
+
+
+def _boundary(alpha, threads=1):
+    """
+    Pixels of a mask with a differently-labelled 8-neighbour (edges repeat).
+
+    Bands of rows are processed on separate threads, each reading one halo
+    row above and below so the result does not depend on the banding.
+    """
+    boundary = np.empty_like(alpha)
+
+    def find_boundary(start, stop):
+        rows, above, below = halo_band(alpha, start, stop, 1)
+        # Edge rows repeat only at the mask's own edges; elsewhere the halo
+        # rows are the real neighbours
+        padded = np.pad(rows, ((1 - above, 1 - below), (1, 1)), mode="edge")
+        height, width = stop - start, alpha.shape[1]
+        any_subject = np.zeros((height, width), dtype=bool)
+        all_subject = np.ones((height, width), dtype=bool)
+        for dy in range(3):
+            for dx in range(3):
+                window = padded[dy : dy + height, dx : dx + width]
+                any_subject |= window
+                all_subject &= window
+        boundary[start:stop] = any_subject & ~all_subject
+
+    run_bands(find_boundary, len(alpha), threads, rows_per_band(alpha.shape[1]))
+    return boundary
+
+
+class ThresholdSweep:
+    """
+    Background-removal masks for many thresholds from one feature pass.
+
+    The threshold only moves three integer cutoffs (see _threshold_cutoffs),
+    each monotonically, so a pixel that is background at one threshold stays
+    background at every higher one. The sweep therefore stores a single level
+    map: the number of swept thresholds, in increasing order, at which each
+    pixel is still subject. The mask for any swept threshold is one
+    comparison against it, and matches remove_background exactly.
+
+    Args:
+        image: Foreground as a PIL Image
+        thresholds: Thresholds to evaluate (0-100)
+    """
+
+    def __init__(self, image, thresholds):
+        self.thresholds = sorted(set(thresholds))
+        if not self.thresholds:
+            raise InvalidParameterError(
+                "A threshold sweep needs at least one threshold"
+            )
+        for threshold in self.thresholds:
+            validate_options(bg_threshold=threshold)
+        if len(self.thresholds) > 255:
+            raise InvalidParameterError(
+                "A threshold sweep takes at most 255 thresholds"
+            )
+
+        rgb_image = image if image.mode == "RGB" else image.convert("RGB")
+        self.size = rgb_image.size
+        img_rgb = np.asarray(rgb_image)
+        self.levels = self._levels(_removal_features(img_rgb, _edge_color2(img_rgb)))
+
+    def _levels(self, features):
+        """Count, per pixel, the leading thresholds at which it is subject."""
+        light, similar, distinct = np.array(
+            [_threshold_cutoffs(threshold) for threshold in self.thresholds]
+        ).T
+        count = len(self.thresholds)
+
+        # Each condition holds for a prefix of the sorted thresholds. Its
+        # length depends only on one bounded integer feature, so it is read
+        # from a table built by binary search over every feature value.
+        # light is non-increasing: channel_sum < light for the first n
+        not_light = np.searchsorted(-light, -np.arange(3 * 255 + 1), side="left")
+        kept = np.take(not_light.astype(np.uint8), features.channel_sum)
+        if features.dist4 is None:
+            subject = features.likely_subject * np.uint8(count)
+        else:
+            # similar and distinct are non-decreasing in the threshold
+            values = np.arange(3 * 510 * 510 + 1)
+            not_similar = np.searchsorted(similar, values, side="right")
+            np.minimum(
+                kept, np.take(not_similar.astype(np.uint8), features.dist4), out=kept
+            )
+            different = np.searchsorted(distinct, values, side="right")
+            subject = np.take(different.astype(np.uint8), features.dist4)
+            subject *= features.likely_subject
+        kept[features.gray_background] = 0
+        np.maximum(kept, subject, out=kept)
+        kept[features.sure_subject] = count
+        return kept
+
+    def _index(self, threshold):
+        try:
+            return self.thresholds.index(threshold)
+        except ValueError:
+            raise InvalidParameterError(
+                f"Threshold {threshold} was not part of the sweep"
+            ) from None
+
+    def alpha(self, threshold):
+        """Alpha (0 or 255) for one swept threshold, as a uint8 array."""
+        return (self.levels > self._index(threshold)) * np.uint8(255)
+
+    def mask(self, threshold):
+        """Alpha for one swept threshold as an 'L' PIL image."""
+        return Image.fromarray(self.alpha(threshold))
+
+    def coverage(self, threshold):
+        """Fraction of the pixels kept as subject at a swept threshold."""
+        kept = np.count_nonzero(self.levels > self._index(threshold))
+        return kept / self.levels.size
+
+
+def _scaled_subject_alpha(rgb_image, threshold, analysis_scale, threads=1):
+    """
+    Classify pixels on a downscaled copy, refining only along the boundary.
+
+    The mask is computed at ``analysis_scale`` of the original size and
+    upsampled with nearest neighbour. Low-resolution pixels whose 3x3
+    neighbourhood mixes subject and background are re-classified at full
+    resolution, so only the boundary band pays full-resolution cost.
+
+    Returns:
+        uint8 alpha array (0 or 255) at the full resolution of rgb_image
+    """
+    width, height = rgb_image.size
+    small_size = (
+        max(1, round(width * analysis_scale)),
+        max(1, round(height * analysis_scale)),
+    )
+    small_rgb = np.asarray(
+        resize_image(rgb_image, small_size, Image.Resampling.BOX, threads=threads)
+    )
+    bg_color2 = _edge_color2(small_rgb)
+    small_alpha = _subject_alpha(small_rgb, threshold, bg_color2, threads)
+
+    # Boundary band: pixels with a differently-labelled 8-neighbour
+    boundary = _boundary(small_alpha, threads)
+
+    # Nearest-neighbour upsampling (PIL maps pixel centres the same way for
+    # both masks, so they stay aligned)
+    alpha = np.array(
+        Image.fromarray(small_alpha * np.uint8(255)).resize(
+            (width, height), Image.Resampling.NEAREST
+        )
+    )
+    refine_image = Image.fromarray(boundary).resize(
+        (width, height), Image.Resampling.NEAREST
+    )
+
+    # Only decode full-resolution pixels inside the boundary's bounding box
+    box = refine_image.getbbox()
+    if box is None:
+        return alpha
+    left, top, right, bottom = box
+    refine = np.asarray(refine_image.crop(box))
+    region_rgb = np.asarray(rgb_image.crop(box))
+    refined = _subject_alpha(region_rgb[refine], threshold, bg_color2, threads)
+    alpha[top:bottom, left:right][refine] = refined * np.uint8(255)
+    return alpha
+
+
+@dataclass(frozen=True)
+class RemovalBackend:
+    """A named way of computing a foreground's alpha mask."""
+
+    name: str
+    compute_alpha: object
+    version: int = 1
+    threaded: bool = False
+
+
+REMOVAL_BACKENDS = {}
+
+
+def register_removal_backend(name, compute_alpha, version=1, threaded=False):
+    """
+    Register a background-removal backend for remove_background and the CLI.
+
+    ``compute_alpha(rgb_image, threshold, analysis_scale)`` receives an RGB
+    PIL image, the removal threshold and the analysis scale (see
+    remove_background) and returns the (H, W) uint8 alpha mask.
+
+    Args:
+        name: Backend name used on the command line
+        compute_alpha: Mask function
+        version: Bump whenever the backend's output changes, so masks cached
+            by an older version are ignored
+        threaded: compute_alpha also takes a ``threads`` keyword, the most
+            threads it may use
+    """
+    REMOVAL_BACKENDS[name] = RemovalBackend(name, compute_alpha, version, threaded)
+    return REMOVAL_BACKENDS[name]
 
-    x, y = position
-    fg_height, fg_width = fg_array.shape[:2]
-    bg_height, bg_width = bg_array.shape[:2]
 
-    x1, y1 = max(0, x), max(0, y)
-    x2, y2 = min(bg_width, x + fg_width), min(bg_height, y + fg_height)
-    fg_x1, fg_y1 = x1 - x, y1 - y
-    fg_x2, fg_y2 = fg_x1 + (x2 - x1), fg_y1 + (y2 - y1)
+def _heuristic_alpha(rgb_image, threshold, analysis_scale=1.0, threads=1):
+    """Binary alpha from lightness, saturation and the edge color (the default)."""
+    if analysis_scale < 1.0:
+        return _scaled_subject_alpha(rgb_image, threshold, analysis_scale, threads)
+    rgb = np.asarray(rgb_image)
+    return _subject_alpha(rgb, threshold, _edge_color2(rgb), threads) * np.uint8(255)
 
-    bg_region = bg_array[y1:y2, x1:x2]
-    fg_region = fg_array[fg_y1:fg_y2, fg_x1:fg_x2]
 
-    alpha = fg_region[:, :, 3:4] / 255.0
-    fg_rgb = fg_region[:, :, :3]
+def _matting_alpha(rgb_image, threshold, analysis_scale=1.0, threads=1):
+    """
+    The heuristic mask with soft edges estimated by a guided filter.
 
-    # Overlay: multiply if base < 128, screen if base >= 128
-    mask = bg_region < 128.0
-    multiplied = 2.0 * bg_region * fg_rgb / 255.0
-    screened = 255.0 - 2.0 * (255.0 - bg_region) * (255.0 - fg_rgb) / 255.0
-    overlaid = np.where(mask, multiplied, screened)
+    Only the heuristic mask uses several threads; the guided filter works
+    on a small band around the edges.
+    """
+    mask = _heuristic_alpha(rgb_image, threshold, analysis_scale, threads)
+    return refine_alpha(np.asarray(rgb_image), mask)
 
-    # Blend with alpha
-    blended = (overlaid * alpha + bg_region * (1 - alpha)).astype(np.uint8)
 
-    bg_array[y1:y2, x1:x2] = blended
-    return Image.fromarray(bg_array, "RGB")
+register_removal_backend("heuristic", _heuristic_alpha, threaded=True)
+register_removal_backend("matting", _matting_alpha, threaded=True)
 
 
-def remove_background(image, threshold=30, corner_samples=10):
+def remove_background(
+    image,
+    threshold=30,
+    corner_samples=10,
+    analysis_scale=1.0,
+    backend="heuristic",
+    threads=1,
+):
     """
     Aggressively remove background from image, keeping only the subject.
     Uses multiple aggressive detection methods.
@@ -167,176 +551,1510 @@ def remove_background(image, threshold=30, corner_samples=10):
         image: PIL Image (will be converted to RGBA)
         threshold: Color difference threshold for background detection (0-255)
         corner_samples: Number of pixels to sample from corners for background color
+        analysis_scale: Run the analysis on a copy downscaled by this factor
+            (0-1] and refine the mask boundary at full resolution; 1.0 is exact
+        backend: Registered removal backend; 'heuristic' (default) gives a
+            binary mask, 'matting' adds soft, color-guided edges
+        threads: Most threads to classify pixels on (the mask is the same)
     """
+    if backend != "heuristic" or analysis_scale < 1.0:
+        rgb_image = image if image.mode == "RGB" else image.convert("RGB")
+        removal_backend = REMOVAL_BACKENDS[backend]
+        extra = {"threads": threads} if removal_backend.threaded else {}
+        alpha = removal_backend.compute_alpha(
+            rgb_image, threshold, analysis_scale, **extra
+        )
+        result = image.convert("RGBA")
+        result.putalpha(Image.fromarray(alpha))
+        return result
+
     if image.mode != "RGBA":
         image = image.convert("RGBA")
 
-    img_array = np.array(image).astype(np.float32)
-    height, width = img_array.shape[:2]
+    img_array = np.array(image)
     img_rgb = img_array[:, :, :3]
+    alpha = _subject_alpha(img_rgb, threshold, _edge_color2(img_rgb), threads)
+    img_array[:, :, 3] = alpha * np.uint8(255)
+    return Image.fromarray(img_array, "RGBA")
+
+
+def remove_background_cached(
+    image,
+    threshold=30,
+    mask_cache=None,
+    analysis_scale=1.0,
+    backend="heuristic",
+    threads=1,
+):
+    """
+    Remove the background, reusing a cached alpha mask when one exists.
+
+    Args:
+        image: PIL Image (will be converted to RGBA)
+        threshold: Color difference threshold for background detection (0-255)
+        mask_cache: Optional MaskCache; without one this is remove_background
+        analysis_scale: Downscale factor for the analysis (see remove_background)
+        backend: Registered removal backend (see remove_background)
+        threads: Most threads to compute a missing mask on
+    """
+    if mask_cache is None:
+        return remove_background(
+            image,
+            threshold=threshold,
+            analysis_scale=analysis_scale,
+            backend=backend,
+            threads=threads,
+        )
 
-    # Calculate lightness and saturation for all pixels
-    lightness = np.mean(img_rgb, axis=2)
-    saturation = np.std(img_rgb, axis=2)
+    params = {"threshold": threshold, "version": REMOVE_BACKGROUND_VERSION}
+    if analysis_scale < 1.0:
+        params["analysis_scale"] = analysis_scale
+    if backend != "heuristic":
+        params["backend"] = backend
+        params["backend_version"] = REMOVAL_BACKENDS[backend].version
+    key = mask_cache.key(image, **params)
+    mask = mask_cache.get(key)
+    if mask is not None:
+        # convert() copies, so the caller's image is never modified
+        result = image.convert("RGBA") if image.mode != "RGBA" else image.copy()
+        result.putalpha(mask)
+        return result
+
+    result = remove_background(
+        image,
+        threshold=threshold,
+        analysis_scale=analysis_scale,
+        backend=backend,
+        threads=threads,
+    )
+    mask_cache.put(key, result.getchannel("A"))
+    return result
 
-    # AGGRESSIVE METHOD: Remove all light/gray areas (common office backgrounds)
-    # 1. Remove very light areas (lightness > 180) - these are almost certainly background
-    very_light_mask = lightness > (
-        200 - threshold * 0.5
-    )  # More aggressive with lower threshold
 
-    # 2. Remove low saturation areas (grayish backgrounds) that are also light
-    gray_background = (saturation < 25) & (lightness > 160)
+def fit_size(foreground_size, background_size):
+    """Size of the foreground once fitted within the background (see resize_to_fit)."""
+    bg_width, bg_height = background_size
+    fg_width, fg_height = foreground_size
 
-    # 3. Sample edges to find background color
-    edge_width = max(10, min(30, width // 8, height // 8))
-    edge_pixels = []
+    # Calculate scaling factor to fit within background
+    scale_width = bg_width / fg_width
+    scale_height = bg_height / fg_height
+    scale = min(scale_width, scale_height) * 0.8  # 80% of background size
+
+    new_width = int(fg_width * scale)
+    new_height = int(fg_height * scale)
+
+    return new_width, new_height
+
+
+def resize_to_fit(foreground, background):
+    """Resize foreground image to fit within background while maintaining aspect ratio."""
+    new_size = fit_size(foreground.size, background.size)
+    return foreground.resize(new_size, Image.Resampling.LANCZOS)
+
+
+class PhotoMixerError(Exception):
+    """Base class for errors raised by the photo mixer library API."""
+
+
+class ImageLoadError(PhotoMixerError):
+    """An input could not be read or decoded as an image."""
+
+
+class InvalidParameterError(PhotoMixerError, ValueError):
+    """A mixing option is out of range or unknown."""
+
+
+class EncodeError(PhotoMixerError):
+    """The mixed image could not be encoded or written."""
+
+
+def describe_source(source):
+    """Short description of an image source for progress messages."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, Image.Image):
+        return f"{source.mode} image {source.width}x{source.height}"
+    if isinstance(source, Cutout):
+        return f"cutout of a {source.size[0]}x{source.size[1]} frame"
+    if isinstance(source, np.ndarray):
+        return f"array {source.shape}"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return f"{len(source)} bytes"
+    return type(source).__name__
+
+
+def open_image(source, name="image"):
+    """
+    Turn any supported image source into a loaded PIL image.
 
-    # Sample all edges more aggressively
-    if edge_width > 0:
-        edge_pixels.extend(img_array[0:edge_width, :].reshape(-1, 4)[:, :3])
-        edge_pixels.extend(
-            img_array[height - edge_width : height, :].reshape(-1, 4)[:, :3]
+    PIL images are returned as-is (no copy); uint8 NumPy arrays of shape
+    (H, W), (H, W, 3) or (H, W, 4) are wrapped as L, RGB or RGBA images.
+
+    Args:
+        source: PIL Image, NumPy array, encoded bytes (bytes, bytearray or
+            memoryview), binary file object or file path
+        name: Name used in error messages ('background', 'foreground', ...)
+
+    Returns:
+        PIL Image
+
+    Raises:
+        ImageLoadError: If the source cannot be read or decoded
+    """
+    if isinstance(source, Image.Image):
+        return source
+
+    if isinstance(source, np.ndarray):
+        modes = {2: "L", 3: "RGB", 4: "RGBA"}
+        channels = 2 if source.ndim == 2 else source.shape[-1]
+        if source.dtype != np.uint8 or source.ndim not in (2, 3) or channels < 2:
+            raise ImageLoadError(
+                f"Cannot use {name} array of dtype {source.dtype} and shape "
+                f"{source.shape}; expected uint8 (H, W), (H, W, 3) or (H, W, 4)"
+            )
+        if channels not in modes:
+            raise ImageLoadError(f"Cannot use {name} array with {channels} channels")
+        return Image.fromarray(source, modes[channels])
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    try:
+        image = Image.open(source)
+        image.load()
+    except (OSError, ValueError) as error:
+        raise ImageLoadError(f"Cannot read {name} image: {error}") from error
+    return image
+
+
+# Modes Image.reduce supports
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "RGBa", "La", "I", "F")
+
+
+def capped_size(size, max_size):
+    """Size scaled down (keeping the aspect ratio) so its longest side is at most max_size."""
+    width, height = size
+    if max(width, height) <= max_size:
+        return size
+    scale = max_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def decode_image(source, name="image", target=None):
+    """
+    Open an image source, decoding a large image at reduced resolution.
+
+    ``target`` is called with the full size, read from the file header before
+    any pixels are decoded, and returns the size the image will be shrunk to.
+    JPEGs are then decoded with DCT scaling (``Image.draft``) at 1/2, 1/4 or
+    1/8 size, and any image still at least twice the target is shrunk by a
+    whole factor with ``Image.reduce``. The result always covers the target
+    in both dimensions, so the final resize loses no visible detail.
+
+    Args:
+        source: Image source (see open_image); PIL images and arrays are
+            already decoded and are returned unchanged
+        name: Name used in error messages
+        target: Function of the full (width, height) returning the target
+            (width, height), or None to decode at full size
+
+    Returns:
+        (PIL Image, target size or None)
+
+    Raises:
+        ImageLoadError: If the source cannot be read or decoded
+    """
+    if target is None or isinstance(source, (Image.Image, np.ndarray)):
+        image = open_image(source, name)
+        return image, target(image.size) if target else None
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    try:
+        image = Image.open(source)
+        target_size = target(image.size)
+        if image.format == "JPEG":
+            image.draft(image.mode, target_size)
+        image.load()
+    except (OSError, ValueError) as error:
+        raise ImageLoadError(f"Cannot read {name} image: {error}") from error
+
+    factor = min(image.width // target_size[0], image.height // target_size[1])
+    if factor >= 2 and image.mode in REDUCIBLE_MODES:
+        image = image.reduce(factor)
+    return image, target_size
+
+
+def encode_image(image, format="JPEG", quality=95, **save_options):
+    """
+    Encode an image to bytes in memory.
+
+    Args:
+        image: PIL Image
+        format: Pillow format name ('JPEG', 'PNG', 'WEBP', ...)
+        quality: Encoder quality for lossy formats
+        **save_options: Extra keyword arguments for Image.save
+
+    Raises:
+        EncodeError: If the image cannot be encoded in the requested format
+    """
+    if image.info.get("icc_profile"):
+        save_options.setdefault("icc_profile", image.info["icc_profile"])
+    buffer = io.BytesIO()
+    try:
+        image.save(buffer, format=format, quality=quality, **save_options)
+    except (OSError, KeyError, ValueError) as error:
+        raise EncodeError(f"Cannot encode image as {format}: {error}") from error
+    return buffer.getvalue()
+
+
+def load_cutout(source):
+    """
+    Read a prepared cutout (see prepare_cutout).
+
+    Raises:
+        ImageLoadError: If the cutout cannot be read
+    """
+    try:
+        return Cutout.load(source)
+    except (OSError, ValueError, KeyError) as error:
+        raise ImageLoadError(f"Cannot read cutout: {error}") from error
+
+
+def prepare_cutout(
+    foreground,
+    bg_threshold=30,
+    mask_cache=None,
+    analysis_scale=1.0,
+    pyramid_levels=0,
+    removal_backend="heuristic",
+):
+    """
+    Remove the background once and keep the result for repeated compositing.
+
+    The returned Cutout (save it with ``Cutout.save``) can be passed to
+    mix_images, mix_to_bytes or mix_photos in place of the foreground, so
+    mixing one subject onto N backgrounds costs one removal and N blends.
+
+    Args:
+        foreground: Foreground image source (see open_image)
+        bg_threshold: Background removal threshold (0-100)
+        mask_cache: Optional MaskCache to reuse background-removal masks
+        analysis_scale: Fraction of the resolution for the removal mask (0-1]
+        pyramid_levels: Extra half-resolution levels to store for faster
+            large downscales
+        removal_backend: Registered removal backend, 'heuristic' or 'matting'
+
+    Returns:
+        Cutout
+
+    Raises:
+        ImageLoadError: If the foreground cannot be read or decoded
+        InvalidParameterError: If an option is out of range
+    """
+    validate_options(
+        bg_threshold=bg_threshold,
+        analysis_scale=analysis_scale,
+        removal_backend=removal_backend,
+    )
+    if pyramid_levels < 0:
+        raise InvalidParameterError(
+            f"Pyramid levels must be 0 or more: {pyramid_levels}"
+        )
+    removed = remove_background_cached(
+        open_image(foreground, "foreground"),
+        threshold=bg_threshold,
+        mask_cache=mask_cache,
+        analysis_scale=analysis_scale,
+        backend=removal_backend,
+    )
+    return Cutout.from_image(
+        removed,
+        pyramid_levels,
+        threshold=bg_threshold,
+        version=REMOVE_BACKGROUND_VERSION,
+        analysis_scale=analysis_scale,
+        backend=removal_backend,
+    )
+
+
+def validate_options(
+    blend_mode="normal",
+    opacity=0.8,
+    bg_threshold=30,
+    precision="float",
+    memory_limit=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    max_output_size=None,
+    removal_backend="heuristic",
+    output_bits=8,
+    threads=1,
+    placement="center",
+):
+    """
+    Check mixing options, raising InvalidParameterError for the first bad one.
+    """
+    if blend_mode not in BLEND_MODES:
+        raise InvalidParameterError(
+            f"Unknown blend mode {blend_mode!r}; choose from {', '.join(BLEND_MODES)}"
+        )
+    if not 0.0 <= opacity <= 1.0:
+        raise InvalidParameterError(f"Opacity must be between 0 and 1: {opacity}")
+    if not 0 <= bg_threshold <= 100:
+        raise InvalidParameterError(
+            f"Background threshold must be between 0 and 100: {bg_threshold}"
+        )
+    if precision not in PRECISIONS:
+        raise InvalidParameterError(f"Unknown precision: {precision!r}")
+    if memory_limit is not None and memory_limit < 1:
+        raise InvalidParameterError(
+            f"Memory limit must be at least 1 MB: {memory_limit}"
+        )
+    if not 0.0 < analysis_scale <= 1.0:
+        raise InvalidParameterError(
+            f"Analysis scale must be greater than 0 and at most 1: {analysis_scale}"
+        )
+    if removal_order not in REMOVAL_ORDERS:
+        raise InvalidParameterError(f"Unknown removal order: {removal_order!r}")
+    if removal_backend not in REMOVAL_BACKENDS:
+        raise InvalidParameterError(
+            f"Unknown removal backend {removal_backend!r}; choose from "
+            f"{', '.join(REMOVAL_BACKENDS)}"
         )
-        edge_pixels.extend(img_array[:, 0:edge_width].reshape(-1, 4)[:, :3])
-        edge_pixels.extend(
-            img_array[:, width - edge_width : width].reshape(-1, 4)[:, :3]
+    if max_output_size is not None and max_output_size < 1:
+        raise InvalidParameterError(
+            f"Maximum output size must be at least 1 pixel: {max_output_size}"
         )
+    if output_bits not in (8, 16):
+        raise InvalidParameterError(f"Output bits must be 8 or 16: {output_bits}")
+    if output_bits == 16 and precision != "linear":
+        raise InvalidParameterError("16-bit output requires 'linear' precision")
+    if threads < 1:
+        raise InvalidParameterError(f"Threads must be at least 1: {threads}")
+    if placement not in PLACEMENTS:
+        raise InvalidParameterError(
+            f"Unknown placement {placement!r}; choose from {', '.join(PLACEMENTS)}"
+        )
+
+
+@dataclass
+class Layer:
+    """
+    One foreground in a layer stack (see mix_layers).
 
-    if len(edge_pixels) > 0:
-        edge_pixels = np.array(edge_pixels)
-        bg_color = np.median(edge_pixels, axis=0)
+    Args:
+        source: Foreground image source (see open_image) or prepared Cutout
+        position: (x, y) of the fitted frame's top-left corner on the
+            background, or None to center it
+        scale: Size relative to the default fit (80% of the background)
+        opacity: Opacity of the layer (0.0 to 1.0)
+        blend_mode: Registered blend mode name
+        bg_threshold: Background removal threshold (0-100)
+    """
 
-        # Calculate color difference from background
-        color_diff = np.sqrt(np.sum((img_rgb - bg_color) ** 2, axis=2))
-        color_similar = color_diff < threshold
+    source: object
+    position: tuple = None
+    scale: float = 1.0
+    opacity: float = 0.8
+    blend_mode: str = "normal"
+    bg_threshold: int = 30
 
-        # Combine: background is similar to edge color OR very light OR gray
-        background_mask = color_similar | very_light_mask | gray_background
+
+def _fit_frame(foreground_size, background_size, scale=1.0):
+    """fit_size, scaled by a layer's scale factor (at least 1x1)."""
+    width, height = fit_size(foreground_size, background_size)
+    if scale != 1.0:
+        width, height = round(width * scale), round(height * scale)
+    return max(1, width), max(1, height)
+
+
+def _prepare_foreground(
+    foreground,
+    background_size,
+    instrumentation,
+    bg_threshold=30,
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    scale=1.0,
+    position=None,
+    draft=False,
+    profile=None,
+    threads=1,
+    saliency=None,
+):
+    """
+    Load, cut out and resize a foreground for compositing.
+
+    Opacity is not applied here; the compositing kernel folds it into the
+    alpha channel while blending. With draft, a large foreground is decoded
+    at reduced resolution (see decode_image), so background removal works on
+    fewer pixels; the mask then differs slightly from a full-size removal.
+    With a profile, the final (cropped) cutout is converted from its own ICC
+    profile, or sRGB, into that one. With a saliency map and no position,
+    the frame's position and scale are chosen by placement.choose_placement
+    once the subject's bounding box is known.
+
+    Returns:
+        (RGBA image, (x, y) position on the background), or None if nothing
+        of the foreground is left to blend
+    """
+    log = instrumentation.message
+    stage = instrumentation.stage
+
+    log(f"Loading foreground image: {describe_source(foreground)}")
+    with stage("load_foreground") as info:
+        frame_size = None
+        if is_cutout_path(foreground):
+            foreground = load_cutout(foreground)
+        elif draft and not isinstance(foreground, Cutout):
+            # The frame comes from the full size, before any pixels are decoded
+            foreground, frame_size = decode_image(
+                foreground,
+                "foreground",
+                lambda size: _fit_frame(size, background_size, scale),
+            )
+            info["draft"] = True
+        elif not isinstance(foreground, Cutout):
+            foreground = open_image(foreground, "foreground")
+        info["size"] = foreground.size
+    source_profile = image_profile(foreground)
+
+    if frame_size is None:
+        frame_size = _fit_frame(foreground.size, background_size, scale)
+    placed = None
+    auto_place = saliency is not None and position is None
+    if isinstance(foreground, Cutout):
+        if auto_place and foreground.box:
+            placed = _place(
+                saliency, frame_size, foreground.box, foreground.size, instrumentation
+            )
+            frame_size = placed.frame_size
+        # Removal already happened in prepare_cutout; only the part of the
+        # fitted frame that the subject covers is resampled
+        log("Step 1: Fitting prepared cutout to background...")
+        with stage("resize", cutout=True) as info:
+            rendered = foreground.render(frame_size, threads)
+            info["size"] = rendered[0].size if rendered else (0, 0)
+        log("  ✓ Cutout resized")
     else:
-        # Fallback: just use lightness and saturation
-        background_mask = very_light_mask | gray_background
-        color_diff = np.zeros((height, width))
+        # Removing the background after the resize costs less when the
+        # foreground shrinks, at the price of a hard (not resampled) mask edge
+        resize_first = removal_order == "resize-first" or (
+            removal_order == "auto"
+            and frame_size[0] * frame_size[1] < foreground.width * foreground.height
+        )
 
-    # FIRST: Identify and protect subject areas BEFORE removing background
-    # Subject typically has: medium to dark colors, some saturation, different from edges
-    subject_criteria = (
-        (lightness < 220)  # Not too light (but allow some light skin tones)
-        & (saturation > 10)  # Has some color (not pure gray)
-    )
-
-    # If we have background color, subject should be different from it
-    if len(edge_pixels) > 0:
-        subject_criteria = subject_criteria & (color_diff > threshold * 0.5)
-
-    # Additional protection: very dark or very colorful areas are definitely subject
-    very_dark = lightness < 120
-    very_colorful = saturation > 25
-    definitely_subject = very_dark | very_colorful
-
-    # Combine subject protection
-    subject_mask = subject_criteria | definitely_subject
-
-    # Start with all background as transparent, but PROTECT subject
-    final_alpha = np.where(background_mask & ~subject_mask, 0.0, 1.0)
-
-    # Make sure subject areas stay fully opaque
-    final_alpha = np.where(subject_mask, 1.0, final_alpha)
-
-    # Remove everything near edges that looks like background, BUT protect subject
-    edge_distance = np.minimum(
-        np.minimum(np.arange(height)[:, None], np.arange(width)[None, :]),
-        np.minimum(
-            height - 1 - np.arange(height)[:, None],
-            width - 1 - np.arange(width)[None, :],
-        ),
-    )
-    near_edge = edge_distance < max(10, min(width, height) // 15)
-    # Near edges, remove light/gray areas ONLY if they're NOT subject
-    edge_background = near_edge & (very_light_mask | gray_background) & ~subject_mask
-    final_alpha = np.where(edge_background, 0.0, final_alpha)
-
-    # Smooth edges only for subject (not background)
-    # Only smooth areas that are partially transparent but might be subject
-    uncertain = (final_alpha > 0.1) & (final_alpha < 0.9)
-    if len(edge_pixels) > 0:
-        smooth_mask = np.clip((color_diff - threshold * 0.5) / (threshold * 1.5), 0, 1)
-        final_alpha = np.where(
-            uncertain, np.maximum(final_alpha, smooth_mask * 0.8), final_alpha
+        if resize_first:
+            log("Step 1: Resizing foreground image to fit background...")
+            with stage("resize") as info:
+                if foreground.mode != "RGB":
+                    foreground = foreground.convert("RGB")
+                foreground = resize_image(foreground, frame_size, threads=threads)
+                info["size"] = foreground.size
+            log("  ✓ Foreground resized")
+
+        # Remove background from foreground image completely
+        step = 2 if resize_first else 1
+        log(
+            f"Step {step}: Removing background from foreground image (threshold: {bg_threshold})..."
+        )
+        with stage(
+            "remove_background", threshold=bg_threshold, backend=removal_backend
+        ) as info:
+            hits = mask_cache.hits if mask_cache else 0
+            foreground = remove_background_cached(
+                foreground,
+                threshold=bg_threshold,
+                mask_cache=mask_cache,
+                analysis_scale=analysis_scale,
+                backend=removal_backend,
+                threads=threads,
+            )
+            if mask_cache is not None:
+                info["cache"] = "hit" if mask_cache.hits > hits else "miss"
+        log("  ✓ Background removed, subject isolated")
+
+        # Ensure RGBA mode
+        if foreground.mode != "RGBA":
+            foreground = foreground.convert("RGBA")
+
+        box = foreground.getchannel("A").getbbox() if auto_place else None
+        if box:
+            # Once resized, the frame can only move
+            placed = _place(
+                saliency,
+                frame_size,
+                box,
+                foreground.size,
+                instrumentation,
+                (1.0,) if resize_first else DEFAULT_SCALES,
+            )
+            frame_size = placed.frame_size
+
+        if resize_first:
+            rendered = foreground, (0, 0)
+        else:
+            # Step 2: Resize foreground to fit nicely on background
+            log("Step 2: Resizing foreground image to fit background...")
+            with stage("resize", cropped=crop_to_subject) as info:
+                if crop_to_subject:
+                    # Resample only around the subject, not the transparent frame
+                    rendered = Cutout.from_image(foreground).render(frame_size, threads)
+                else:
+                    resized = resize_image(foreground, frame_size, threads=threads)
+                    rendered = resized, (0, 0)
+                info["size"] = rendered[0].size if rendered else (0, 0)
+            log("  ✓ Foreground resized")
+
+    if rendered is not None and crop_to_subject:
+        # Fully transparent rows and columns never change the background
+        foreground, (x, y) = rendered
+        box = foreground.getchannel("A").getbbox()
+        rendered = (foreground.crop(box), (x + box[0], y + box[1])) if box else None
+    if rendered is None:
+        log("  ✓ Nothing left to blend")
+        return None
+    foreground, offset = rendered
+
+    if profile is not None:
+        with stage("color_convert", embedded=source_profile is not None):
+            try:
+                foreground = convert_profile(foreground, source_profile, profile)
+            except ValueError as error:
+                raise ImageLoadError(f"Cannot convert foreground: {error}") from error
+
+    if placed is not None:
+        position = placed.position
+    elif position is None:
+        # Center the foreground on the background
+        bg_width, bg_height = background_size
+        position = ((bg_width - frame_size[0]) // 2, (bg_height - frame_size[1]) // 2)
+    return foreground, (position[0] + offset[0], position[1] + offset[1])
+
+
+def _place(saliency, frame_size, box, box_size, instrumentation, scales=DEFAULT_SCALES):
+    """
+    Choose the position and scale of a frame from its subject's bounding box.
+
+    Args:
+        saliency: placement.SaliencyMap of the background
+        frame_size: Fitted frame size at scale 1
+        box: Subject's bounding box in an image of box_size (the frame at any
+            resolution)
+        box_size: (width, height) of the image the box is in
+        instrumentation: Instrumentation for the 'placement' stage
+        scales: Candidate scales
+
+    Returns:
+        placement.Placement
+    """
+    x_scale = frame_size[0] / box_size[0]
+    y_scale = frame_size[1] / box_size[1]
+    subject_box = (
+        box[0] * x_scale,
+        box[1] * y_scale,
+        box[2] * x_scale,
+        box[3] * y_scale,
+    )
+    with instrumentation.stage("placement") as info:
+        placed = choose_placement(saliency, frame_size, subject_box, scales)
+        info.update(
+            candidates=placed.candidates,
+            position=placed.position,
+            scale=placed.scale,
+            covered=round(placed.covered, 4),
         )
+    instrumentation.message(
+        f"  ✓ Placed at {placed.position}, scale {placed.scale:g}, covering "
+        f"{placed.covered:.1%} of the background's detail"
+    )
+    return placed
+
 
-    # Cleanup pass: Remove small background particles BUT protect subject
-    # Only clean up areas that are NOT clearly subject
-    uncertain_areas = ~subject_mask
-
-    # Remove small isolated background particles ONLY in uncertain areas
-    kernel_size = 2  # Smaller kernel to be less aggressive
-    if np.any(uncertain_areas):
-        binary_mask = final_alpha > 0.5
-        # Only process uncertain areas - don't touch subject
-        uncertain_mask = binary_mask & uncertain_areas
-        if np.any(uncertain_mask):
-            uncertain_cleaned = ndimage.binary_opening(
-                uncertain_mask, structure=np.ones((kernel_size, kernel_size))
+def _read_deep(source):
+    """
+    A 48-bit PNG or TIFF background at 16 bits (see color.read_deep), or None
+    for other sources.
+    """
+    encoded = (str, os.PathLike, bytes, bytearray, memoryview)
+    if not (isinstance(source, encoded) or hasattr(source, "read")):
+        return None
+    try:
+        return read_deep(source)
+    except (OSError, ValueError) as error:
+        raise ImageLoadError(f"Cannot read background image: {error}") from error
+
+
+def _load_background(
+    background,
+    instrumentation,
+    max_size=None,
+    draft=True,
+    high_depth=False,
+    threads=1,
+):
+    """
+    Load the background as RGB.
+
+    Args:
+        max_size: Shrink the background so its longest side is at most this
+            many pixels (None to keep its size)
+        draft: Decode a background that is being shrunk at reduced
+            resolution (see decode_image)
+        high_depth: Keep a 16-bit background (uint16 array, 16-bit
+            grayscale image, or 48-bit PNG or TIFF file) at 16 bits, as a
+            DeepImage
+        threads: Most threads to shrink the background on
+
+    Returns:
+        (image, owned) where owned is False if the image is the caller's own
+        and must not be modified in place
+    """
+    # Tiled mode pastes into the background, so never into a caller's image
+    owned = not isinstance(background, (Image.Image, np.ndarray))
+
+    instrumentation.message(f"Loading background image: {describe_source(background)}")
+    with instrumentation.stage("load_background") as info:
+        size = None
+        if high_depth and isinstance(background, np.ndarray):
+            try:
+                background = deep_image(background) or open_image(
+                    background, "background"
+                )
+            except ValueError as error:
+                raise ImageLoadError(f"Cannot use background array: {error}") from error
+        elif high_depth and (deep := _read_deep(background)) is not None:
+            background = deep
+        elif max_size:
+            fit = (lambda size: capped_size(size, max_size)) if draft else None
+            background, size = decode_image(background, "background", fit)
+            info["draft"] = draft
+        else:
+            background = open_image(background, "background")
+        if max_size:
+            size = size or capped_size(background.size, max_size)
+
+        if high_depth and not isinstance(background, DeepImage):
+            background = deep_image(background) or background
+        if isinstance(background, DeepImage):
+            # deep_image always copies
+            owned = True
+            if size and background.size != size:
+                background = background.resize(size)
+            info["bits"] = 16
+            info["size"] = background.size
+            return background, owned
+
+        if background.mode != "RGB":
+            background = background.convert("RGB")
+            owned = True
+        if size and background.size != size:
+            background = resize_image(background, size, threads=threads)
+            owned = True
+        info["size"] = background.size
+    return background, owned
+
+
+def _mix(
+    background,
+    foreground,
+    instrumentation,
+    blend_mode="normal",
+    opacity=0.8,
+    bg_threshold=30,
+    precision="float",
+    memory_limit=None,
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    max_output_size=None,
+    draft=None,
+    output_bits=8,
+    workspace=None,
+    threads=1,
+    placement="center",
+):
+    """Run the mixing pipeline on image sources and return the RGB result."""
+    validate_options(
+        blend_mode,
+        opacity,
+        bg_threshold,
+        precision,
+        memory_limit,
+        analysis_scale,
+        removal_order,
+        max_output_size,
+        removal_backend,
+        output_bits,
+        threads,
+        placement,
+    )
+    if draft is None:
+        draft = bool(max_output_size)
+    linear = precision == "linear"
+    background_key = source_key(background) if placement == "auto" else None
+    background, owns_background = _load_background(
+        background,
+        instrumentation,
+        max_output_size,
+        draft,
+        high_depth=linear,
+        threads=threads,
+    )
+
+    # Linear light is color managed: the foreground is converted into the
+    # background's color space, and the result keeps its profile
+    profile = image_profile(background) if linear else None
+    saliency = None
+    if placement == "auto":
+        with instrumentation.stage("saliency") as info:
+            hits = SALIENCY_CACHE.hits
+            saliency = SALIENCY_CACHE.get(background, background_key)
+            info["cache"] = "hit" if SALIENCY_CACHE.hits > hits else "miss"
+    prepared = _prepare_foreground(
+        foreground,
+        background.size,
+        instrumentation,
+        bg_threshold=bg_threshold,
+        mask_cache=mask_cache,
+        analysis_scale=analysis_scale,
+        removal_order=removal_order,
+        removal_backend=removal_backend,
+        crop_to_subject=crop_to_subject,
+        draft=draft,
+        profile=(profile or srgb_profile()) if linear else None,
+        threads=threads,
+        saliency=saliency,
+    )
+    if output_bits == 16 and not isinstance(background, DeepImage):
+        background = DeepImage(to_16bit(np.asarray(background)), dict(background.info))
+        owns_background = True
+    if isinstance(background, DeepImage):
+        if prepared is not None:
+            _blend_deep(
+                background,
+                prepared,
+                instrumentation,
+                blend_mode,
+                opacity,
+                memory_limit,
+                workspace,
+                threads,
             )
-            # Apply only to uncertain areas, keep subject intact
-            final_alpha = np.where(
-                uncertain_areas & ~uncertain_cleaned & (final_alpha < 0.5),
-                0.0,
-                final_alpha,
+        return background if output_bits == 16 else background.to_image()
+    if prepared is None:
+        return background if owns_background else background.copy()
+    foreground, position = prepared
+
+    # Composite in place on a single copy of the background; only the
+    # overlapping region is converted to working precision
+    with instrumentation.stage(
+        "blend",
+        mode=blend_mode,
+        precision=precision,
+        opacity=opacity,
+        tiled=bool(memory_limit),
+        threads=threads,
+    ):
+        if memory_limit:
+            # Tiled mode: blend strip by strip directly into the background
+            if not owns_background:
+                background = background.copy()
+            return composite_tiled(
+                background,
+                foreground,
+                position,
+                blend_mode,
+                precision,
+                memory_limit=memory_limit * 1024 * 1024,
+                workspace=workspace,
+                opacity=opacity,
+                threads=threads,
             )
 
-    # Fill small holes in subject (closing operation) - but be very careful
-    # Only close in areas that are mostly subject
-    if np.any(subject_mask):
-        subject_alpha = final_alpha > 0.7  # Only close in mostly-opaque areas
-        closed = ndimage.binary_closing(
-            subject_alpha,
-            structure=np.ones((2, 2)),  # Very small kernel
+        output_array = np.array(background)
+        composite(
+            output_array,
+            np.asarray(foreground),
+            position,
+            blend_mode,
+            precision,
+            workspace,
+            opacity=opacity,
+            threads=threads,
         )
-        # Only fill tiny holes (areas that were subject but had small gaps)
-        small_holes = (
-            closed & ~subject_alpha & (final_alpha > 0.1) & (final_alpha < 0.5)
+        output = Image.fromarray(output_array, "RGB")
+        if profile:
+            output.info["icc_profile"] = profile
+        return output
+
+
+def _blend_deep(
+    background,
+    prepared,
+    instrumentation,
+    blend_mode,
+    opacity,
+    memory_limit,
+    workspace=None,
+    threads=1,
+):
+    """Blend a prepared foreground into a DeepImage in linear light, in place."""
+    foreground, position = prepared
+    with instrumentation.stage(
+        "blend",
+        mode=blend_mode,
+        precision="linear",
+        opacity=opacity,
+        tiled=bool(memory_limit),
+        bits=16,
+        threads=threads,
+    ):
+        if memory_limit:
+            # Strips are views of the array, so only scratch memory is bounded
+            composite_tiled(
+                background.array,
+                foreground,
+                position,
+                blend_mode,
+                "linear",
+                memory_limit=memory_limit * 1024 * 1024,
+                workspace=workspace,
+                opacity=opacity,
+                threads=threads,
+            )
+        else:
+            composite(
+                background.array,
+                np.asarray(foreground),
+                position,
+                blend_mode,
+                "linear",
+                workspace,
+                opacity=opacity,
+                threads=threads,
+            )
+
+
+def mix_layers(
+    background,
+    layers,
+    precision="float",
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    max_output_size=None,
+    draft=None,
+    hooks=None,
+    trace_memory=False,
+):
+    """
+    Composite a stack of foreground layers onto a background in one pass.
+
+    Layers are applied in order (the last one ends up on top). Every layer is
+    cut out and resized separately, then all of them are blended together:
+    only the background regions that some layer covers are converted to
+    working precision, and intermediate results are never rounded to 8 bits
+    or re-encoded.
+
+    Args:
+        background: Background image source (see open_image)
+        layers: Iterable of Layer
+        precision: Blend arithmetic, 'float', 'fixed' or 'linear' (linear
+            light, converting each layer into the background's ICC profile)
+        mask_cache: Optional MaskCache to reuse background-removal masks
+        analysis_scale: Fraction of the resolution for the removal mask (0-1]
+        removal_order: 'remove-first', 'resize-first' or 'auto'
+        removal_backend: Registered removal backend, 'heuristic' or 'matting'
+        crop_to_subject: Resize and blend only each subject's bounding box
+        max_output_size: Cap on the longest side of the result in pixels
+        draft: Decode large inputs at reduced resolution (default: only when
+            max_output_size is set; see decode_image)
+        hooks: Instrumentation hooks (see instrumentation.py)
+        trace_memory: Include tracemalloc allocation peaks in stage records
+
+    Returns:
+        RGB PIL Image
+
+    Raises:
+        ImageLoadError: If an input cannot be read or decoded
+        InvalidParameterError: If an option is out of range or unknown
+    """
+    layers = list(layers)
+    validate_options(
+        precision=precision,
+        analysis_scale=analysis_scale,
+        removal_order=removal_order,
+        removal_backend=removal_backend,
+        max_output_size=max_output_size,
+    )
+    for layer in layers:
+        validate_options(layer.blend_mode, layer.opacity, layer.bg_threshold)
+        if layer.scale <= 0:
+            raise InvalidParameterError(f"Layer scale must be positive: {layer.scale}")
+
+    instrumentation = Instrumentation(hooks or (), trace_memory=trace_memory)
+    with instrumentation:
+        return _mix_layers(
+            background,
+            layers,
+            instrumentation,
+            precision=precision,
+            mask_cache=mask_cache,
+            analysis_scale=analysis_scale,
+            removal_order=removal_order,
+            removal_backend=removal_backend,
+            crop_to_subject=crop_to_subject,
+            max_output_size=max_output_size,
+            draft=draft,
         )
-        final_alpha = np.where(small_holes, 0.6, final_alpha)
-
-    # Additional cleanup: Remove light/gray particles ONLY if they're NOT subject
-    light_particles = (final_alpha < 0.3) & very_light_mask & ~subject_mask
-    gray_particles = (final_alpha < 0.3) & gray_background & ~subject_mask
-    final_alpha = np.where(light_particles | gray_particles, 0.0, final_alpha)
-
-    # Final pass: Remove pixels too similar to background, BUT protect subject
-    if len(edge_pixels) > 0:
-        too_similar = (
-            (color_diff < threshold * 0.7)
-            & (final_alpha < 0.8)
-            & ~subject_mask  # Don't remove if it's subject
+
+
+def _mix_layers(
+    background,
+    layers,
+    instrumentation,
+    precision="float",
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    max_output_size=None,
+    draft=None,
+):
+    """Run the layer-stack pipeline and return the RGB result."""
+    if draft is None:
+        draft = bool(max_output_size)
+    background, _ = _load_background(
+        background, instrumentation, max_output_size, draft
+    )
+    profile = image_profile(background) if precision == "linear" else None
+
+    prepared = []
+    for index, layer in enumerate(layers, start=1):
+        instrumentation.message(f"Layer {index}/{len(layers)}:")
+        result = _prepare_foreground(
+            layer.source,
+            background.size,
+            instrumentation,
+            bg_threshold=layer.bg_threshold,
+            mask_cache=mask_cache,
+            analysis_scale=analysis_scale,
+            removal_order=removal_order,
+            removal_backend=removal_backend,
+            crop_to_subject=crop_to_subject,
+            scale=layer.scale,
+            position=layer.position,
+            draft=draft,
+            profile=(profile or srgb_profile()) if precision == "linear" else None,
         )
-        final_alpha = np.where(too_similar, 0.0, final_alpha)
+        if result is not None:
+            foreground, position = result
+            prepared.append(
+                (np.asarray(foreground), position, layer.blend_mode, layer.opacity)
+            )
 
-    # Final protection: Ensure all subject areas are fully opaque
-    final_alpha = np.where(subject_mask, 1.0, final_alpha)
+    with instrumentation.stage("blend", precision=precision, layers=len(prepared)):
+        output_array = np.array(background)
+        composite_layers(output_array, prepared, precision)
+        output = Image.fromarray(output_array, "RGB")
+        if profile:
+            output.info["icc_profile"] = profile
+        return output
 
-    # Update alpha channel
-    img_array[:, :, 3] = (final_alpha * 255.0).astype(np.uint8)
 
-    return Image.fromarray(img_array.astype(np.uint8), "RGBA")
+def mix_images(
+    background,
+    foreground,
+    blend_mode="normal",
+    opacity=0.8,
+    bg_threshold=30,
+    precision="float",
+    memory_limit=None,
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    max_output_size=None,
+    draft=None,
+    output_bits=8,
+    workspace=None,
+    threads=1,
+    placement="center",
+    hooks=None,
+    trace_memory=False,
+):
+    """
+    Mix a background and foreground in memory and return the result.
 
+    Nothing is printed or written to disk. Inputs that already are RGB (or
+    RGBA) PIL images are used without conversion copies and are never
+    modified.
 
-def resize_to_fit(foreground, background):
-    """Resize foreground image to fit within background while maintaining aspect ratio."""
-    bg_width, bg_height = background.size
-    fg_width, fg_height = foreground.size
+    Args:
+        background: Background as a PIL Image, NumPy array, encoded bytes,
+            binary file object or path (see open_image)
+        foreground: Foreground image to overlay, in any of the same forms, or
+            a prepared Cutout (or ``.cutout.npz`` path) to skip removal
+        blend_mode: Registered blend mode name
+        opacity: Opacity of the foreground (0.0 to 1.0)
+        bg_threshold: Background removal threshold (0-100)
+        precision: Blend arithmetic, 'float', 'fixed' or 'linear'; linear
+            light keeps a 16-bit background at 16 bits, converts the
+            foreground into the background's ICC profile and embeds that
+            profile in the result (see color.py)
+        memory_limit: Compositing working-memory budget in MB (tiled mode)
+        mask_cache: Optional MaskCache to reuse background-removal masks
+        analysis_scale: Fraction of the resolution for the removal mask (0-1]
+        removal_order: 'remove-first', 'resize-first' or 'auto'
+        removal_backend: Registered removal backend, 'heuristic' or 'matting'
+        crop_to_subject: Resize and blend only the subject's bounding box
+            instead of the whole, mostly transparent, foreground frame
+        max_output_size: Shrink the background (and so the result) to at most
+            this many pixels on its longest side
+        draft: Decode large inputs at reduced resolution, which is much
+            faster but makes the removal mask approximate (default: only when
+            max_output_size is set; see decode_image)
+        output_bits: 8, or 16 (with 'linear' precision) for a DeepImage
+        workspace: compositing.Workspace whose scratch buffers are reused
+            across calls (default: fresh buffers for every call)
+        threads: Most threads to split background removal, resizing and
+            blending of this one image over (see parallel.py); the result
+            is the same for any number
+        placement: 'center' (default) to center the foreground at the default
+            fit, or 'auto' to choose its position and scale so the subject
+            hides the least of the background's detail (see placement.py)
+        hooks: Instrumentation hooks (see instrumentation.py)
+        trace_memory: Include tracemalloc allocation peaks in stage records
+
+    Returns:
+        RGB PIL Image, or color.DeepImage for 16-bit output
+
+    Raises:
+        ImageLoadError: If an input cannot be read or decoded
+        InvalidParameterError: If an option is out of range or unknown
+    """
+    instrumentation = Instrumentation(hooks or (), trace_memory=trace_memory)
+    with instrumentation:
+        return _mix(
+            background,
+            foreground,
+            instrumentation,
+            blend_mode=blend_mode,
+            opacity=opacity,
+            bg_threshold=bg_threshold,
+            precision=precision,
+            memory_limit=memory_limit,
+            mask_cache=mask_cache,
+            analysis_scale=analysis_scale,
+            removal_order=removal_order,
+            removal_backend=removal_backend,
+            crop_to_subject=crop_to_subject,
+            max_output_size=max_output_size,
+            draft=draft,
+            output_bits=output_bits,
+            workspace=workspace,
+            threads=threads,
+            placement=placement,
+        )
 
-    # Calculate scaling factor to fit within background
-    scale_width = bg_width / fg_width
-    scale_height = bg_height / fg_height
-    scale = min(scale_width, scale_height) * 0.8  # 80% of background size
 
-    new_width = int(fg_width * scale)
-    new_height = int(fg_height * scale)
+def mix_to_bytes(
+    background,
+    foreground,
+    format="JPEG",
+    quality=95,
+    hooks=None,
+    save_options=None,
+    **options,
+):
+    """
+    Mix a background and foreground in memory and return the encoded result.
 
-    return foreground.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    Args:
+        background: Background image source (see mix_images)
+        foreground: Foreground image source (see mix_images)
+        format: Output format for Image.save ('JPEG', 'PNG', 'WEBP', ...)
+        quality: Encoder quality for lossy formats
+        hooks: Instrumentation hooks (see instrumentation.py)
+        save_options: Other encoder settings for Image.save (optimize,
+            compress_level, ...; see OutputOptions.save_options)
+        **options: Mixing options for mix_images (blend_mode, opacity, ...)
+
+    Returns:
+        Encoded image bytes
+
+    Raises:
+        ImageLoadError: If an input cannot be read or decoded
+        InvalidParameterError: If an option is out of range or unknown
+        EncodeError: If the result cannot be encoded in the requested format
+    """
+    trace_memory = options.pop("trace_memory", False)
+    save_options = save_options or {}
+    instrumentation = Instrumentation(hooks or (), trace_memory=trace_memory)
+    with instrumentation:
+        output = _mix(background, foreground, instrumentation, **options)
+        with instrumentation.stage("encode", format=format):
+            if isinstance(output, DeepImage):
+                if format != "PNG":
+                    raise EncodeError(f"Cannot encode 16-bit image as {format}")
+                return encode_png16(
+                    output.array,
+                    compress_level=save_options.get("compress_level", 6),
+                    icc_profile=image_profile(output),
+                )
+            return encode_image(output, format=format, quality=quality, **save_options)
+
+
+# File extensions for sequence frames re-encoded in another format
+FRAME_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "PPM": ".ppm",
+    "WEBP": ".webp",
+    "BMP": ".bmp",
+    "TIFF": ".tif",
+}
+
+
+def mix_sequence(
+    frames,
+    foreground,
+    sink,
+    blend_mode="normal",
+    opacity=0.8,
+    bg_threshold=30,
+    precision="float",
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    position=None,
+    drift=(0, 0),
+    format=None,
+    quality=95,
+    output_options=None,
+    threads=None,
+    hooks=None,
+    trace_memory=False,
+):
+    """
+    Composite one foreground onto every frame of an image sequence.
+
+    The foreground's background is removed once, and the cutout is resized
+    once per distinct frame size, so each frame only costs a decode, a blend
+    and an encode. Those run as a streaming pipeline on a thread pool (see
+    sequence.py). Every frame matches mix_images with the same cutout.
+
+    Args:
+        frames: Iterable of (name, source) pairs in frame order, such as
+            sequence.directory_frames or sequence.stream_frames
+        foreground: Foreground image source, or a prepared Cutout (or
+            ``.cutout.npz`` path) to skip removal
+        sink: Called with (name, encoded bytes) for every frame, in order,
+            such as sequence.DirectorySink or sequence.StreamSink
+        blend_mode: Registered blend mode name
+        opacity: Opacity of the foreground (0.0 to 1.0)
+        bg_threshold: Background removal threshold (0-100)
+        precision: Blend arithmetic, 'float', 'fixed' or 'linear'
+        mask_cache: Optional MaskCache to reuse the background-removal mask
+        analysis_scale: Fraction of the resolution for the removal mask (0-1]
+        removal_backend: Registered removal backend, 'heuristic' or 'matting'
+        crop_to_subject: Resize and blend only the subject's bounding box
+        position: (x, y) of the fitted foreground's top-left corner in the
+            first frame, or None to center it
+        drift: (dx, dy) pixels the foreground moves by from frame to frame
+        format: Output format for every frame (default: the format of
+            output_options, else each frame's own)
+        quality: Encoder quality for lossy formats
+        output_options: encoding.OutputOptions with encoder settings; when
+            given, its quality replaces ``quality`` (extra sizes are not
+            written for frames)
+        threads: Worker threads shared by all stages (default: CPU count)
+        hooks: Instrumentation hooks (see instrumentation.py)
+        trace_memory: Include tracemalloc allocation peaks in stage records
+
+    Returns:
+        SequenceResult with the frame count and sustained frames per second
+
+    Raises:
+        ImageLoadError: If the foreground or a frame cannot be read
+        InvalidParameterError: If an option is out of range or unknown
+        EncodeError: If a frame cannot be encoded in the requested format
+    """
+    # Imported here so single-image runs do not pay for the sequence machinery
+    from sequence import SequenceResult, run_pipeline
+
+    validate_options(
+        blend_mode,
+        opacity,
+        bg_threshold,
+        precision,
+        analysis_scale=analysis_scale,
+        removal_backend=removal_backend,
+    )
+    if threads is not None and threads < 1:
+        raise InvalidParameterError(f"Threads must be at least 1: {threads}")
+
+    instrumentation = Instrumentation(hooks or (), trace_memory=trace_memory)
+    with instrumentation:
+        started = time.perf_counter()
+        instrumentation.message(f"Preparing foreground: {describe_source(foreground)}")
+        with instrumentation.stage("prepare_foreground") as info:
+            if is_cutout_path(foreground):
+                cutout = load_cutout(foreground)
+            elif isinstance(foreground, Cutout):
+                cutout = foreground
+            else:
+                cutout = prepare_cutout(
+                    foreground,
+                    bg_threshold=bg_threshold,
+                    mask_cache=mask_cache,
+                    analysis_scale=analysis_scale,
+                    removal_backend=removal_backend,
+                )
+            info["size"] = cutout.size
+        prepare_seconds = time.perf_counter() - started
+
+        # The resized cutout for each frame size, shared by all threads
+        fitted = {}
+        fitted_lock = threading.Lock()
+        local = threading.local()
+
+        def fit(frame_size):
+            with fitted_lock:
+                if frame_size not in fitted:
+                    width, height = _fit_frame(cutout.size, frame_size, 1.0)
+                    center = (
+                        (frame_size[0] - width) // 2,
+                        (frame_size[1] - height) // 2,
+                    )
+                    prepared = _prepare_foreground(
+                        cutout,
+                        frame_size,
+                        Instrumentation(),
+                        crop_to_subject=crop_to_subject,
+                        position=(0, 0),
+                    )
+                    fitted[frame_size] = (
+                        None if prepared is None else (*prepared, center)
+                    )
+                return fitted[frame_size]
+
+        def decode(frame):
+            index, (name, source) = frame
+            image = open_image(source, f"frame '{name}'")
+            frame_format = image.format
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            elif isinstance(source, (Image.Image, np.ndarray)):
+                # Never blend into the caller's own pixels
+                image = image.copy()
+            return index, name, image, frame_format
+
+        def blend(frame):
+            index, name, image, frame_format = frame
+            prepared = fit(image.size)
+            if prepared is not None:
+                foreground_image, offset, center = prepared
+                x, y = position or center
+                origin = (x + drift[0] * index, y + drift[1] * index)
+                if not hasattr(local, "workspace"):
+                    local.workspace = Workspace()
+                composite_tiled(
+                    image,
+                    foreground_image,
+                    (origin[0] + offset[0], origin[1] + offset[1]),
+                    blend_mode,
+                    precision,
+                    workspace=local.workspace,
+                    opacity=opacity,
+                )
+            return name, image, frame_format
+
+        options = output_options or OutputOptions(quality=quality)
+
+        def encode(frame):
+            name, image, frame_format = frame
+            output_format = (format or options.format or frame_format or "PNG").upper()
+            if format or not os.path.splitext(name)[1]:
+                extension = FRAME_EXTENSIONS.get(output_format, f".{output_format}")
+                name = os.path.splitext(name)[0] + extension.lower()
+            return name, encode_image(
+                image, output_format, **options.save_options(output_format)
+            )
+
+        def write(frame):
+            name, data = frame
+            sink(name, data)
+            instrumentation.message(f"  ✓ {name}")
+
+        with instrumentation.stage("frames", threads=threads) as info:
+            started = time.perf_counter()
+            count = run_pipeline(
+                enumerate(frames), [decode, blend, encode], write, threads=threads
+            )
+            result = SequenceResult(
+                frames=count,
+                elapsed=time.perf_counter() - started,
+                prepare_seconds=prepare_seconds,
+            )
+            info.update(frames=count, fps=result.fps)
+        return result
+
+
+def _streams(output_path, options, precision, max_output_size, output_bits, placement):
+    """Whether a tiled mix with these settings can be written strip by strip."""
+    return (
+        options.format_for(output_path) == "PNG"
+        and not options.sizes
+        and precision != "linear"
+        and output_bits == 8
+        and not max_output_size
+        and placement == "center"
+    )
+
+
+def _open_strips(background):
+    """StripReader for a background file, or None if it must be decoded whole."""
+    if not isinstance(background, (str, os.PathLike)):
+        return None
+    try:
+        return StripReader.open(background)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # The regular path reports unreadable files
+        return None
+
+
+def _mix_streamed(
+    reader,
+    foreground,
+    output_path,
+    instrumentation,
+    output_options,
+    memory_limit,
+    blend_mode="normal",
+    opacity=0.8,
+    precision="float",
+    threads=1,
+    **foreground_options,
+):
+    """
+    Mix onto a background read from its file, writing the result as a PNG
+    strip by strip.
+
+    Neither the background nor the result is held in memory as a whole:
+    each strip of rows is read from the file (see strips.py), blended where
+    the foreground overlaps it and appended to the output. Strips are sized
+    by strip_rows, like composite_tiled's, so they stay within memory_limit.
+
+    Args:
+        reader: strips.StripReader of the background
+        foreground: Foreground source (see _prepare_foreground)
+        output_path: PNG file to write
+        instrumentation: Instrumentation for stages and messages
+        output_options: OutputOptions (for the PNG compression level)
+        memory_limit: Working-memory budget in MB
+        **foreground_options: Options for _prepare_foreground
+
+    Raises:
+        ImageLoadError: If the background file is truncated
+        EncodeError: If the output cannot be written
+    """
+    validate_options(
+        blend_mode,
+        opacity,
+        foreground_options.get("bg_threshold", 30),
+        precision,
+        memory_limit,
+        foreground_options.get("analysis_scale", 1.0),
+        foreground_options.get("removal_order", "remove-first"),
+        removal_backend=foreground_options.get("removal_backend", "heuristic"),
+        threads=threads,
+    )
+    log = instrumentation.message
+    log(f"Reading background image in strips: {reader.path}")
+    with instrumentation.stage("load_background", streamed=True) as info:
+        info["size"] = reader.size
+    prepared = _prepare_foreground(
+        foreground,
+        reader.size,
+        instrumentation,
+        threads=threads,
+        **foreground_options,
+    )
+
+    width, height = reader.size
+    rows = strip_rows(width, precision, memory_limit * 1024 * 1024)
+    workspace = Workspace()
+    log(f"Saving mixed image to: {output_path}")
+    with instrumentation.stage(
+        "blend",
+        mode=blend_mode,
+        precision=precision,
+        opacity=opacity,
+        tiled=True,
+        streamed=True,
+        threads=threads,
+    ) as info:
+        info["strips"] = -(-height // rows)
+        try:
+            writer = PngStripWriter(
+                output_path,
+                reader.size,
+                output_options.compress_level,
+                reader.info.get("icc_profile"),
+            )
+            with writer:
+                for top in range(0, height, rows):
+                    bottom = min(height, top + rows)
+                    try:
+                        strip = np.array(reader.read(top, bottom))
+                    except (OSError, ValueError) as error:
+                        raise ImageLoadError(
+                            f"Cannot read background image: {error}"
+                        ) from error
+                    if prepared is not None:
+                        _blend_rows(
+                            strip,
+                            top,
+                            prepared,
+                            blend_mode,
+                            precision,
+                            workspace,
+                            opacity,
+                            threads,
+                        )
+                    writer.write(strip)
+        except OSError as error:
+            raise EncodeError(
+                f"Cannot save mixed image to {output_path}: {error}"
+            ) from error
+
+
+def _blend_rows(strip, top, prepared, mode, precision, workspace, opacity, threads):
+    """Blend the rows of a prepared foreground that fall on one strip."""
+    foreground, (x, y) = prepared
+    first = max(top, y)
+    last = min(top + len(strip), y + foreground.height)
+    if first >= last:
+        return
+    rows = np.asarray(foreground.crop((0, first - y, foreground.width, last - y)))
+    composite(
+        strip, rows, (x, first - top), mode, precision, workspace, opacity, threads
+    )
 
 
 def mix_photos(
@@ -346,81 +2064,181 @@ def mix_photos(
     blend_mode="normal",
     opacity=0.8,
     bg_threshold=30,
+    verbose=True,
+    exit_on_error=True,
+    precision="float",
+    memory_limit=None,
+    mask_cache=None,
+    analysis_scale=1.0,
+    removal_order="remove-first",
+    removal_backend="heuristic",
+    crop_to_subject=True,
+    max_output_size=None,
+    draft=None,
+    output_bits=8,
+    threads=1,
+    placement="center",
+    hooks=None,
+    trace_memory=False,
+    output_options=None,
+    encoder=None,
 ):
     """
     Mix a background and foreground photo.
 
     Args:
         background_path: Path to background image
-        foreground_path: Path to foreground image to overlay
+        foreground_path: Path to foreground image to overlay, or to a
+            prepared ``.cutout.npz`` cutout
         output_path: Path to save the mixed image
         blend_mode: Blending mode ('normal', 'multiply', 'screen', 'overlay')
         opacity: Opacity of foreground image (0.0 to 1.0)
+        bg_threshold: Background removal threshold (0-100)
+        verbose: Print progress messages (adds a ConsoleProgress hook)
+        exit_on_error: Exit the process on failure instead of raising
+        precision: Blend arithmetic, 'float' (default), 'fixed' point, or
+            'linear' light (color managed; see mix_images)
+        memory_limit: Compositing working-memory budget in MB; when set the
+            background is blended in place in strips (tiled mode). An
+            uncompressed PPM, BMP or TIFF background mixed into a PNG is
+            streamed: read, blended and written one strip at a time (see
+            strips.py), so neither image is held in memory as a whole
+        mask_cache: Optional MaskCache to reuse background-removal masks
+        analysis_scale: Compute the removal mask at this fraction of the
+            resolution and refine its boundary at full resolution (0-1]
+        removal_order: 'remove-first' (default), 'resize-first' to remove the
+            background after shrinking the foreground, or 'auto' to resize
+            first whenever the foreground is being shrunk
+        removal_backend: 'heuristic' (default) for the binary lightness and
+            color mask, or 'matting' to add soft, color-guided edges
+        crop_to_subject: Resize and blend only the subject's bounding box;
+            False resamples the whole frame (bit-exact with older versions)
+        max_output_size: Cap on the longest side of the output in pixels;
+            a larger background is decoded at reduced resolution and shrunk
+        draft: Decode large inputs at reduced resolution (default: only when
+            max_output_size is set; see decode_image)
+        output_bits: 8, or 16 (with 'linear' precision) to write a 48-bit PNG
+        threads: Most threads to process this one image on (see mix_images)
+        placement: 'center' (default) or 'auto' (see mix_images)
+        hooks: Instrumentation hooks notified of progress messages and of
+            per-stage timings (see instrumentation.py)
+        trace_memory: Include tracemalloc allocation peaks in stage records
+        output_options: OutputOptions for the format, encoder settings and
+            extra sizes (default: format from the extension, quality 95)
+        encoder: Optional encoding.Encoder; the result is queued on it and
+            written in the background instead of before returning (its
+            output_options are used, and its wait() reports write errors)
+
+    Returns:
+        The mixed RGB PIL Image (a color.DeepImage for 16-bit output), or
+        None when it was streamed to disk strip by strip (see memory_limit)
+
+    Raises:
+        PhotoMixerError: If an input, option or the output is bad and
+            exit_on_error is False
     """
-    try:
-        # Load images
-        print(f"Loading background image: {background_path}")
-        background = Image.open(background_path).convert("RGB")
-
-        print(f"Loading foreground image: {foreground_path}")
-        foreground = Image.open(foreground_path)
-
-        # Step 1: Remove background from foreground image completely
-        print(
-            f"Step 1: Removing background from foreground image (threshold: {bg_threshold})..."
-        )
-        foreground = remove_background(foreground, threshold=bg_threshold)
-        print("  ✓ Background removed, subject isolated")
-
-        # Step 2: Resize foreground to fit nicely on background
-        print("Step 2: Resizing foreground image to fit background...")
-        foreground = resize_to_fit(foreground, background)
-        print("  ✓ Foreground resized")
-
-        # Ensure RGBA mode
-        if foreground.mode != "RGBA":
-            foreground = foreground.convert("RGBA")
+    instrumentation = Instrumentation(
+        hooks or (),
+        trace_memory=trace_memory,
+        context={
+            "background": background_path,
+            "foreground": foreground_path,
+            "output": output_path,
+        },
+    )
+    if verbose:
+        instrumentation.add_hook(ConsoleProgress())
+    log = instrumentation.message
 
-        # Step 3: Adjust opacity if needed (only affects the subject, not removed background)
-        if opacity < 1.0:
-            alpha = foreground.split()[3]
-            alpha = alpha.point(lambda p: int(p * opacity))
-            foreground.putalpha(alpha)
-            print(f"  ✓ Opacity adjusted to {opacity}")
-
-        # Calculate position to center foreground on background
-        bg_width, bg_height = background.size
-        fg_width, fg_height = foreground.size
-        position = ((bg_width - fg_width) // 2, (bg_height - fg_height) // 2)
-
-        # Create output image starting with background
-        output = background.copy()
-
-        # Blend modes with proper alpha compositing
-        if blend_mode == "normal":
-            # Proper alpha compositing with better blending
-            output = blend_with_alpha(output, foreground, position)
-        elif blend_mode == "multiply":
-            # Multiply blend mode with alpha
-            output = blend_mode_multiply(output, foreground, position)
-        elif blend_mode == "screen":
-            # Screen blend mode (lighter) with alpha
-            output = blend_mode_screen(output, foreground, position)
-        elif blend_mode == "overlay":
-            # Overlay blend mode with alpha
-            output = blend_mode_overlay(output, foreground, position)
-        else:
-            # Default to normal
-            output = blend_with_alpha(output, foreground, position)
+    try:
+        with instrumentation:
+            options = encoder.options if encoder else output_options or OutputOptions()
+            reader = None
+            if memory_limit and _streams(
+                output_path,
+                options,
+                precision,
+                max_output_size,
+                output_bits,
+                placement,
+            ):
+                reader = _open_strips(background_path)
+                if reader is None:
+                    log(
+                        "  Background is decoded whole (only uncompressed PPM, BMP "
+                        "and TIFF backgrounds are read in strips)"
+                    )
+            if reader is not None:
+                with reader:
+                    _mix_streamed(
+                        reader,
+                        foreground_path,
+                        output_path,
+                        instrumentation,
+                        options,
+                        memory_limit,
+                        blend_mode=blend_mode,
+                        opacity=opacity,
+                        precision=precision,
+                        threads=threads,
+                        bg_threshold=bg_threshold,
+                        mask_cache=mask_cache,
+                        analysis_scale=analysis_scale,
+                        removal_order=removal_order,
+                        removal_backend=removal_backend,
+                        crop_to_subject=crop_to_subject,
+                        draft=bool(draft),
+                    )
+                if encoder is not None:
+                    encoder.record(output_path)
+                log("✓ Successfully created mixed image!")
+                return None
+
+            output = _mix(
+                background_path,
+                foreground_path,
+                instrumentation,
+                blend_mode=blend_mode,
+                opacity=opacity,
+                bg_threshold=bg_threshold,
+                precision=precision,
+                memory_limit=memory_limit,
+                mask_cache=mask_cache,
+                analysis_scale=analysis_scale,
+                removal_order=removal_order,
+                removal_backend=removal_backend,
+                crop_to_subject=crop_to_subject,
+                max_output_size=max_output_size,
+                draft=draft,
+                output_bits=output_bits,
+                threads=threads,
+                placement=placement,
+            )
 
-        # Save the result
-        print(f"Saving mixed image to: {output_path}")
-        output.save(output_path, quality=95)
-        print(f"✓ Successfully created mixed image!")
+            # Save the result
+            if encoder is not None:
+                log(f"Queueing mixed image for writing to: {output_path}")
+                with instrumentation.stage("encode", background=True):
+                    encoder.submit(output, output_path)
+                return output
+
+            log(f"Saving mixed image to: {output_path}")
+            with instrumentation.stage("encode"):
+                try:
+                    write_outputs(
+                        output, output_path, output_options or OutputOptions()
+                    )
+                except (OSError, KeyError, ValueError) as error:
+                    raise EncodeError(
+                        f"Cannot save mixed image to {output_path}: {error}"
+                    ) from error
+            log("✓ Successfully created mixed image!")
 
         return output
 
     except Exception as e:
+        if not exit_on_error:
+            raise
         print(f"Error mixing photos: {str(e)}")
         sys.exit(1)
 
@@ -435,6 +2253,15 @@ Examples:
   python src/photo_mixer.py --background bg.jpg --foreground fg.jpg
   python src/photo_mixer.py --background bg.jpg --foreground fg.jpg --blend-mode multiply --opacity 0.9
   python src/photo_mixer.py --background bg.jpg --foreground fg.jpg --output result.jpg
+  python src/photo_mixer.py --background bg.jpg --foreground fg.jpg --format webp --quality 85 --sizes 320
+  python src/photo_mixer.py --background bg.jpg --foreground a.png --layer b.png,x=40,y=60,scale=0.5,mode=screen
+  python src/photo_mixer.py --manifest pairs.csv --workers 8
+  python src/photo_mixer.py --background-dir backgrounds/ --foreground-dir subjects/
+  python src/photo_mixer.py --prepare --foreground fg.jpg --output subject
+  python src/photo_mixer.py --background bg.jpg --foreground images/cutouts/subject.cutout.npz
+  python src/photo_mixer.py --frames clip/ --foreground fg.png --workers 8
+  ffmpeg -i in.mp4 -f image2pipe -c:v png - | python src/photo_mixer.py --frames - -f fg.png -o - | ffmpeg -f image2pipe -i - out.mp4
+  python src/photo_mixer.py --serve --port 8765 --workers 4
         """,
     )
 
@@ -442,14 +2269,14 @@ Examples:
         "--background",
         "-b",
         type=str,
-        required=True,
+        default=None,
         help="Path to the background image (base/larger image that stays full size)",
     )
     parser.add_argument(
         "--foreground",
         "-f",
         type=str,
-        required=True,
+        default=None,
         help="Path to the foreground image (will be overlaid and resized on background)",
     )
     parser.add_argument(
@@ -463,10 +2290,129 @@ Examples:
         "--blend-mode",
         "-m",
         type=str,
-        choices=["normal", "multiply", "screen", "overlay"],
+        choices=list(BLEND_MODES),
         default="normal",
         help="Blending mode: normal (default), multiply, screen, or overlay",
     )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=PRECISIONS,
+        default="float",
+        help="Blend arithmetic: float (default), fixed (faster 8-bit fixed-point) "
+        "or linear (linear light, color managed, keeps 16-bit backgrounds)",
+    )
+    parser.add_argument(
+        "--output-bits",
+        type=int,
+        choices=(8, 16),
+        default=8,
+        help="Bits per channel of the output: 8 (default) or 16 (a 48-bit PNG; "
+        "requires --precision linear)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=None,
+        help="Blend in strips using at most this many MB of working memory (tiled mode)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Threads to split background removal, resizing and blending of each "
+        "image over (default: 1; the result is the same for any number)",
+    )
+    parser.add_argument(
+        "--placement",
+        choices=PLACEMENTS,
+        default="center",
+        help="Where the foreground goes: center (default), or auto to pick the "
+        "position and scale that hide the least of the background's detail",
+    )
+    parser.add_argument(
+        "--analysis-scale",
+        type=float,
+        default=1.0,
+        help="Compute the removal mask at this fraction of the resolution, "
+        "refining only its boundary at full size (0-1, default: 1.0 = exact)",
+    )
+    parser.add_argument(
+        "--removal-order",
+        type=str,
+        choices=REMOVAL_ORDERS,
+        default="remove-first",
+        help="Remove the background before (default) or after resizing the "
+        "foreground; auto resizes first whenever the foreground shrinks",
+    )
+    parser.add_argument(
+        "--removal-backend",
+        type=str,
+        choices=list(REMOVAL_BACKENDS),
+        default="heuristic",
+        help="Background removal method: heuristic (default, hard edges) or "
+        "matting (soft, color-guided edges; slower)",
+    )
+    parser.add_argument(
+        "--no-crop",
+        dest="crop_to_subject",
+        action="store_false",
+        help="Resize and blend the whole foreground frame instead of only the "
+        "subject's bounding box (slower, bit-exact with older versions)",
+    )
+    parser.add_argument(
+        "--max-output-size",
+        type=int,
+        default=None,
+        metavar="PIXELS",
+        help="Shrink the background so the output's longest side is at most "
+        "PIXELS; large JPEGs are decoded at reduced size (fast previews)",
+    )
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        default=None,
+        help="Also decode a large foreground at reduced size, just above its "
+        "fitted size (much faster; the removal mask is approximate). On by "
+        "default with --max-output-size",
+    )
+    parser.add_argument(
+        "--mask-cache",
+        type=str,
+        nargs="?",
+        const=DEFAULT_CACHE_DIR,
+        default=None,
+        help="Cache background-removal masks on disk (default dir: .cache/masks)",
+    )
+    parser.add_argument(
+        "--mask-cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Maximum mask cache size in MB before LRU eviction (default: 512)",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        nargs="?",
+        const="-",
+        default=None,
+        help="Write per-stage timing and memory as JSON lines to FILE "
+        "(default: stderr)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Include tracemalloc allocation peaks in --metrics (slower)",
+    )
+    parser.add_argument(
+        "--layer",
+        type=str,
+        action="append",
+        default=[],
+        metavar="PATH[,KEY=VALUE...]",
+        help="Add a foreground layer on top of --foreground; keys: x, y, scale, "
+        "opacity, mode, threshold (repeatable, composited in one pass)",
+    )
     parser.add_argument(
         "--opacity",
         "-p",
@@ -482,7 +2428,344 @@ Examples:
         help="Background removal threshold (0-100, lower=more aggressive, default: 30)",
     )
 
-    return parser.parse_args()
+    output_group = parser.add_argument_group("output")
+    output_group.add_argument(
+        "--format",
+        choices=["jpeg", "png", "webp"],
+        default=None,
+        help="Output format (default: from the --output extension, else JPEG)",
+    )
+    output_group.add_argument(
+        "--preset",
+        choices=list(PRESETS),
+        default="default",
+        help="Encoder settings preset: default (JPEG quality 95), web (quality "
+        "85, optimized, progressive), fast, small (WebP) or archive (PNG)",
+    )
+    output_group.add_argument(
+        "--quality",
+        type=int,
+        default=None,
+        help="JPEG/WebP quality from 1 to 100 (default: from the preset)",
+    )
+    output_group.add_argument(
+        "--optimize",
+        action="store_true",
+        default=None,
+        help="Spend an extra encoder pass on smaller JPEG/PNG files",
+    )
+    output_group.add_argument(
+        "--progressive",
+        action="store_true",
+        default=None,
+        help="Write progressive JPEGs",
+    )
+    output_group.add_argument(
+        "--compress-level",
+        type=int,
+        default=None,
+        help="PNG compression level from 0 (fastest) to 9 (smallest)",
+    )
+    output_group.add_argument(
+        "--webp-method",
+        type=int,
+        default=None,
+        help="WebP effort from 0 (fastest) to 6 (smallest)",
+    )
+    output_group.add_argument(
+        "--lossless",
+        action="store_true",
+        default=None,
+        help="Write lossless WebP",
+    )
+    output_group.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=None,
+        metavar="PIXELS",
+        help="Also write copies downscaled to these longest-side sizes, "
+        "e.g. --sizes 320 1280 for a thumbnail and a preview",
+    )
+
+    prepare_group = parser.add_argument_group("cutouts")
+    prepare_group.add_argument(
+        "--prepare",
+        action="store_true",
+        help="Remove the foreground's background once and save it as a "
+        ".cutout.npz cutout that can be used as --foreground later",
+    )
+    prepare_group.add_argument(
+        "--pyramid-levels",
+        type=int,
+        default=0,
+        help="Extra half-resolution levels stored in a prepared cutout (default: 0)",
+    )
+
+    sweep_group = parser.add_argument_group("threshold sweep")
+    sweep_group.add_argument(
+        "--sweep",
+        type=str,
+        default=None,
+        metavar="THRESHOLDS",
+        help="Cut out --foreground at several thresholds in one pass and save "
+        "a contact sheet, e.g. '10,20,30' or '10:60:5' (start:stop:step)",
+    )
+    sweep_group.add_argument(
+        "--sweep-masks",
+        action="store_true",
+        help="Also save each threshold's mask as a PNG",
+    )
+    sweep_group.add_argument(
+        "--tile-size",
+        type=int,
+        default=256,
+        help="Longest side of each contact-sheet tile in pixels (default: 256)",
+    )
+
+    batch_group = parser.add_argument_group("batch mode")
+    batch_group.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="CSV file with 'background,foreground[,output]' rows to mix in one run",
+    )
+    batch_group.add_argument(
+        "--background-dir",
+        type=str,
+        default=None,
+        help="Directory of backgrounds, mixed with every image in --foreground-dir",
+    )
+    batch_group.add_argument(
+        "--foreground-dir",
+        type=str,
+        default=None,
+        help="Directory of foregrounds, mixed onto every image in --background-dir",
+    )
+    batch_group.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=None,
+        help="Number of worker processes for batch and server mode, or threads "
+        "for sequence mode (default: CPU count)",
+    )
+    batch_group.add_argument(
+        "--index",
+        type=str,
+        nargs="?",
+        const=DEFAULT_INDEX_PATH,
+        default=None,
+        help="Hash every input into an index file and copy earlier outputs for "
+        "pairs already rendered with the same settings (default file: "
+        ".cache/index.json)",
+    )
+    batch_group.add_argument(
+        "--near-duplicates",
+        type=int,
+        default=None,
+        metavar="BITS",
+        help="With --index, also treat same-size images whose 64-bit perceptual "
+        "hashes differ in at most BITS bits as the same input",
+    )
+
+    sequence_group = parser.add_argument_group("sequence mode")
+    sequence_group.add_argument(
+        "--frames",
+        type=str,
+        default=None,
+        help="Directory of numbered frames to mix --foreground onto, or '-' for "
+        "a stream of PNG/JPEG/PPM images on stdin (e.g. ffmpeg -f image2pipe)",
+    )
+    sequence_group.add_argument(
+        "--frame-format",
+        choices=["png", "jpeg", "ppm", "webp"],
+        default=None,
+        help="Encode output frames in this format (default: same as the input)",
+    )
+    sequence_group.add_argument(
+        "--drift",
+        type=str,
+        default=None,
+        metavar="DX,DY",
+        help="Move the foreground this many pixels per frame, starting centered",
+    )
+
+    server_group = parser.add_argument_group("server mode")
+    server_group.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a local HTTP compositing service instead of mixing files "
+        "(POST /mix, GET /stats; uses --workers processes)",
+    )
+    server_group.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on in server mode (default: 127.0.0.1)",
+    )
+    server_group.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port to listen on in server mode (default: 8765)",
+    )
+    server_group.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Mixes queued or running before requests get 503 (default: 2 x workers)",
+    )
+    server_group.add_argument(
+        "--max-upload",
+        type=int,
+        default=64,
+        help="Largest accepted request body in MB (default: 64)",
+    )
+
+    args = parser.parse_args()
+
+    args.batch = bool(args.manifest or args.background_dir or args.foreground_dir)
+    if args.serve:
+        if args.batch or args.prepare or args.background or args.foreground:
+            parser.error("--serve cannot be combined with file or batch arguments")
+        if args.output:
+            parser.error("--serve cannot be combined with file or batch arguments")
+        if args.max_pending is not None and args.max_pending < 1:
+            parser.error("--max-pending must be at least 1")
+        if args.max_upload < 1:
+            parser.error("--max-upload must be at least 1 MB")
+    elif args.prepare:
+        if not args.foreground or args.background or args.batch:
+            parser.error("--prepare takes --foreground (and optionally --output) only")
+        if args.pyramid_levels < 0:
+            parser.error("--pyramid-levels must be 0 or more")
+    elif args.sweep:
+        if not args.foreground or args.background or args.batch or args.layer:
+            parser.error("--sweep takes --foreground (and optionally --output) only")
+        try:
+            args.sweep_thresholds = parse_thresholds(args.sweep)
+        except ValueError as error:
+            parser.error(f"--sweep: {error}")
+        if not args.sweep_thresholds or not all(
+            0 <= threshold <= 100 for threshold in args.sweep_thresholds
+        ):
+            parser.error("--sweep thresholds must be between 0 and 100")
+        if len(args.sweep_thresholds) > 255:
+            parser.error("--sweep takes at most 255 thresholds")
+        if args.analysis_scale != 1.0 or args.removal_backend != "heuristic":
+            parser.error(
+                "--sweep evaluates the heuristic backend at full resolution; "
+                "--analysis-scale and --removal-backend are not used"
+            )
+        if args.tile_size < 16:
+            parser.error("--tile-size must be at least 16")
+    elif args.frames:
+        if not args.foreground or args.background or args.batch or args.layer:
+            parser.error("--frames takes --foreground (and optionally --output) only")
+        if args.memory_limit:
+            parser.error("--memory-limit is not used in sequence mode")
+        if args.max_output_size or args.draft:
+            parser.error("--max-output-size and --draft are not used in sequence mode")
+        args.drift_step = None
+        if args.drift:
+            try:
+                dx, dy = (int(value) for value in args.drift.split(","))
+            except ValueError:
+                parser.error(f"--drift must be DX,DY in pixels: {args.drift!r}")
+            args.drift_step = (dx, dy)
+    elif args.batch:
+        if args.manifest and (args.background_dir or args.foreground_dir):
+            parser.error(
+                "--manifest cannot be combined with --background-dir/--foreground-dir"
+            )
+        if not args.manifest and not (args.background_dir and args.foreground_dir):
+            parser.error("--background-dir and --foreground-dir must be used together")
+        if args.background or args.foreground or args.output:
+            parser.error(
+                "--background/--foreground/--output are not used in batch mode"
+            )
+    elif not (args.background and (args.foreground or args.layer)):
+        parser.error(
+            "the following arguments are required: --background/-b, --foreground/-f"
+        )
+    if (args.frame_format or args.drift) and not args.frames:
+        parser.error("--frame-format and --drift require --frames")
+    if args.layer and (args.serve or args.prepare or args.batch):
+        parser.error("--layer only works when mixing a single --background")
+    if args.layer and args.memory_limit:
+        parser.error("--layer cannot be combined with --memory-limit")
+    if args.max_output_size is not None and args.max_output_size < 1:
+        parser.error("--max-output-size must be at least 1 pixel")
+    if args.output_bits == 16:
+        if args.precision != "linear":
+            parser.error("--output-bits 16 requires --precision linear")
+        if args.serve or args.prepare or args.sweep or args.frames or args.batch:
+            parser.error("--output-bits 16 only works when mixing a single image")
+        if args.layer:
+            parser.error("--output-bits 16 cannot be combined with --layer")
+        extension = os.path.splitext(args.output or "")[1].lower()
+        if args.format not in (None, "png") or extension not in ("", ".png"):
+            parser.error("--output-bits 16 writes PNG; use a .png --output")
+        args.format = "png"
+
+    args.layers = []
+    for spec in args.layer:
+        try:
+            args.layers.append(
+                parse_layer(
+                    spec,
+                    opacity=max(0.0, min(1.0, args.opacity)),
+                    blend_mode=args.blend_mode,
+                    bg_threshold=max(0, min(100, args.bg_threshold)),
+                )
+            )
+        except ValueError as error:
+            parser.error(f"--layer: {error}")
+
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if args.threads > 1 and (args.prepare or args.sweep or args.frames or args.layer):
+        parser.error(
+            "--threads only works when mixing single images, in batch mode and "
+            "in server mode"
+        )
+    if args.placement != "center" and (
+        args.prepare or args.sweep or args.frames or args.layer
+    ):
+        parser.error(
+            "--placement only works when mixing single images, in batch mode and "
+            "in server mode"
+        )
+    if (args.index or args.near_duplicates is not None) and not args.batch:
+        parser.error("--index and --near-duplicates only work in batch mode")
+    if args.near_duplicates is not None:
+        if not args.index:
+            parser.error("--near-duplicates requires --index")
+        if not 0 <= args.near_duplicates <= 64:
+            parser.error("--near-duplicates must be between 0 and 64")
+    if args.memory_limit is not None and args.memory_limit < 1:
+        parser.error("--memory-limit must be at least 1 MB")
+    if args.mask_cache_size < 1:
+        parser.error("--mask-cache-size must be at least 1 MB")
+    if not 0.0 < args.analysis_scale <= 1.0:
+        parser.error("--analysis-scale must be greater than 0 and at most 1")
+    if args.trace_memory and not args.metrics:
+        parser.error("--trace-memory requires --metrics")
+    if args.quality is not None and not 1 <= args.quality <= 100:
+        parser.error("--quality must be between 1 and 100")
+    if args.compress_level is not None and not 0 <= args.compress_level <= 9:
+        parser.error("--compress-level must be between 0 and 9")
+    if args.webp_method is not None and not 0 <= args.webp_method <= 6:
+        parser.error("--webp-method must be between 0 and 6")
+    if args.sizes and min(args.sizes) < 1:
+        parser.error("--sizes must be positive")
+    if args.sizes and (args.frames or args.serve or args.prepare or args.sweep):
+        parser.error("--sizes only works when writing mixed images to files")
+
+    return args
 
 
 def resolve_image_path(path):
@@ -523,21 +2806,210 @@ def validate_paths(background_path, foreground_path):
     return resolved_bg, resolved_fg
 
 
-def main():
-    """Main function to run the photo mixer."""
-    args = parse_arguments()
+def get_output_dir():
+    """Return the images/mixed output directory, creating it if needed."""
+    output_dir = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "images", "mixed"
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+
+def default_output_filename(background_path, foreground_path, extension=".jpg"):
+    """Build the default output filename for a background/foreground pair."""
+    bg_name = os.path.splitext(os.path.basename(background_path))[0]
+    fg_name = os.path.basename(foreground_path)
+    if fg_name.lower().endswith(CUTOUT_SUFFIX):
+        fg_name = fg_name[: -len(CUTOUT_SUFFIX)]
+    fg_name = os.path.splitext(fg_name)[0]
+    return f"mixed_{bg_name}_{fg_name}{extension}"
+
+
+def create_mask_cache(args):
+    """Create the mask cache requested on the command line, if any."""
+    if not args.mask_cache:
+        return None
+    return MaskCache(args.mask_cache, max_bytes=args.mask_cache_size * 1024 * 1024)
+
+
+def create_index(args):
+    """Create the input index requested on the command line, if any."""
+    if not args.index:
+        return None
+    return InputIndex(args.index, near_distance=args.near_duplicates)
+
+
+def create_output_options(args):
+    """Build OutputOptions from --preset and the encoder options."""
+    overrides = {
+        "quality": args.quality,
+        "optimize": args.optimize,
+        "progressive": args.progressive,
+        "compress_level": args.compress_level,
+        "method": args.webp_method,
+        "lossless": args.lossless,
+    }
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    if args.format:
+        overrides["format"] = FORMAT_NAMES[args.format]
+    if args.sizes:
+        overrides["sizes"] = tuple(args.sizes)
+    return preset(args.preset, **overrides)
+
+
+def create_hooks(args):
+    """Create the instrumentation hooks requested on the command line."""
+    if not args.metrics:
+        return []
+    return [JsonLinesWriter(None if args.metrics == "-" else args.metrics)]
+
+
+def run_batch_mode(args, opacity, bg_threshold):
+    """Run batch mode from a manifest or background x foreground directories."""
+    # Imported here so single-image runs do not pay for the batch machinery
+    import batch
+
+    if args.manifest:
+        jobs = batch.load_manifest(args.manifest)
+    else:
+        jobs = batch.cross_product_jobs(args.background_dir, args.foreground_dir)
 
-    # Validate and resolve paths
-    background_path, foreground_path = validate_paths(args.background, args.foreground)
+    if not jobs:
+        print("Error: No image pairs found for batch mode")
+        sys.exit(1)
 
-    # Validate opacity
-    opacity = max(0.0, min(1.0, args.opacity))
+    print("=" * 60)
+    print("Photo Mixer - Batch Mode")
+    print("=" * 60)
+    print()
+    print(f"  Pairs: {len(jobs)}")
+    print(f"  Blend mode: {args.blend_mode}")
+    print(f"  Opacity: {opacity}")
+    print(f"  Workers: {args.workers or os.cpu_count()}")
+    print()
+    print("-" * 60)
 
-    # Determine output path - always save to images/mixed folder
-    output_dir = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)), "images", "mixed"
+    result = batch.run_batch(
+        jobs,
+        get_output_dir(),
+        workers=args.workers,
+        blend_mode=args.blend_mode,
+        opacity=opacity,
+        bg_threshold=bg_threshold,
+        precision=args.precision,
+        memory_limit=args.memory_limit,
+        mask_cache=create_mask_cache(args),
+        analysis_scale=args.analysis_scale,
+        removal_order=args.removal_order,
+        removal_backend=args.removal_backend,
+        crop_to_subject=args.crop_to_subject,
+        max_output_size=args.max_output_size,
+        draft=args.draft,
+        threads=args.threads,
+        placement=args.placement,
+        hooks=create_hooks(args),
+        trace_memory=args.trace_memory,
+        output_options=create_output_options(args),
+        index=create_index(args),
     )
+
+    print("-" * 60)
+    print(result.summary())
+    if result.failed:
+        sys.exit(1)
+
+
+def run_prepare_mode(args, bg_threshold):
+    """Prepare a cutout from --foreground and save it under images/cutouts."""
+    foreground_path = resolve_image_path(args.foreground)
+    if foreground_path is None:
+        print(f"Error: Foreground image not found: {args.foreground}")
+        sys.exit(1)
+
+    name = os.path.basename(args.output or "")
+    if not name:
+        name = os.path.splitext(os.path.basename(foreground_path))[0]
+    if not name.endswith(CUTOUT_SUFFIX):
+        name += CUTOUT_SUFFIX
+    output_dir = os.path.join(os.path.dirname(get_output_dir()), "cutouts")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, name)
+
+    print(f"Preparing cutout from: {foreground_path} (threshold: {bg_threshold})")
+    try:
+        cutout = prepare_cutout(
+            foreground_path,
+            bg_threshold=bg_threshold,
+            mask_cache=create_mask_cache(args),
+            analysis_scale=args.analysis_scale,
+            pyramid_levels=args.pyramid_levels,
+            removal_backend=args.removal_backend,
+        )
+        cutout.save(output_path)
+    except (PhotoMixerError, OSError) as error:
+        print(f"Error preparing cutout: {error}")
+        sys.exit(1)
+
+    if cutout.box is None:
+        print("  Warning: no subject left after background removal")
+    else:
+        left, top, right, bottom = cutout.box
+        print(f"  ✓ Subject box: {right - left}x{bottom - top} at ({left}, {top})")
+    print(f"✓ Cutout saved to: {output_path}")
+
+
+def run_sweep_mode(args):
+    """Sweep --foreground over several thresholds and save a contact sheet."""
+    foreground_path = resolve_image_path(args.foreground)
+    if foreground_path is None:
+        print(f"Error: Foreground image not found: {args.foreground}")
+        sys.exit(1)
+
+    stem = os.path.splitext(os.path.basename(foreground_path))[0]
+    name = os.path.basename(args.output or "") or f"{stem}_sweep.png"
+    output_dir = os.path.join(os.path.dirname(get_output_dir()), "sweeps")
     os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, name)
+
+    thresholds = args.sweep_thresholds
+    print(f"Sweeping {len(thresholds)} threshold(s) on: {foreground_path}")
+    started = time.perf_counter()
+    try:
+        foreground = open_image(foreground_path, "foreground")
+        sweep = ThresholdSweep(foreground, thresholds)
+    except PhotoMixerError as error:
+        print(f"Error sweeping thresholds: {error}")
+        sys.exit(1)
+    print(f"  ✓ Masks for every threshold in {time.perf_counter() - started:.2f}s")
+    print()
+    print(f"  {'Threshold':>9}  {'Subject':>7}")
+    for threshold in thresholds:
+        print(f"  {threshold:>9}  {sweep.coverage(threshold):>7.1%}")
+    print()
+
+    if args.sweep_masks:
+        mask_dir = os.path.join(output_dir, f"{stem}_masks")
+        os.makedirs(mask_dir, exist_ok=True)
+        for threshold in thresholds:
+            sweep.mask(threshold).save(os.path.join(mask_dir, f"t{threshold}.png"))
+        print(f"✓ Masks saved to: {mask_dir}")
+
+    masks = (
+        (f"t={threshold}  {sweep.coverage(threshold):.0%}", sweep.mask(threshold))
+        for threshold in thresholds
+    )
+    try:
+        contact_sheet(foreground, masks, args.tile_size).save(output_path)
+    except (OSError, KeyError, ValueError) as error:
+        print(f"Error saving contact sheet to {output_path}: {error}")
+        sys.exit(1)
+    print(f"✓ Contact sheet saved to: {output_path}")
+
+
+def resolve_output_path(args, background_path, foreground_path):
+    """Output path in images/mixed, from --output or the input file names."""
+    output_dir = get_output_dir()
+    extension = create_output_options(args).extension
 
     if args.output:
         # If output is specified, use it but ensure it's in images/mixed
@@ -550,13 +3022,290 @@ def main():
         # If it's already a full path, extract just the filename
         if os.path.dirname(output_value):
             output_filename = os.path.basename(output_value)
-        output_path = os.path.join(output_dir, output_filename)
+        if not os.path.splitext(output_filename)[1]:
+            output_filename += extension
+        return os.path.join(output_dir, output_filename)
+
+    # Generate output filename
+    output_filename = default_output_filename(
+        background_path, foreground_path, extension
+    )
+    return os.path.join(output_dir, output_filename)
+
+
+def parse_layer(spec, opacity=0.8, blend_mode="normal", bg_threshold=30):
+    """
+    Parse a --layer value: ``PATH[,KEY=VALUE...]``.
+
+    Keys are x and y (top-left position, default: centered), scale, opacity,
+    mode and threshold; missing ones default to the command-line options.
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    path, *options = spec.split(",")
+    if not path:
+        raise ValueError(f"layer needs an image path: {spec!r}")
+
+    layer = Layer(
+        path, opacity=opacity, blend_mode=blend_mode, bg_threshold=bg_threshold
+    )
+    x = y = None
+    for option in options:
+        key, separator, value = option.partition("=")
+        key = key.strip().lower()
+        if not separator:
+            raise ValueError(f"layer option must be KEY=VALUE: {option!r}")
+        if key == "x":
+            x = int(value)
+        elif key == "y":
+            y = int(value)
+        elif key == "scale":
+            layer.scale = float(value)
+        elif key == "opacity":
+            layer.opacity = float(value)
+        elif key == "mode":
+            layer.blend_mode = value.strip()
+        elif key == "threshold":
+            layer.bg_threshold = int(value)
+        else:
+            raise ValueError(f"unknown layer option: {key!r}")
+
+    if (x is None) != (y is None):
+        raise ValueError(f"layer needs both x and y, or neither: {spec!r}")
+    if x is not None:
+        layer.position = (x, y)
+    return layer
+
+
+def run_layers_mode(args, opacity, bg_threshold):
+    """Mix --foreground (if given) and every --layer onto --background in one pass."""
+    layers = []
+    if args.foreground:
+        layers.append(
+            Layer(
+                args.foreground,
+                opacity=opacity,
+                blend_mode=args.blend_mode,
+                bg_threshold=bg_threshold,
+            )
+        )
+    layers.extend(args.layers)
+
+    background_path = resolve_image_path(args.background)
+    if background_path is None:
+        print(f"Error: Background image not found: {args.background}")
+        sys.exit(1)
+    for layer in layers:
+        path = resolve_image_path(layer.source)
+        if path is None:
+            print(f"Error: Layer image not found: {layer.source}")
+            sys.exit(1)
+        layer.source = path
+
+    output_path = resolve_output_path(args, background_path, layers[0].source)
+
+    print("=" * 60)
+    print("Photo Mixer - Layer Stack")
+    print("=" * 60)
+    print()
+    print(f"  Background: {background_path}")
+    for index, layer in enumerate(layers, start=1):
+        placement = "centered" if layer.position is None else f"at {layer.position}"
+        print(
+            f"  Layer {index}: {layer.source} ({layer.blend_mode}, "
+            f"opacity {layer.opacity}, scale {layer.scale}, {placement})"
+        )
+    print(f"  Output: {output_path}")
+    print()
+    print("-" * 60)
+
+    mask_cache = create_mask_cache(args)
+    try:
+        output = mix_layers(
+            background_path,
+            layers,
+            precision=args.precision,
+            mask_cache=mask_cache,
+            analysis_scale=args.analysis_scale,
+            removal_order=args.removal_order,
+            removal_backend=args.removal_backend,
+            crop_to_subject=args.crop_to_subject,
+            max_output_size=args.max_output_size,
+            draft=args.draft,
+            hooks=[ConsoleProgress(), *create_hooks(args)],
+            trace_memory=args.trace_memory,
+        )
+        print(f"Saving mixed image to: {output_path}")
+        write_outputs(output, output_path, create_output_options(args))
+    except (PhotoMixerError, OSError, ValueError) as error:
+        print(f"Error mixing photos: {error}")
+        sys.exit(1)
+
+    print("-" * 60)
+    if mask_cache is not None:
+        print(mask_cache.stats())
+    print(f"✓ Output saved to: {output_path}")
+
+
+def run_sequence_mode(args, opacity, bg_threshold):
+    """Mix --foreground onto every frame of --frames (a directory or stdin)."""
+    # Imported here so single-image runs do not pay for the sequence machinery
+    import sequence
+
+    foreground_path = resolve_image_path(args.foreground)
+    if foreground_path is None:
+        print(f"Error: Foreground image not found: {args.foreground}")
+        sys.exit(1)
+
+    streaming_output = args.output == "-"
+    # Progress goes to stderr when stdout carries the frames
+    console = sys.stderr if streaming_output else sys.stdout
+    if args.frames == "-":
+        frames = sequence.stream_frames(sys.stdin.buffer)
+        source_name = "stdin"
+    elif os.path.isdir(args.frames):
+        frames = sequence.directory_frames(args.frames)
+        source_name = args.frames
+        if not frames:
+            print(f"Error: No frames found in {args.frames}")
+            sys.exit(1)
+    else:
+        print(f"Error: Frames directory not found: {args.frames}")
+        sys.exit(1)
+
+    if streaming_output:
+        sink = sequence.StreamSink(sys.stdout.buffer)
+        destination = "stdout"
     else:
-        # Generate output filename
-        bg_name = os.path.splitext(os.path.basename(background_path))[0]
-        fg_name = os.path.splitext(os.path.basename(foreground_path))[0]
-        output_filename = f"mixed_{bg_name}_{fg_name}.jpg"
-        output_path = os.path.join(output_dir, output_filename)
+        name = os.path.basename(os.path.normpath(args.output)) if args.output else ""
+        if name in ("", ".", ".."):
+            frames_name = "stdin" if args.frames == "-" else args.frames
+            name = default_output_filename(
+                os.path.normpath(frames_name), foreground_path
+            )
+            name = os.path.splitext(name)[0]
+        destination = os.path.join(get_output_dir(), name)
+        sink = sequence.DirectorySink(destination)
+
+    with redirect_stdout(console):
+        print("=" * 60)
+        print("Photo Mixer - Sequence Mode")
+        print("=" * 60)
+        print()
+        print(f"  Frames: {source_name}")
+        print(f"  Foreground: {foreground_path}")
+        print(f"  Blend mode: {args.blend_mode}")
+        print(f"  Opacity: {opacity}")
+        print(f"  Threads: {args.workers or os.cpu_count()}")
+        print(f"  Output: {destination}")
+        print()
+        print("-" * 60)
+
+        try:
+            result = mix_sequence(
+                frames,
+                foreground_path,
+                sink,
+                blend_mode=args.blend_mode,
+                opacity=opacity,
+                bg_threshold=bg_threshold,
+                precision=args.precision,
+                mask_cache=create_mask_cache(args),
+                analysis_scale=args.analysis_scale,
+                removal_backend=args.removal_backend,
+                crop_to_subject=args.crop_to_subject,
+                drift=args.drift_step or (0, 0),
+                format=args.frame_format,
+                output_options=create_output_options(args),
+                threads=args.workers,
+                hooks=[ConsoleProgress(), *create_hooks(args)],
+                trace_memory=args.trace_memory,
+            )
+        except (PhotoMixerError, OSError, ValueError) as error:
+            print(f"Error mixing sequence: {error}")
+            sys.exit(1)
+
+        print("-" * 60)
+        print(result.summary())
+
+
+def run_server_mode(args, opacity, bg_threshold):
+    """
+    Run the HTTP compositing service with the command-line mixing options.
+
+    --blend-mode, --opacity and --bg-threshold become the defaults for
+    requests that leave those fields out, and --format, --quality and
+    --preset the default output format and encoder settings.
+    """
+    # Imported here so file runs do not pay for the server machinery
+    import server
+
+    server.serve(
+        args.host,
+        args.port,
+        workers=args.workers,
+        max_pending=args.max_pending,
+        max_upload_bytes=args.max_upload * 1024 * 1024,
+        mix_options={
+            "precision": args.precision,
+            "memory_limit": args.memory_limit,
+            "mask_cache": create_mask_cache(args),
+            "analysis_scale": args.analysis_scale,
+            "removal_order": args.removal_order,
+            "removal_backend": args.removal_backend,
+            "crop_to_subject": args.crop_to_subject,
+            "max_output_size": args.max_output_size,
+            "draft": args.draft,
+            "threads": args.threads,
+            "placement": args.placement,
+        },
+        defaults={
+            "blend_mode": args.blend_mode,
+            "opacity": opacity,
+            "bg_threshold": bg_threshold,
+        },
+        output_options=create_output_options(args),
+    )
+
+
+def main():
+    """Main function to run the photo mixer."""
+    args = parse_arguments()
+
+    # Validate opacity
+    opacity = max(0.0, min(1.0, args.opacity))
+    bg_threshold = max(0, min(100, args.bg_threshold))  # Clamp between 0 and 100
+
+    if args.serve:
+        run_server_mode(args, opacity, bg_threshold)
+        return
+
+    if args.prepare:
+        run_prepare_mode(args, bg_threshold)
+        return
+
+    if args.sweep:
+        run_sweep_mode(args)
+        return
+
+    if args.frames:
+        run_sequence_mode(args, opacity, bg_threshold)
+        return
+
+    if args.batch:
+        run_batch_mode(args, opacity, bg_threshold)
+        return
+
+    if args.layers:
+        run_layers_mode(args, opacity, bg_threshold)
+        return
+
+    # Validate and resolve paths
+    background_path, foreground_path = validate_paths(args.background, args.foreground)
+
+    # Determine output path - always save to images/mixed folder
+    output_path = resolve_output_path(args, background_path, foreground_path)
 
     # Display information
     print("=" * 60)
@@ -573,7 +3322,7 @@ def main():
     print("-" * 60)
 
     # Mix the photos
-    bg_threshold = max(0, min(100, args.bg_threshold))  # Clamp between 0 and 100
+    mask_cache = create_mask_cache(args)
     mix_photos(
         background_path,
         foreground_path,
@@ -581,9 +3330,26 @@ def main():
         args.blend_mode,
         opacity,
         bg_threshold,
+        precision=args.precision,
+        memory_limit=args.memory_limit,
+        mask_cache=mask_cache,
+        analysis_scale=args.analysis_scale,
+        removal_order=args.removal_order,
+        removal_backend=args.removal_backend,
+        crop_to_subject=args.crop_to_subject,
+        max_output_size=args.max_output_size,
+        draft=args.draft,
+        output_bits=args.output_bits,
+        threads=args.threads,
+        placement=args.placement,
+        hooks=create_hooks(args),
+        trace_memory=args.trace_memory,
+        output_options=create_output_options(args),
     )
 
     print("-" * 60)
+    if mask_cache is not None:
+        print(mask_cache.stats())
     print(f"✓ Output saved to: {output_path}")
 
 
@@ -0,0 +1,293 @@
+"""
+Placement - Choose where on the background the foreground goes
+
+By default the fitted foreground is centered. Automatic placement looks for
+the spot where the subject hides the least of the background's detail
+instead. The background is shrunk to a small edge-energy map, the gradient
+magnitude of its luminance. Every candidate position and scale of the
+subject's bounding box is then scored by the share of that energy it
+covers.
+
+The energy under a box comes from the map's integral image (summed-area
+table) in four lookups. Hundreds of candidates are scored in one vectorized
+pass in well under a millisecond. Building the map is the only step that
+grows with the background, and maps are cached per background (see
+SaliencyCache).
+
+Shrinking the subject always hides less, so smaller scales pay a penalty. A
+slight pull towards the center breaks ties, so on a background without
+detail the subject stays centered at full size.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+PLACEMENTS = ("center", "auto")
+
+# Longest side of the edge-energy map in pixels
+MAP_SIZE = 256
+
+# Candidate scales relative to the default fit (80% of the background)
+DEFAULT_SCALES = (1.0, 0.85, 0.7, 0.55)
+
+# Candidate positions per axis; odd, so the centered position is one of them
+POSITION_STEPS = 15
+
+# Cost of shrinking the subject to nothing, relative to hiding all detail;
+# a scale s costs SHRINK_PENALTY * (1 - s**2)
+SHRINK_PENALTY = 0.25
+
+# Cost of the positions farthest from the center, relative to hiding all detail
+CENTER_PULL = 0.02
+
+# Saliency maps the default cache keeps in memory (about 0.5 MB each)
+CACHE_ENTRIES = 32
+
+
+@dataclass
+class SaliencyMap:
+    """
+    Downsampled edge energy of a background, as an integral image.
+
+    Args:
+        size: (width, height) of the background the map describes
+        integral: float64 summed-area table of shape (H + 1, W + 1) of the
+            map; ``integral[y, x]`` is the energy above row y and left of
+            column x
+    """
+
+    size: tuple
+    integral: "np.ndarray"
+
+    @classmethod
+    def from_image(cls, image, map_size=MAP_SIZE):
+        """
+        Build the map of a background.
+
+        Args:
+            image: PIL Image or color.DeepImage
+            map_size: Longest side of the map in pixels (at least)
+
+        Returns:
+            SaliencyMap
+        """
+        if not isinstance(image, Image.Image):
+            # A DeepImage; 8 bits per channel are plenty for edge energy
+            image = image.to_image()
+        size = image.size
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        factor = max(1, max(size) // map_size)
+        if factor > 1:
+            image = image.reduce(factor)
+        luminance = np.asarray(image.convert("L"), dtype=np.float32)
+
+        # Gradient magnitude (L1), each difference shared by both its pixels
+        energy = np.zeros(luminance.shape, dtype=np.float64)
+        dx = np.abs(np.diff(luminance, axis=1))
+        dy = np.abs(np.diff(luminance, axis=0))
+        energy[:, 1:] += dx
+        energy[:, :-1] += dx
+        energy[1:, :] += dy
+        energy[:-1, :] += dy
+
+        integral = np.zeros((energy.shape[0] + 1, energy.shape[1] + 1))
+        np.cumsum(energy, axis=0, out=integral[1:, 1:])
+        np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+        return cls(size, integral)
+
+    @property
+    def total(self):
+        """Energy of the whole map."""
+        return float(self.integral[-1, -1])
+
+    def box_energy(self, left, top, right, bottom):
+        """
+        Energy under boxes given in background pixels.
+
+        Args:
+            left, top, right, bottom: Arrays (or scalars) of box edges;
+                boxes are clipped to the background
+
+        Returns:
+            Array of the energy under each box
+        """
+        rows, columns = self.integral.shape
+        x_scale = (columns - 1) / self.size[0]
+        y_scale = (rows - 1) / self.size[1]
+
+        def to_map(values, scale, limit):
+            indices = np.rint(np.asarray(values, dtype=np.float64) * scale)
+            return np.clip(indices, 0, limit).astype(np.intp)
+
+        x0 = to_map(left, x_scale, columns - 1)
+        x1 = to_map(right, x_scale, columns - 1)
+        y0 = to_map(top, y_scale, rows - 1)
+        y1 = to_map(bottom, y_scale, rows - 1)
+        integral = self.integral
+        return integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+
+@dataclass
+class Placement:
+    """
+    Position and size chosen for a foreground frame.
+
+    Args:
+        position: (x, y) of the frame's top-left corner on the background
+        frame_size: (width, height) of the frame
+        scale: Scale of the frame relative to the one it was chosen for
+        covered: Share of the background's edge energy under the subject
+        candidates: Number of candidates scored
+    """
+
+    position: tuple
+    frame_size: tuple
+    scale: float
+    covered: float
+    candidates: int
+
+
+def choose_placement(
+    saliency,
+    frame_size,
+    subject_box=None,
+    scales=DEFAULT_SCALES,
+    steps=POSITION_STEPS,
+):
+    """
+    Score candidate positions and scales of a frame and return the best.
+
+    Args:
+        saliency: SaliencyMap of the background
+        frame_size: (width, height) of the fitted frame at scale 1
+        subject_box: (left, top, right, bottom) of the subject within that
+            frame (default: the whole frame); only this box counts as
+            covering the background
+        scales: Candidate scales of the frame; earlier ones win ties
+        steps: Candidate positions per axis, spread evenly from one edge of
+            the background to the other
+
+    Returns:
+        Placement with the lowest cost
+    """
+    bg_width, bg_height = saliency.size
+    left, top, right, bottom = subject_box or (0, 0, *frame_size)
+    total = saliency.total
+    half_diagonal = math.hypot(bg_width, bg_height) / 2
+
+    sizes, xs, ys, costs, covered = [], [], [], [], []
+    for scale in scales:
+        width = max(1, round(frame_size[0] * scale))
+        height = max(1, round(frame_size[1] * scale))
+        # Integer steps, so the middle one is exactly the centered position
+        x, y = np.meshgrid(
+            max(0, bg_width - width) * np.arange(steps) // max(1, steps - 1),
+            max(0, bg_height - height) * np.arange(steps) // max(1, steps - 1),
+        )
+        x, y = x.ravel(), y.ravel()
+        energy = saliency.box_energy(
+            x + left * scale, y + top * scale, x + right * scale, y + bottom * scale
+        )
+        share = energy / total if total > 0 else np.zeros(len(x))
+        distance = np.hypot(
+            x + width / 2 - bg_width / 2, y + height / 2 - bg_height / 2
+        )
+        costs.append(
+            share
+            + SHRINK_PENALTY * (1 - scale * scale)
+            + CENTER_PULL * distance / half_diagonal
+        )
+        sizes += [(width, height)] * len(x)
+        xs.append(x)
+        ys.append(y)
+        covered.append(share)
+
+    costs = np.concatenate(costs)
+    best = int(np.argmin(costs))
+    return Placement(
+        position=(int(np.concatenate(xs)[best]), int(np.concatenate(ys)[best])),
+        frame_size=sizes[best],
+        scale=scales[best // (steps * steps)],
+        covered=float(np.concatenate(covered)[best]),
+        candidates=len(costs),
+    )
+
+
+def source_key(source):
+    """
+    Cache key of a background source, or None for sources that cannot be
+    recognized cheaply (images, arrays and file objects).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        return ("path", os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return ("bytes", hashlib.blake2b(source, digest_size=20).hexdigest())
+    return None
+
+
+class SaliencyCache:
+    """
+    In-memory LRU cache of saliency maps with hit/miss counters.
+
+    Maps are keyed by the background source (see source_key) and the size it
+    was loaded at, so mixing many foregrounds onto one background builds its
+    map once per process. Safe to share between threads.
+
+    Args:
+        max_entries: Most maps to keep
+    """
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image, key=None):
+        """
+        Saliency map of a loaded background.
+
+        Args:
+            image: The background, loaded (PIL Image or color.DeepImage)
+            key: source_key of the background, or None to build the map
+                without caching it
+
+        Returns:
+            SaliencyMap
+        """
+        if key is None:
+            return SaliencyMap.from_image(image)
+        key = (*key, tuple(image.size))
+        with self._lock:
+            saliency = self._maps.get(key)
+            if saliency is not None:
+                self._maps.move_to_end(key)
+                self.hits += 1
+                return saliency
+            self.misses += 1
+
+        saliency = SaliencyMap.from_image(image)
+        with self._lock:
+            self._maps[key] = saliency
+            while len(self._maps) > self.max_entries:
+                self._maps.popitem(last=False)
+        return saliency
+
+
+# Cache used by the mixing functions
+SALIENCY_CACHE = SaliencyCache()
@@ -0,0 +1,361 @@
+"""
+Mix Pool - Composite decoded images on worker processes without copying them
+
+A process pool normally pickles every argument and result through a pipe: a
+24 MP RGB image is 72 MB serialized, sent and deserialized on the way in, and
+again on the way out. ``MixPool`` instead puts pixels in memory-mapped files
+on a RAM-backed file system (``/dev/shm`` where available) and sends only
+their names, so workers read their inputs and hand back their results as
+NumPy views of the same memory.
+
+Each worker keeps one ``compositing.Workspace`` for its whole life, so the
+blend temporaries are allocated once rather than per job. Every result
+reports how many bytes went through pipes and how many were copied, which
+shows whether the zero-copy path was taken (``transport='pickle'`` sends
+everything through the pipes, for comparison).
+
+Memory-mapped files are used rather than ``multiprocessing.shared_memory``
+because a mapped file can be unlinked while views of it are still in use: the
+memory is freed when the last view goes away, however long callers keep it.
+
+Every pool keeps its files in a directory of its own, which ``close`` removes.
+A result file whose job never reports back (a worker that died, a result that
+could not be unpickled) is therefore removed with the pool instead of
+lingering in ``/dev/shm``.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+import weakref
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+
+from compositing import Workspace
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+TRANSPORTS = ("shared", "pickle")
+
+# Jobs MixPool.map keeps queued per worker; one running and one ready to start
+IN_FLIGHT_PER_WORKER = 2
+
+# RAM-backed directory for the mapped files (the temp directory elsewhere)
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedArray:
+    """
+    A NumPy array in a memory-mapped file that other processes can open.
+
+    Pickling sends only the file name, shape and dtype. The creating process
+    owns the file and removes it when the SharedArray is closed or garbage
+    collected; views already handed out stay valid until they are dropped.
+
+    Args:
+        path: Backing file
+        shape: Array shape
+        dtype: Array dtype
+        owner: Remove the file when this object goes away
+    """
+
+    def __init__(self, path, shape, dtype, owner=False):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._array = None
+        self._finalizer = weakref.finalize(self, _remove, path) if owner else None
+
+    @classmethod
+    def create(cls, shape, dtype, directory=SHARED_DIR):
+        """Allocate a zero-filled shared array owned by this process."""
+        path = os.path.join(directory, f"photomixer-{uuid.uuid4().hex}")
+        shared = cls(path, shape, dtype, owner=True)
+        shared._array = np.memmap(path, dtype=shared.dtype, mode="w+", shape=shape)
+        return shared
+
+    @classmethod
+    def from_array(cls, array, directory=SHARED_DIR):
+        """Copy an array into a new shared array (the only copy it needs)."""
+        shared = cls.create(array.shape, array.dtype, directory)
+        np.copyto(shared.array, array)
+        return shared
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def array(self):
+        """Writable view of the shared memory, mapped on first use."""
+        if self._array is None:
+            self._array = np.memmap(
+                self.path, dtype=self.dtype, mode="r+", shape=self.shape
+            )
+        return self._array
+
+    def disown(self):
+        """Stop removing the file on close, handing ownership to another process."""
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+
+    def close(self):
+        """Drop this process's mapping, and the file if this process owns it."""
+        self._array = None
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __getstate__(self):
+        return {"path": self.path, "shape": self.shape, "dtype": self.dtype.str}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["shape"], state["dtype"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+@dataclass
+class TransferStats:
+    """
+    Bytes moved for one job.
+
+    Args:
+        pickled_bytes: Job and result bytes sent through the pool's pipes
+        copied_bytes: Image bytes copied into shared memory for this job
+            (inputs not shared beforehand, plus the result)
+        shared_bytes: Image bytes workers read or returned in place
+        seconds: Time the worker spent on the job
+    """
+
+    pickled_bytes: int = 0
+    copied_bytes: int = 0
+    shared_bytes: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class MixResult:
+    """
+    The outcome of one pooled mix.
+
+    Args:
+        array: (H, W, 3) result; a view of shared memory with the 'shared'
+            transport, freed when the last view of it is dropped
+        info: Image metadata such as 'icc_profile'
+        stats: TransferStats for the job
+    """
+
+    array: "np.ndarray"
+    info: dict
+    stats: TransferStats
+
+    def image(self):
+        """The result as a PIL image (8-bit results only; copies the pixels)."""
+        image = Image.fromarray(np.asarray(self.array))
+        image.info.update(self.info)
+        return image
+
+
+# Per-process state of pool workers
+_worker_workspace = None
+
+
+def _init_worker():
+    """Pool initializer: import the mixer, build its tables, allocate scratch."""
+    global _worker_workspace
+    import photo_mixer
+
+    photo_mixer._removal_tables()
+    _worker_workspace = Workspace()
+
+
+def _open(source):
+    return source.array if isinstance(source, SharedArray) else source
+
+
+def _run_job(payload, result_dir):
+    """
+    Worker entry point: mix one pickled job.
+
+    Args:
+        payload: Pickled (background, foreground, options)
+        result_dir: Directory to put the result's shared file in, or None to
+            send the result itself back
+
+    Returns:
+        Pickled (result, info, seconds, copied_bytes), where result is a
+        SharedArray the caller takes over, or the array itself
+    """
+    from color import DeepImage
+    from photo_mixer import mix_images
+
+    started = time.perf_counter()
+    background, foreground, options = pickle.loads(payload)
+    output = mix_images(
+        _open(background), _open(foreground), workspace=_worker_workspace, **options
+    )
+    array = output.array if isinstance(output, DeepImage) else np.asarray(output)
+    info = {key: value for key, value in output.info.items() if key == "icc_profile"}
+
+    copied = 0
+    if result_dir is not None:
+        shared = SharedArray.from_array(array, result_dir)
+        shared.disown()
+        array, copied = shared, shared.nbytes
+    seconds = time.perf_counter() - started
+    return pickle.dumps((array, info, seconds, copied), pickle.HIGHEST_PROTOCOL)
+
+
+class MixPool:
+    """
+    Mix decoded images on a pool of worker processes.
+
+    Backgrounds and foregrounds may be NumPy arrays, PIL images, or
+    SharedArrays from ``share``; anything else (paths, encoded bytes,
+    cutouts) is passed as is and decoded by the worker. Share an image that
+    several jobs use, such as one background for many foregrounds, so it is
+    copied into shared memory once. The pool's shared files live in
+    ``directory``, which close() removes.
+
+    Args:
+        workers: Worker processes (default: CPU count)
+        transport: 'shared' (default) or 'pickle' to send pixels through
+            the pool's pipes
+        **mix_options: Default mix_images options for every job (precision,
+            mask_cache, ...)
+    """
+
+    def __init__(self, workers=None, transport="shared", **mix_options):
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport: {transport!r}")
+        self.workers = workers or os.cpu_count() or 1
+        self.transport = transport
+        self.mix_options = mix_options
+        self.directory = tempfile.mkdtemp(prefix="photomixer-pool-", dir=SHARED_DIR)
+        self._remove_directory = weakref.finalize(
+            self, shutil.rmtree, self.directory, ignore_errors=True
+        )
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker
+        )
+
+    def share(self, image):
+        """
+        Copy a decoded image into shared memory for use by many jobs.
+
+        The file is removed when the pool is closed; views already mapped in
+        this process stay valid.
+        """
+        if isinstance(image, SharedArray):
+            return image
+        return SharedArray.from_array(np.asarray(image), self.directory)
+
+    def _stage(self, source, staged):
+        """Prepare one input for sending; returns (source, copied, shared)."""
+        if isinstance(source, SharedArray):
+            return source, 0, source.nbytes
+        if self.transport == "shared" and isinstance(source, (np.ndarray, Image.Image)):
+            shared = self.share(source)
+            staged.append(shared)
+            return shared, shared.nbytes, shared.nbytes
+        return source, 0, 0
+
+    def submit(self, background, foreground, **options):
+        """
+        Queue one mix.
+
+        Returns:
+            Future resolving to a MixResult, or to the mixing error
+        """
+        staged = []
+        background, copied_bg, shared_bg = self._stage(background, staged)
+        foreground, copied_fg, shared_fg = self._stage(foreground, staged)
+        payload = pickle.dumps(
+            (background, foreground, {**self.mix_options, **options}),
+            pickle.HIGHEST_PROTOCOL,
+        )
+        stats = TransferStats(
+            pickled_bytes=len(payload),
+            copied_bytes=copied_bg + copied_fg,
+            shared_bytes=shared_bg + shared_fg,
+        )
+        result_dir = self.directory if self.transport == "shared" else None
+        job = self.executor.submit(_run_job, payload, result_dir)
+
+        result = Future()
+
+        def job_done(job):
+            # Staged inputs are only needed until the worker is done with them
+            for shared in staged:
+                shared.close()
+            # Errors raised in a done-callback are only logged, so anything
+            # going wrong here must reach the caller's future instead
+            try:
+                data = job.result()
+                array, info, seconds, copied = pickle.loads(data)
+                stats.pickled_bytes += len(data)
+                stats.copied_bytes += copied
+                stats.seconds = seconds
+                if isinstance(array, SharedArray):
+                    # Map the worker's file and remove its name at once: the
+                    # memory stays until the last view of the result is dropped
+                    shared = SharedArray(
+                        array.path, array.shape, array.dtype, owner=True
+                    )
+                    array = shared.array
+                    stats.shared_bytes += shared.nbytes
+                    shared.close()
+            except BaseException as error:  # noqa: BLE001 - handed to the caller
+                result.set_exception(error)
+                return
+            result.set_result(MixResult(array, info, stats))
+
+        job.add_done_callback(job_done)
+        return result
+
+    def map(self, pairs, **options):
+        """
+        Mix (background, foreground) pairs, yielding MixResults in order.
+
+        Pairs are taken from the iterable as results are yielded, with at
+        most IN_FLIGHT_PER_WORKER jobs per worker queued at a time, so a long
+        stream of decoded images is never staged in shared memory all at once.
+        """
+        pending = deque()
+        for background, foreground in pairs:
+            if len(pending) >= IN_FLIGHT_PER_WORKER * self.workers:
+                yield pending.popleft().result()
+            pending.append(self.submit(background, foreground, **options))
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        """Wait for queued jobs, stop the workers and remove the pool's files."""
+        self.executor.shutdown(wait=True)
+        self._remove_directory()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
@@ -0,0 +1,293 @@
+"""
+Sequence Mode - Composite one foreground onto every frame of an image sequence
+
+Frames come from a directory of numbered images or from a stream of encoded
+images (PNG, JPEG or binary PPM/PGM back to back, as written by
+``ffmpeg -f image2pipe``). They flow through a generator pipeline whose
+decode, blend and encode stages run on a shared thread pool, so different
+frames are decoded, blended and encoded at the same time while results still
+come out in frame order. Pillow and NumPy release the GIL for the heavy work.
+"""
+
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+
+from batch import IMAGE_EXTENSIONS, list_images
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Read size when scanning a frame stream
+STREAM_CHUNK_BYTES = 1 << 20
+
+
+@dataclass
+class SequenceResult:
+    """Outcome of a sequence run."""
+
+    frames: int = 0
+    elapsed: float = 0.0
+    prepare_seconds: float = 0.0
+
+    @property
+    def fps(self):
+        """Sustained frames per second, excluding foreground preparation."""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.frames / self.elapsed
+
+    def summary(self):
+        """Human-readable summary of the run."""
+        return "\n".join(
+            [
+                f"Processed {self.frames} frame(s) in {self.elapsed:.2f}s",
+                f"  Foreground prepared in {self.prepare_seconds:.2f}s",
+                f"  Throughput: {self.fps:.2f} frames/sec",
+            ]
+        )
+
+
+def _natural_key(name):
+    """Sort key that orders frame_2 before frame_10."""
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", name)
+    ]
+
+
+def directory_frames(directory, extensions=IMAGE_EXTENSIONS):
+    """
+    List the frames in a directory in frame order.
+
+    Returns:
+        List of (name, path), sorted by the numbers in the file names
+    """
+    paths = sorted(
+        list_images(directory, extensions),
+        key=lambda path: _natural_key(os.path.basename(path)),
+    )
+    return [(os.path.basename(path), path) for path in paths]
+
+
+class _StreamReader:
+    """Buffered reads from a binary stream, with JPEG marker scanning."""
+
+    def __init__(self, stream, chunk_size=STREAM_CHUNK_BYTES):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def _fill(self, size):
+        """Make at least ``size`` unread bytes available; False at end of stream."""
+        while len(self.buffer) - self.offset < size:
+            chunk = self.stream.read(max(self.chunk_size, size))
+            if not chunk:
+                return False
+            if self.offset:
+                del self.buffer[: self.offset]
+                self.offset = 0
+            self.buffer += chunk
+        return True
+
+    def at_end(self):
+        return not self._fill(1)
+
+    def peek(self, size):
+        self._fill(size)
+        return bytes(self.buffer[self.offset : self.offset + size])
+
+    def read(self, size):
+        if not self._fill(size):
+            raise ValueError("Frame stream ended in the middle of a frame")
+        data = bytes(self.buffer[self.offset : self.offset + size])
+        self.offset += size
+        return data
+
+    def read_token(self):
+        """Read one whitespace-separated PNM header token, skipping comments."""
+        token = b""
+        while True:
+            byte = self.read(1)
+            if byte == b"#" and not token:
+                while self.read(1) not in (b"\n", b"\r"):
+                    pass
+            elif byte.isspace():
+                if token:
+                    return token
+            else:
+                token += byte
+
+    def read_entropy_coded(self):
+        """Read JPEG scan data up to (not including) the next marker."""
+        position = 0  # Relative to self.offset, which _fill may move
+        while True:
+            found = self.buffer.find(b"\xff", self.offset + position)
+            if found < 0 or found + 1 >= len(self.buffer):
+                end = len(self.buffer) if found < 0 else found
+                position = end - self.offset
+                if not self._fill(position + 2):
+                    raise ValueError("Frame stream ended in the middle of a frame")
+                continue
+            following = self.buffer[found + 1]
+            if following == 0x00 or 0xD0 <= following <= 0xD7:
+                # Stuffed 0xFF byte or restart marker inside the scan
+                position = found + 2 - self.offset
+            elif following == 0xFF:
+                # Fill byte before a marker
+                position = found + 1 - self.offset
+            else:
+                data = bytes(self.buffer[self.offset : found])
+                self.offset = found
+                return data
+
+
+def _read_png(reader):
+    parts = [reader.read(len(PNG_SIGNATURE))]
+    while True:
+        header = reader.read(8)
+        length = int.from_bytes(header[:4], "big")
+        parts += [header, reader.read(length + 4)]
+        if header[4:] == b"IEND":
+            return b"".join(parts)
+
+
+def _read_pnm(reader):
+    magic = reader.read_token()
+    width, height, maxval = (int(reader.read_token()) for _ in range(3))
+    channels = 3 if magic == b"P6" else 1
+    sample_bytes = 2 if maxval > 255 else 1
+    header = b"%s\n%d %d\n%d\n" % (magic, width, height, maxval)
+    return header + reader.read(width * height * channels * sample_bytes)
+
+
+def _read_jpeg(reader):
+    parts = [reader.read(2)]
+    while True:
+        marker = reader.read(2)
+        if marker[0] != 0xFF:
+            raise ValueError("Corrupt JPEG in frame stream")
+        parts.append(marker)
+        code = marker[1]
+        if code == 0xD9:
+            return b"".join(parts)
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            continue
+        length = reader.read(2)
+        parts += [length, reader.read(int.from_bytes(length, "big") - 2)]
+        if code == 0xDA:
+            parts.append(reader.read_entropy_coded())
+
+
+def read_frame_stream(stream):
+    """
+    Split a stream of back-to-back encoded images into frames.
+
+    Args:
+        stream: Binary file object (such as ``sys.stdin.buffer``)
+
+    Yields:
+        Encoded bytes of each frame
+
+    Raises:
+        ValueError: If the stream holds an unsupported format or is truncated
+    """
+    reader = _StreamReader(stream)
+    while not reader.at_end():
+        head = reader.peek(len(PNG_SIGNATURE))
+        if head.startswith(PNG_SIGNATURE):
+            yield _read_png(reader)
+        elif head.startswith(b"\xff\xd8"):
+            yield _read_jpeg(reader)
+        elif head[:2] in (b"P5", b"P6"):
+            yield _read_pnm(reader)
+        elif head[:1].isspace():
+            # Stray newline between frames
+            reader.read(1)
+        else:
+            raise ValueError(
+                "Unsupported frame stream format; expected PNG, JPEG or binary PPM/PGM"
+            )
+
+
+def stream_frames(stream):
+    """Frames of an encoded image stream as (name, bytes), numbered from 1."""
+    for index, data in enumerate(read_frame_stream(stream), start=1):
+        yield f"frame_{index:06d}", data
+
+
+class DirectorySink:
+    """Write each encoded frame to a file named after it in a directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, name, data):
+        with open(os.path.join(self.directory, name), "wb") as output:
+            output.write(data)
+
+
+class StreamSink:
+    """Write encoded frames back to back to a binary stream (such as stdout)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, name, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+
+def _ordered_map(executor, function, items, depth):
+    """Lazily map ``function`` over ``items`` with at most ``depth`` in flight."""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def run_pipeline(items, stages, sink, threads=None, depth=None):
+    """
+    Stream items through a chain of stages on a thread pool.
+
+    Every stage keeps up to ``depth`` items in flight, so all stages work on
+    different items at once, while results reach ``sink`` in input order. At
+    most ``len(stages) * depth`` items are held in memory.
+
+    Args:
+        items: Iterable of inputs for the first stage
+        stages: Functions applied in order, each taking the previous result
+        sink: Called with each final result, in order, on the calling thread
+        threads: Worker threads shared by all stages (default: CPU count)
+        depth: Items in flight per stage (default: threads)
+
+    Returns:
+        Number of items processed
+    """
+    # Imported here so importing this module (the CLI does) stays cheap
+    from concurrent.futures import ThreadPoolExecutor
+
+    threads = threads or os.cpu_count() or 1
+    depth = depth or threads
+    count = 0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = iter(items)
+        for stage in stages:
+            results = _ordered_map(executor, stage, results, depth)
+        try:
+            for result in results:
+                sink(result)
+                count += 1
+        finally:
+            if stages:
+                results.close()
+    return count
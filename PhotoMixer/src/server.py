@@ -0,0 +1,390 @@
+"""
+Server Mode - Local asyncio HTTP service that keeps the mixer warm between requests
+
+Endpoints:
+  POST /mix     multipart/form-data with 'background' and 'foreground' files and
+                optional 'blend_mode', 'opacity', 'bg_threshold', 'format' and
+                'quality' fields (missing ones take the server's defaults);
+                responds with the encoded image
+  GET  /health  liveness check
+  GET  /stats   request counts and p50/p99 latency as JSON
+
+Compositing runs in a process pool whose workers import the mixer and build
+its lookup tables once. At most ``max_pending`` mixes are queued or running;
+further requests get 503 with a Retry-After header instead of piling up.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from email.parser import BytesHeaderParser
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from encoding import OutputOptions
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_UPLOAD_MB = 64
+
+OUTPUT_FORMATS = {"jpeg": "JPEG", "jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+# Mixing fields a /mix request may leave out, unless the server overrides them
+DEFAULT_FIELDS = {"blend_mode": "normal", "opacity": 0.8, "bg_threshold": 30}
+
+# Latency samples kept for the /stats percentiles
+LATENCY_WINDOW = 10000
+
+
+class HTTPError(Exception):
+    """An error that maps directly onto an HTTP response."""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+
+
+@dataclass
+class Request:
+    """A parsed HTTP request."""
+
+    method: str
+    path: str
+    headers: dict
+    body: bytes
+    version: str = "HTTP/1.1"
+
+    @property
+    def keep_alive(self):
+        """
+        Whether the connection stays open: by default from HTTP/1.1 on, and
+        for older clients only if they ask for it with Connection: keep-alive.
+        """
+        tokens = {
+            token.strip().lower()
+            for token in self.headers.get("connection", "").split(",")
+        }
+        if self.version == "HTTP/1.1":
+            return "close" not in tokens
+        return "keep-alive" in tokens
+
+
+def _warm_up():
+    """Process pool initializer: import the mixer and build its tables once."""
+    import photo_mixer
+
+    photo_mixer._removal_tables()
+
+
+def _render(background, foreground, format, quality, options):
+    """Worker entry point: mix two encoded images and return the encoded result."""
+    from photo_mixer import mix_to_bytes
+
+    return mix_to_bytes(
+        background, foreground, format=format, quality=quality, **options
+    )
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list (None if empty)."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def parse_multipart(body, content_type):
+    """
+    Split a multipart/form-data body into fields.
+
+    Returns:
+        Dict of field name to bytes (file contents or raw field values)
+    """
+    header = BytesHeaderParser().parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1")
+    )
+    boundary = header.get_param("boundary")
+    if header.get_content_type() != "multipart/form-data" or not boundary:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected multipart/form-data")
+
+    delimiter = b"--" + boundary.encode("latin-1")
+    fields = {}
+    for part in body.split(delimiter)[1:]:
+        if part.startswith(b"--"):
+            break
+        head, separator, content = part.partition(b"\r\n\r\n")
+        if not separator:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed multipart body")
+        headers = BytesHeaderParser().parsebytes(head.lstrip(b"\r\n") + b"\r\n\r\n")
+        name = headers.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = content.removesuffix(b"\r\n")
+    return fields
+
+
+def mix_arguments(fields, defaults=None, output_options=None):
+    """
+    Validate the form fields of a /mix request.
+
+    Args:
+        fields: Form fields from parse_multipart
+        defaults: Values of the DEFAULT_FIELDS the request leaves out
+        output_options: OutputOptions giving the default format and quality,
+            and the other encoder settings
+
+    Returns:
+        (background, foreground, format, quality, options) for _render
+    """
+    defaults = {**DEFAULT_FIELDS, **(defaults or {})}
+    output_options = output_options or OutputOptions()
+    for name in ("background", "foreground"):
+        if not fields.get(name):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing '{name}' upload")
+
+    def text(name, default):
+        return fields[name].decode("utf-8").strip() if name in fields else default
+
+    try:
+        options = {
+            "blend_mode": text("blend_mode", defaults["blend_mode"]),
+            "opacity": float(text("opacity", defaults["opacity"])),
+            "bg_threshold": int(text("bg_threshold", defaults["bg_threshold"])),
+        }
+        if "max_output_size" in fields:
+            options["max_output_size"] = int(text("max_output_size", None))
+        if "placement" in fields:
+            options["placement"] = text("placement", None)
+        quality = int(text("quality", output_options.quality))
+    except (UnicodeDecodeError, ValueError) as error:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid field: {error}") from error
+
+    format = OUTPUT_FORMATS.get(text("format", output_options.format or "JPEG").lower())
+    if format is None:
+        raise HTTPError(
+            HTTPStatus.BAD_REQUEST,
+            f"Unsupported format; choose from {', '.join(OUTPUT_FORMATS)}",
+        )
+    save_options = output_options.save_options(format)
+    save_options.pop("quality", None)
+    options["save_options"] = save_options
+    return fields["background"], fields["foreground"], format, quality, options
+
+
+class MixServer:
+    """
+    HTTP front end that hands mixes to a bounded process pool.
+
+    Args:
+        workers: Worker processes (default: CPU count)
+        max_pending: Mixes allowed to be queued or running before requests
+            are rejected with 503 (default: 2 * workers)
+        max_upload_bytes: Largest accepted request body
+        mix_options: Extra mix_to_bytes options applied to every request
+            (precision, mask_cache, ...)
+        defaults: Values for mixing fields a request leaves out (blend_mode,
+            opacity, bg_threshold; see DEFAULT_FIELDS)
+        output_options: OutputOptions for the default format and quality and
+            the encoder settings (default: the 'default' preset)
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        max_pending=None,
+        max_upload_bytes=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024,
+        mix_options=None,
+        defaults=None,
+        output_options=None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.max_upload_bytes = max_upload_bytes
+        self.mix_options = dict(mix_options or {})
+        self.defaults = {**DEFAULT_FIELDS, **(defaults or {})}
+        self.output_options = output_options or OutputOptions()
+        self.executor = None
+        self.pending = 0
+        self.counts = {"ok": 0, "client_error": 0, "server_error": 0, "rejected": 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Start the worker pool and listen; returns the asyncio server."""
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_warm_up
+        )
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stats(self):
+        """Request counters and latency percentiles in seconds."""
+        latencies = sorted(self.latencies)
+        return {
+            **self.counts,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "workers": self.workers,
+            "latency_samples": len(latencies),
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p99": percentile(latencies, 0.99),
+        }
+
+    async def read_request(self, reader):
+        """Read one request; returns None when the client closed the connection."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line") from error
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Bad Content-Length") from error
+        if length > self.max_upload_bytes:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        body = await reader.readexactly(length) if length else b""
+        return Request(
+            method.upper(), urlsplit(target).path, headers, body, version.upper()
+        )
+
+    async def dispatch(self, request):
+        """Route a request; returns (status, body, content_type, extra_headers)."""
+        if request.path == "/health" and request.method == "GET":
+            return HTTPStatus.OK, b'{"status": "ok"}', "application/json", {}
+        if request.path == "/stats" and request.method == "GET":
+            body = json.dumps(self.stats()).encode()
+            return HTTPStatus.OK, body, "application/json", {}
+        if request.path == "/mix":
+            if request.method != "POST":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            return await self.mix(request)
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    async def mix(self, request):
+        fields = parse_multipart(request.body, request.headers.get("content-type", ""))
+        background, foreground, format, quality, options = mix_arguments(
+            fields, self.defaults, self.output_options
+        )
+
+        if self.pending >= self.max_pending:
+            self.counts["rejected"] += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy, retry later")
+
+        # Imported lazily to avoid a circular import with the CLI module
+        from photo_mixer import PhotoMixerError
+
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                _render,
+                background,
+                foreground,
+                format,
+                quality,
+                {**self.mix_options, **options},
+            )
+        except PhotoMixerError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(error)) from error
+        finally:
+            self.pending -= 1
+
+        self.latencies.append(time.perf_counter() - started)
+        return HTTPStatus.OK, data, CONTENT_TYPES[format], {}
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes (keep-alive aware)."""
+        try:
+            while True:
+                keep_alive = False
+                extra_headers = {}
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request.keep_alive
+                    status, body, content_type, extra_headers = await self.dispatch(
+                        request
+                    )
+                except HTTPError as error:
+                    status = error.status
+                    body = json.dumps({"error": error.message}).encode()
+                    content_type = "application/json"
+                    if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                        extra_headers = {"Retry-After": "1"}
+                    elif status >= 500:
+                        self.counts["server_error"] += 1
+                    else:
+                        self.counts["client_error"] += 1
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as error:
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    body = json.dumps({"error": str(error)}).encode()
+                    content_type = "application/json"
+                    self.counts["server_error"] += 1
+                else:
+                    if request.path == "/mix":
+                        self.counts["ok"] += 1
+
+                headers = {
+                    "Content-Type": content_type,
+                    "Content-Length": str(len(body)),
+                    "Connection": "keep-alive" if keep_alive else "close",
+                    **extra_headers,
+                }
+                head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                head += "".join(
+                    f"{name}: {value}\r\n" for name, value in headers.items()
+                )
+                writer.write(head.encode("latin-1") + b"\r\n" + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(host, port, server):
+    listener = await server.start(host, port)
+    print(f"✓ Listening on http://{host}:{port} ({server.workers} worker(s))")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, **server_options):
+    """Run a MixServer until interrupted (see MixServer for the options)."""
+    server = MixServer(**server_options)
+    try:
+        asyncio.run(_serve(host, port, server))
+    except KeyboardInterrupt:
+        print("\nServer stopped")
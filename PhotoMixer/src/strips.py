@@ -0,0 +1,122 @@
+"""
+Strips - Read an image file one band of rows at a time
+
+Tiled mode (--memory-limit) streams the background through the mixer: rows
+are read from the file, blended and written out strip by strip, so neither
+the background nor the result is ever held in memory as a whole.
+
+Pillow can only decode a file as a whole, except for the uncompressed
+formats whose pixels it reads straight from the file ("raw" tiles): binary
+PPM/PGM, BMP and uncompressed TIFF. For those, the rows of a strip are read
+from the file's offsets without decoding anything else. PNG, JPEG and
+compressed TIFF files have no such entry points, so callers fall back to
+decoding them whole (see StripReader.open).
+"""
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+# Bytes per pixel of the 8-bit raw layouts that can be read by rows
+_RAW_BYTES = {"L": 1, "RGB": 3, "BGR": 3, "RGBX": 4, "BGRX": 4, "RGBA": 4, "BGRA": 4}
+
+# Image modes a strip can be returned in (as RGB)
+_MODES = ("L", "RGB", "RGBA", "RGBX")
+
+
+class StripReader:
+    """
+    Rows of an uncompressed image file, read on demand.
+
+    Use StripReader.open, which returns None for files that cannot be read
+    by rows.
+
+    Args:
+        path: Image file path
+        mode: Pillow mode of the image
+        size: (width, height)
+        tiles: (extents, offset, rawmode, row_bytes, orientation) of every
+            raw tile of the file
+        info: The image's metadata (``Image.info``)
+    """
+
+    def __init__(self, path, mode, size, tiles, info=None):
+        self.path = path
+        self.mode = mode
+        self.size = size
+        self.tiles = tiles
+        self.info = dict(info or {})
+        self._file = open(path, "rb")  # noqa: SIM115 - closed by close()
+
+    @classmethod
+    def open(cls, path):
+        """
+        Reader for an image file, or None if Pillow cannot read its rows
+        separately (compressed formats, 16-bit and palette images, ...).
+
+        Raises:
+            OSError: If the file cannot be opened
+        """
+        with Image.open(path) as image:
+            if image.mode not in _MODES or not image.tile:
+                return None
+            tiles = []
+            for tile in image.tile:
+                codec, extents, offset, args = tile
+                if isinstance(args, str):
+                    args = (args, 0, 1)
+                rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+                if codec != "raw" or rawmode not in _RAW_BYTES:
+                    return None
+                if orientation not in (1, -1):
+                    return None
+                width = extents[2] - extents[0]
+                row_bytes = stride or width * _RAW_BYTES[rawmode]
+                tiles.append((extents, offset, rawmode, row_bytes, orientation))
+            return cls(path, image.mode, image.size, tiles, image.info)
+
+    def read(self, top, bottom):
+        """
+        Rows top to bottom of the image.
+
+        Returns:
+            RGB PIL Image of size (width, bottom - top)
+
+        Raises:
+            OSError: If the file is shorter than its header says
+        """
+        strip = Image.new(self.mode, (self.size[0], bottom - top))
+        for extents, offset, rawmode, row_bytes, orientation in self.tiles:
+            left, tile_top, right, tile_bottom = extents
+            first, last = max(top, tile_top), min(bottom, tile_bottom)
+            if first >= last:
+                continue
+            # Bottom-up files (BMP) store the tile's last row first
+            if orientation == 1:
+                skip = first - tile_top
+            else:
+                skip = tile_bottom - last
+            self._file.seek(offset + skip * row_bytes)
+            data = self._file.read((last - first) * row_bytes)
+            if len(data) < (last - first) * row_bytes:
+                raise OSError(f"Truncated image file: {self.path}")
+            piece = Image.frombytes(
+                self.mode,
+                (right - left, last - first),
+                data,
+                "raw",
+                rawmode,
+                row_bytes,
+                orientation,
+            )
+            strip.paste(piece, (left, first - top))
+        return strip if strip.mode == "RGB" else strip.convert("RGB")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
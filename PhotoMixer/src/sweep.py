@@ -0,0 +1,112 @@
+"""
+Threshold Sweep - Compare background-removal thresholds side by side
+
+A contact sheet shows the foreground cut out at every swept threshold, on a
+checkerboard so removed areas stand out, with each tile labelled with its
+threshold and how much of the image it keeps. The masks themselves come from
+``photo_mixer.ThresholdSweep``, which evaluates all thresholds from a single
+pass over the image.
+"""
+
+import math
+
+from lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+
+# Checkerboard square size and shades for transparent areas
+CHECKER_SIZE = 8
+CHECKER_SHADES = (204, 153)
+
+LABEL_HEIGHT = 18
+SHEET_GAP = 6
+SHEET_COLOR = (48, 48, 48)
+LABEL_COLOR = (235, 235, 235)
+
+
+def parse_thresholds(spec):
+    """
+    Parse a threshold list such as ``10,20,30`` or ``10:60:5``.
+
+    Items are separated by commas; ``START:STOP:STEP`` expands to every
+    value from START to STOP inclusive.
+
+    Returns:
+        Sorted list of unique thresholds
+
+    Raises:
+        ValueError: If an item is not a number or range
+    """
+    thresholds = set()
+    for item in spec.split(","):
+        item = item.strip()
+        if ":" in item:
+            start, stop, step = (float(part) for part in item.split(":"))
+            if step <= 0:
+                raise ValueError(f"Range step must be positive: {item!r}")
+            count = math.floor((stop - start) / step + 1e-9) + 1
+            values = [start + index * step for index in range(max(0, count))]
+        else:
+            values = [float(item)]
+        thresholds.update(
+            int(value) if value.is_integer() else value for value in values
+        )
+    return sorted(thresholds)
+
+
+def checkerboard(size):
+    """An RGB checkerboard for showing transparency."""
+    width, height = size
+    tile = Image.new("L", (2 * CHECKER_SIZE, 2 * CHECKER_SIZE), CHECKER_SHADES[0])
+    tile.paste(CHECKER_SHADES[1], (0, 0, CHECKER_SIZE, CHECKER_SIZE))
+    tile.paste(
+        CHECKER_SHADES[1],
+        (CHECKER_SIZE, CHECKER_SIZE, 2 * CHECKER_SIZE, 2 * CHECKER_SIZE),
+    )
+    board = Image.new("L", size)
+    for top in range(0, height, tile.height):
+        for left in range(0, width, tile.width):
+            board.paste(tile, (left, top))
+    return board.convert("RGB")
+
+
+def contact_sheet(image, masks, tile_size=256, columns=None):
+    """
+    Lay out the foreground cut out by each mask in a labelled grid.
+
+    Args:
+        image: Foreground PIL image
+        masks: Iterable of (label, 'L' mask at the image's size); consumed
+            one at a time, so full-size masks need not all be in memory
+        tile_size: Longest side of each tile in pixels
+        columns: Tiles per row (default: a roughly square grid)
+
+    Returns:
+        RGB PIL Image
+    """
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((tile_size, tile_size), Image.Resampling.LANCZOS)
+    board = checkerboard(thumbnail.size)
+
+    tiles = []
+    for label, mask in masks:
+        alpha = mask.resize(thumbnail.size, Image.Resampling.BOX)
+        tiles.append((label, Image.composite(thumbnail, board, alpha)))
+
+    columns = columns or max(1, math.ceil(math.sqrt(len(tiles))))
+    rows = max(1, math.ceil(len(tiles) / columns))
+    cell_width = thumbnail.width + SHEET_GAP
+    cell_height = thumbnail.height + LABEL_HEIGHT + SHEET_GAP
+    sheet = Image.new(
+        "RGB",
+        (columns * cell_width + SHEET_GAP, rows * cell_height + SHEET_GAP),
+        SHEET_COLOR,
+    )
+    draw = ImageDraw.Draw(sheet)
+    for index, (label, tile) in enumerate(tiles):
+        left = SHEET_GAP + (index % columns) * cell_width
+        top = SHEET_GAP + (index // columns) * cell_height
+        sheet.paste(tile, (left, top))
+        draw.text((left + 2, top + thumbnail.height + 3), label, fill=LABEL_COLOR)
+    return sheet
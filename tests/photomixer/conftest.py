@@ -0,0 +1,17 @@
+"""
+Make PhotoMixer's flat modules (``src/``) and its benchmark helpers
+(``benchmarks/synthetic.py``, ``benchmarks/reference.py``) importable.
+"""
+
+import os
+import sys
+
+PHOTO_MIXER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "PhotoMixer",
+)
+
+for name in ("benchmarks", "src"):
+    path = os.path.join(PHOTO_MIXER_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
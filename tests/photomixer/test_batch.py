@@ -0,0 +1,74 @@
+"""
+Batch outputs: manifest subdirectories are kept, and no two jobs write one file
+"""
+
+import os
+
+import pytest
+from batch import BatchJob, cross_product_jobs, load_manifest, output_name, run_batch
+from synthetic import make_background, make_foreground
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    make_background(64, 48, seed=1).save(tmp_path / "bg.jpg")
+    make_background(64, 48, seed=2).save(tmp_path / "bg.png")
+    make_foreground(40, 30, seed=0).save(tmp_path / "fg.png")
+    return tmp_path
+
+
+def run(jobs, output_dir):
+    return run_batch(jobs, str(output_dir), workers=1)
+
+
+def test_manifest_subdirectories_are_kept(inputs):
+    manifest = inputs / "pairs.csv"
+    manifest.write_text("bg.jpg,fg.png,a/out.jpg\nbg.png,fg.png,b/out.jpg\n")
+    output_dir = inputs / "mixed"
+    result = run(load_manifest(str(manifest)), output_dir)
+
+    assert not result.failed
+    assert sorted(path for _, path in result.succeeded) == [
+        str(output_dir / "a" / "out.jpg"),
+        str(output_dir / "b" / "out.jpg"),
+    ]
+    assert all(os.path.isfile(path) for _, path in result.succeeded)
+
+
+def test_duplicate_outputs_fail(inputs):
+    jobs = [
+        BatchJob(str(inputs / "bg.jpg"), str(inputs / "fg.png"), "same.jpg"),
+        BatchJob(str(inputs / "bg.png"), str(inputs / "fg.png"), "./same.jpg"),
+    ]
+    result = run(jobs, inputs / "mixed")
+    assert [job for job, _ in result.succeeded] == jobs[:1]
+    assert [job for job, _ in result.failed] == jobs[1:]
+    assert "already written by another job" in result.failed[0][1]
+
+
+def test_clashing_default_names_fail(inputs):
+    # bg.jpg and bg.png both default to mixed_bg_fg.jpg
+    backgrounds = inputs / "backgrounds"
+    backgrounds.mkdir()
+    for name in ("bg.jpg", "bg.png"):
+        os.replace(inputs / name, backgrounds / name)
+    foregrounds = inputs / "foregrounds"
+    foregrounds.mkdir()
+    os.replace(inputs / "fg.png", foregrounds / "fg.png")
+
+    result = run(cross_product_jobs(str(backgrounds), str(foregrounds)), inputs / "out")
+    assert len(result.succeeded) == len(result.failed) == 1
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        ("out.jpg", "out.jpg"),
+        ("a/b/out.jpg", os.path.join("a", "b", "out.jpg")),
+        ("a/../out.jpg", "out.jpg"),
+        ("../out.jpg", "out.jpg"),
+        ("/tmp/elsewhere/out.jpg", "out.jpg"),
+    ],
+)
+def test_output_name(filename, expected):
+    assert output_name(filename) == expected
@@ -0,0 +1,156 @@
+"""
+Blend modes, fixed-point precision and tiled compositing
+
+The float kernel must reproduce the original per-mode blend functions
+exactly, fixed point must stay within two levels of float, and compositing
+in strips (or streaming a mix through the file) must not change a pixel.
+"""
+
+import compositing
+import numpy as np
+import photo_mixer
+import pytest
+from compositing import BLEND_MODES, blend_images, composite_tiled
+from photo_mixer import mix_photos
+from PIL import Image
+from synthetic import make_background, make_foreground
+
+MODES = ("normal", "multiply", "screen", "overlay")
+
+# Fully inside, clipped at the top-left, clipped at the bottom-right, outside
+POSITIONS = [(10, 8), (-15, -12), (60, 40), (200, 200)]
+
+
+def reference_blend(background, foreground, position, mode):
+    """The original float32 blend functions, one formula per mode."""
+    bg_array = np.array(background.convert("RGB")).astype(np.float32)
+    fg_array = np.array(foreground.convert("RGBA")).astype(np.float32)
+
+    x, y = position
+    fg_height, fg_width = fg_array.shape[:2]
+    bg_height, bg_width = bg_array.shape[:2]
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(bg_width, x + fg_width), min(bg_height, y + fg_height)
+    if x1 >= x2 or y1 >= y2:
+        return np.asarray(background.convert("RGB"))
+    fg_x1, fg_y1 = x1 - x, y1 - y
+    bg_region = bg_array[y1:y2, x1:x2]
+    fg_region = fg_array[fg_y1 : fg_y1 + (y2 - y1), fg_x1 : fg_x1 + (x2 - x1)]
+
+    alpha = fg_region[:, :, 3:4] / 255.0
+    fg_rgb = fg_region[:, :, :3]
+    if mode == "normal":
+        blended = fg_rgb
+    elif mode == "multiply":
+        blended = bg_region * fg_rgb / 255.0
+    elif mode == "screen":
+        blended = 255.0 - ((255.0 - bg_region) * (255.0 - fg_rgb) / 255.0)
+    else:
+        blended = np.where(
+            bg_region < 128.0,
+            2.0 * bg_region * fg_rgb / 255.0,
+            255.0 - 2.0 * (255.0 - bg_region) * (255.0 - fg_rgb) / 255.0,
+        )
+    bg_array[y1:y2, x1:x2] = (blended * alpha + bg_region * (1 - alpha)).astype(
+        np.uint8
+    )
+    return bg_array.astype(np.uint8)
+
+
+def random_layers(seed):
+    """Random RGB background and RGBA foreground with every alpha level."""
+    rng = np.random.default_rng(seed)
+    background = Image.fromarray(rng.integers(0, 256, (72, 96, 3), dtype=np.uint8))
+    foreground = Image.fromarray(
+        rng.integers(0, 256, (48, 64, 4), dtype=np.uint8), "RGBA"
+    )
+    return background, foreground
+
+
+def test_builtin_modes_registered():
+    assert set(MODES) <= set(BLEND_MODES)
+
+
+@pytest.mark.parametrize("position", POSITIONS)
+@pytest.mark.parametrize("mode", MODES)
+def test_float_matches_original(mode, position):
+    for seed in range(3):
+        background, foreground = random_layers(seed)
+        actual = blend_images(background, foreground, position, mode)
+        np.testing.assert_array_equal(
+            np.asarray(actual),
+            reference_blend(background, foreground, position, mode),
+        )
+
+
+@pytest.mark.parametrize("opacity", [1.0, 0.8, 0.3])
+@pytest.mark.parametrize("mode", MODES)
+def test_fixed_within_two_levels_of_float(mode, opacity):
+    for seed in range(3):
+        background, foreground = random_layers(seed)
+        expected = blend_images(background, foreground, (10, 8), mode, "float", opacity)
+        actual = blend_images(background, foreground, (10, 8), mode, "fixed", opacity)
+        difference = np.abs(
+            np.asarray(actual, dtype=np.int16) - np.asarray(expected, dtype=np.int16)
+        )
+        assert difference.max() <= 2
+
+
+@pytest.mark.parametrize("precision", ["float", "fixed"])
+@pytest.mark.parametrize("mode", MODES)
+def test_tiled_matches_untiled(mode, precision):
+    background, foreground = random_layers(4)
+    for position in POSITIONS:
+        expected = blend_images(
+            background, foreground, position, mode, precision, opacity=0.8
+        )
+        # Budgets from a single row per strip up to the whole overlap at once
+        for memory_limit in (1, 5000, 50_000, None):
+            tiled = background.copy()
+            composite_tiled(
+                tiled,
+                foreground,
+                position,
+                mode,
+                precision,
+                memory_limit=memory_limit,
+                opacity=0.8,
+            )
+            np.testing.assert_array_equal(
+                np.asarray(tiled), np.asarray(expected), err_msg=f"{memory_limit}"
+            )
+
+
+@pytest.mark.parametrize("extension", [".jpg", ".ppm", ".bmp", ".tif"])
+@pytest.mark.parametrize(
+    "blend_mode, precision, opacity",
+    [("normal", "float", 0.8), ("overlay", "fixed", 0.3)],
+)
+def test_mix_with_memory_limit_matches_whole(
+    tmp_path, monkeypatch, extension, blend_mode, precision, opacity
+):
+    # 7-row strips, so the small test images take many strips
+    for module in (compositing, photo_mixer):
+        monkeypatch.setattr(module, "strip_rows", lambda *args: 7)
+    background_path = str(tmp_path / f"background{extension}")
+    foreground_path = str(tmp_path / "foreground.png")
+    make_background(160, 120, seed=1).save(background_path)
+    make_foreground(120, 90, seed=0).save(foreground_path)
+
+    outputs = []
+    for memory_limit in (None, 1):
+        output_path = str(tmp_path / f"out_{memory_limit}.png")
+        mix_photos(
+            background_path,
+            foreground_path,
+            output_path,
+            blend_mode=blend_mode,
+            opacity=opacity,
+            verbose=False,
+            exit_on_error=False,
+            precision=precision,
+            memory_limit=memory_limit,
+        )
+        with Image.open(output_path) as output:
+            outputs.append(np.asarray(output.convert("RGB")))
+    np.testing.assert_array_equal(outputs[1], outputs[0])
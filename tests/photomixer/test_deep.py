@@ -0,0 +1,147 @@
+"""
+48-bit PNG and TIFF files keep their 16 bits through loading and mixing
+"""
+
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from color import read_deep, srgb_profile
+from encoding import encode_png16
+from photo_mixer import mix_images, mix_photos
+from PIL import Image
+from synthetic import make_foreground
+
+
+def random_deep(height=37, width=53, seed=0):
+    """uint16 RGB values with every low byte in use."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 65536, (height, width, 3), dtype=np.uint16)
+
+
+def encode_tiff48(array, compression=1, byte_order="<", rows_per_strip=8):
+    """
+    A minimal 48-bit RGB TIFF, which Pillow cannot write.
+
+    Args:
+        compression: 1 (none) or 8 (Adobe deflate)
+        byte_order: '<' (II) or '>' (MM)
+    """
+    height, width = array.shape[:2]
+    strips = []
+    for top in range(0, height, rows_per_strip):
+        data = array[top : top + rows_per_strip].astype(byte_order + "u2").tobytes()
+        strips.append(zlib.compress(data) if compression == 8 else data)
+
+    offsets, position = [], 8
+    for strip in strips:
+        offsets.append(position)
+        position += len(strip)
+    arrays = [
+        struct.pack(f"{byte_order}3H", 16, 16, 16),
+        struct.pack(f"{byte_order}{len(strips)}I", *offsets),
+        struct.pack(f"{byte_order}{len(strips)}I", *map(len, strips)),
+    ]
+    array_offsets = []
+    for data in arrays:
+        array_offsets.append(position)
+        position += len(data)
+
+    def entry(tag, kind, count, value):
+        # A single SHORT sits in the first half of the value field
+        if kind == 3 and count == 1:
+            packed = struct.pack(f"{byte_order}HH", value, 0)
+        else:
+            packed = struct.pack(f"{byte_order}I", value)
+        return struct.pack(f"{byte_order}HHI", tag, kind, count) + packed
+
+    entries = [
+        entry(256, 4, 1, width),
+        entry(257, 4, 1, height),
+        entry(258, 3, 3, array_offsets[0]),
+        entry(259, 3, 1, compression),
+        entry(262, 3, 1, 2),
+        entry(273, 4, len(strips), array_offsets[1]),
+        entry(277, 3, 1, 3),
+        entry(278, 4, 1, rows_per_strip),
+        entry(279, 4, len(strips), array_offsets[2]),
+        entry(284, 3, 1, 1),
+    ]
+    directory = (
+        struct.pack(f"{byte_order}H", len(entries))
+        + b"".join(entries)
+        + struct.pack(f"{byte_order}I", 0)
+    )
+    header = (b"II*\0" if byte_order == "<" else b"MM\0*") + struct.pack(
+        f"{byte_order}I", position
+    )
+    return header + b"".join(strips) + b"".join(arrays) + directory
+
+
+ENCODINGS = {
+    "png": encode_png16,
+    "tiff": encode_tiff48,
+    "tiff_big_endian": lambda array: encode_tiff48(array, byte_order=">"),
+    "tiff_deflate": lambda array: encode_tiff48(array, compression=8),
+}
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_read_deep_round_trip(tmp_path, encoding):
+    array = random_deep()
+    data = ENCODINGS[encoding](array)
+    path = tmp_path / "deep"
+    path.write_bytes(data)
+
+    for source in (data, str(path), io.BytesIO(data)):
+        image = read_deep(source)
+        assert image.array.dtype == np.uint16
+        np.testing.assert_array_equal(image.array, array)
+
+
+def test_read_deep_keeps_profile():
+    image = read_deep(encode_png16(random_deep(), icc_profile=srgb_profile()))
+    assert image.info["icc_profile"] == srgb_profile()
+
+
+def test_read_deep_skips_8bit():
+    encoded = io.BytesIO()
+    make_foreground(20, 10, seed=0).save(encoded, "PNG")
+    assert read_deep(encoded.getvalue()) is None
+
+
+@pytest.mark.parametrize("encoding", ["png", "tiff"])
+def test_mix_keeps_16bit_background(tmp_path, encoding):
+    array = random_deep(120, 160, seed=1)
+    background_path = tmp_path / f"background.{encoding}"
+    background_path.write_bytes(ENCODINGS[encoding](array))
+    foreground_path = str(tmp_path / "foreground.png")
+    make_foreground(80, 60, seed=0).save(foreground_path)
+
+    # Pixels outside the foreground keep all 16 bits
+    result = mix_images(
+        str(background_path),
+        foreground_path,
+        precision="linear",
+        output_bits=16,
+    )
+    np.testing.assert_array_equal(result.array[:8], array[:8])
+    assert not np.array_equal(result.array, array)
+
+    # A fully transparent foreground leaves the whole file unchanged
+    output_path = str(tmp_path / "out.png")
+    mix_photos(
+        str(background_path),
+        foreground_path,
+        output_path,
+        opacity=0.0,
+        verbose=False,
+        exit_on_error=False,
+        precision="linear",
+        output_bits=16,
+    )
+    with Image.open(output_path) as output:
+        assert output.format == "PNG"
+    np.testing.assert_array_equal(read_deep(output_path).array, array)
@@ -0,0 +1,26 @@
+"""
+Importing the mixer leaves the mode modules (and NumPy and Pillow) unloaded
+"""
+
+import os
+import subprocess
+import sys
+
+import photo_mixer
+
+MODE_MODULES = ("batch", "sequence", "server", "pool", "numpy", "PIL")
+
+
+def test_mode_modules_load_on_demand():
+    script = (
+        "import sys; import photo_mixer; "
+        f"print(' '.join(m for m in {MODE_MODULES!r} if m in sys.modules))"
+    )
+    loaded = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(photo_mixer.__file__),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    assert loaded == []
@@ -0,0 +1,112 @@
+"""
+MixPool results match mix_images, and no shared files outlive the pool
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pool
+import pytest
+from photo_mixer import mix_images
+from pool import SHARED_DIR, MixPool, SharedArray
+from synthetic import make_background, make_foreground
+
+
+def pool_files():
+    return {name for name in os.listdir(SHARED_DIR) if name.startswith("photomixer-")}
+
+
+@pytest.fixture(scope="module")
+def layers():
+    background = np.asarray(make_background(160, 120, seed=1))
+    foregrounds = [np.asarray(make_foreground(120, 90, seed=seed)) for seed in (0, 2)]
+    return background, foregrounds
+
+
+@pytest.mark.parametrize("transport", pool.TRANSPORTS)
+def test_results_match_mix_images(layers, transport):
+    background, foregrounds = layers
+    before = pool_files()
+    with MixPool(workers=1, transport=transport) as mix_pool:
+        shared = mix_pool.share(background)
+        results = list(mix_pool.map((shared, fg) for fg in foregrounds))
+    assert pool_files() == before
+
+    # Results stay readable after their files are gone
+    for result, foreground in zip(results, foregrounds, strict=True):
+        expected = np.asarray(mix_images(background, foreground))
+        np.testing.assert_array_equal(np.asarray(result.array), expected)
+
+
+def test_close_removes_uncollected_results(layers):
+    background, foregrounds = layers
+    before = pool_files()
+    mix_pool = MixPool(workers=1)
+    # A result a worker wrote and handed over, but nobody collected
+    leftover = SharedArray.from_array(background, mix_pool.directory)
+    leftover.disown()
+    assert os.path.exists(leftover.path)
+    next(mix_pool.map([(background, foregrounds[0])]))
+
+    mix_pool.close()
+    assert not os.path.exists(mix_pool.directory)
+    assert pool_files() == before
+
+
+def test_dropped_pool_removes_its_files(layers):
+    background, _ = layers
+    mix_pool = MixPool(workers=1)
+    directory = mix_pool.directory
+    mix_pool.share(background).disown()
+    mix_pool.executor.shutdown(wait=True)
+    del mix_pool
+    assert not os.path.exists(directory)
+
+
+@pytest.mark.parametrize("transport", pool.TRANSPORTS)
+def test_result_errors_reach_the_future(layers, monkeypatch, transport):
+    background, foregrounds = layers
+    with MixPool(workers=1, transport=transport) as mix_pool:
+        # Start the worker first, so only this process sees the patches
+        next(mix_pool.map([(background, foregrounds[0])]))
+        inputs = [background, foregrounds[1]]
+        if transport == "shared":
+            inputs = [mix_pool.share(image) for image in inputs]
+
+        def unmappable(self):
+            raise OSError("cannot map result")
+
+        def unpicklable(data):
+            raise pickle.UnpicklingError("bad result")
+
+        monkeypatch.setattr(SharedArray, "array", property(unmappable))
+        if transport == "pickle":
+            monkeypatch.setattr(pool.pickle, "loads", unpicklable)
+        future = mix_pool.submit(*inputs)
+        with pytest.raises(Exception, match="cannot map result|bad result"):
+            future.result(timeout=30)
+        monkeypatch.undo()
+
+
+def test_map_bounds_jobs_in_flight(layers):
+    background, foregrounds = layers
+    taken = 0
+
+    def pairs():
+        nonlocal taken
+        for index in range(12):
+            taken += 1
+            yield background, foregrounds[index % 2]
+
+    workers = 2
+    limit = pool.IN_FLIGHT_PER_WORKER * workers
+    with MixPool(workers=workers) as mix_pool:
+        yielded = 0
+        for _ in mix_pool.map(pairs()):
+            yielded += 1
+            # One pair is taken but not yet submitted when a result is yielded
+            assert taken - yielded <= limit
+            # Only the queued jobs' inputs are in shared memory
+            assert len(os.listdir(mix_pool.directory)) <= 2 * limit
+    assert yielded == taken == 12
@@ -0,0 +1,101 @@
+"""
+remove_background against the original SciPy implementation
+
+The rewrite (fused integer passes, no morphology) must give exactly the
+masks of benchmarks/reference.py for every threshold, including when the
+pixels are classified on several threads and when the masks come from a
+ThresholdSweep.
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("scipy")
+
+import parallel
+from photo_mixer import ThresholdSweep, remove_background
+from reference import remove_background as reference_remove_background
+from synthetic import make_foreground
+
+# The reference divides by zero at threshold 0 (its soft mask is unused there)
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+THRESHOLDS = range(101)
+
+
+def random_images():
+    """Images that exercise every branch: noise, light and gray backdrops, tiny sizes."""
+    rng = np.random.default_rng(5)
+    images = [
+        ("studio", make_foreground(64, 48, seed=0)),
+        ("portrait", make_foreground(40, 72, seed=1)),
+        ("tiny", make_foreground(9, 7, seed=2)),
+        ("pixel", Image.new("RGB", (1, 1), (200, 200, 200))),
+        ("noise", Image.fromarray(rng.integers(0, 256, (50, 70, 3), dtype=np.uint8))),
+    ]
+
+    # Random backdrop color with noisy blobs, light or gray or saturated
+    for index, (low, high) in enumerate([(150, 256), (100, 200), (0, 256)]):
+        backdrop = rng.integers(low, high, 3)
+        pixels = np.empty((60, 80, 3), dtype=np.int16)
+        pixels[:] = backdrop
+        pixels += rng.integers(-12, 13, pixels.shape)
+        for _ in range(6):
+            y, x = rng.integers(0, 60), rng.integers(0, 80)
+            pixels[y : y + 15, x : x + 20] = rng.integers(0, 256, 3)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        images.append((f"backdrop{index}", image))
+
+    # Low-saturation light pixels sit on the lightness and saturation cutoffs
+    gray = rng.integers(150, 230, (40, 40, 1)) + rng.integers(-15, 16, (40, 40, 3))
+    images.append(("gray", Image.fromarray(np.clip(gray, 0, 255).astype(np.uint8))))
+    rgba = make_foreground(30, 30, seed=3).convert("RGBA")
+    rgba.putalpha(128)
+    images.append(("rgba", rgba))
+    return images
+
+
+IMAGES = random_images()
+
+
+@pytest.fixture(scope="module")
+def expected():
+    """Reference RGBA output for every image and threshold."""
+    return {
+        (name, threshold): np.asarray(reference_remove_background(image, threshold))
+        for name, image in IMAGES
+        for threshold in THRESHOLDS
+    }
+
+
+@pytest.mark.parametrize("name, image", IMAGES, ids=[name for name, _ in IMAGES])
+def test_matches_reference(name, image, expected):
+    for threshold in THRESHOLDS:
+        actual = np.asarray(remove_background(image, threshold))
+        np.testing.assert_array_equal(
+            actual, expected[name, threshold], err_msg=f"threshold {threshold}"
+        )
+
+
+@pytest.mark.parametrize("threads", [2, 3, 7])
+@pytest.mark.parametrize("name, image", IMAGES, ids=[name for name, _ in IMAGES])
+def test_threads_match_reference(name, image, threads, expected, monkeypatch):
+    # Split even these small images into bands
+    monkeypatch.setattr(parallel, "MIN_BAND_PIXELS", 1)
+    for threshold in (0, 15, 30, 60, 100):
+        actual = np.asarray(remove_background(image, threshold, threads=threads))
+        np.testing.assert_array_equal(
+            actual, expected[name, threshold], err_msg=f"threshold {threshold}"
+        )
+
+
+@pytest.mark.parametrize("name, image", IMAGES, ids=[name for name, _ in IMAGES])
+def test_sweep_matches_reference(name, image, expected):
+    sweep = ThresholdSweep(image, THRESHOLDS)
+    for threshold in THRESHOLDS:
+        np.testing.assert_array_equal(
+            sweep.alpha(threshold),
+            expected[name, threshold][:, :, 3],
+            err_msg=f"threshold {threshold}",
+        )
@@ -0,0 +1,123 @@
+"""
+Server mode: request defaults from the command line, and HTTP keep-alive
+"""
+
+import asyncio
+import io
+import sys
+
+import photo_mixer
+import pytest
+import server
+from encoding import preset
+from photo_mixer import mix_to_bytes
+from PIL import Image
+from server import DEFAULT_FIELDS, MixServer, Request, mix_arguments
+from synthetic import make_background, make_foreground
+
+UPLOADS = {"background": b"bg", "foreground": b"fg"}
+
+
+def serve_arguments(monkeypatch, *argv):
+    """Keyword arguments `photo_mixer.py --serve ...` hands to server.serve."""
+    calls = []
+    monkeypatch.setattr(server, "serve", lambda *args, **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(sys, "argv", ["photo_mixer.py", "--serve", *argv])
+    photo_mixer.main()
+    return calls[0]
+
+
+def test_bare_request_uses_builtin_defaults():
+    _, _, format, quality, options = mix_arguments(UPLOADS)
+    assert (format, quality) == ("JPEG", 95)
+    assert {name: options[name] for name in DEFAULT_FIELDS} == DEFAULT_FIELDS
+    assert options["save_options"] == {"optimize": False, "progressive": False}
+
+
+def test_command_line_sets_request_defaults(monkeypatch):
+    kwargs = serve_arguments(
+        monkeypatch,
+        "--blend-mode",
+        "multiply",
+        "--opacity",
+        "0.3",
+        "--bg-threshold",
+        "45",
+        "--preset",
+        "web",
+        "--quality",
+        "70",
+    )
+    _, _, format, quality, options = mix_arguments(
+        UPLOADS, kwargs["defaults"], kwargs["output_options"]
+    )
+    assert options["blend_mode"] == "multiply"
+    assert options["opacity"] == pytest.approx(0.3)
+    assert options["bg_threshold"] == 45
+    assert (format, quality) == ("JPEG", 70)
+    assert options["save_options"] == {"optimize": True, "progressive": True}
+
+
+def test_request_fields_override_defaults(monkeypatch):
+    kwargs = serve_arguments(monkeypatch, "--format", "webp", "--opacity", "0.3")
+    fields = {**UPLOADS, "opacity": b"0.9", "format": b"png"}
+    _, _, format, _, options = mix_arguments(
+        fields, kwargs["defaults"], kwargs["output_options"]
+    )
+    assert options["opacity"] == pytest.approx(0.9)
+    assert format == "PNG"
+    assert options["save_options"] == {"optimize": False, "compress_level": 6}
+
+
+def test_preset_format_is_the_default():
+    _, _, format, quality, options = mix_arguments(
+        UPLOADS, output_options=preset("small")
+    )
+    assert (format, quality) == ("WEBP", 80)
+    assert options["save_options"] == {"method": 6, "lossless": False}
+
+
+def test_save_options_reach_the_encoder():
+    background = make_background(64, 48, seed=1)
+    foreground = make_foreground(40, 30, seed=0)
+    data = mix_to_bytes(background, foreground, save_options={"progressive": True})
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.info.get("progressive")
+
+
+@pytest.mark.parametrize(
+    "version, connection, keep_alive",
+    [
+        ("HTTP/1.1", None, True),
+        ("HTTP/1.1", "close", False),
+        ("HTTP/1.1", "Upgrade, Close", False),
+        ("HTTP/1.0", None, False),
+        ("HTTP/1.0", "Keep-Alive", True),
+        ("HTTP/1.0", "close", False),
+    ],
+)
+def test_keep_alive_follows_http_version(version, connection, keep_alive):
+    headers = {"connection": connection} if connection else {}
+    request = Request("GET", "/health", headers, b"", version)
+    assert request.keep_alive is keep_alive
+
+
+def test_http10_connection_is_closed_after_response():
+    async def exchange(request_head):
+        mix_server = MixServer(workers=1)
+        listener = await mix_server.start("127.0.0.1", 0)
+        try:
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request_head)
+            # Reads up to EOF, so this only returns if the server closes
+            response = await asyncio.wait_for(reader.read(), timeout=10)
+            writer.close()
+            return response
+        finally:
+            listener.close()
+            mix_server.close()
+
+    response = asyncio.run(exchange(b"GET /health HTTP/1.0\r\n\r\n"))
+    assert response.startswith(b"HTTP/1.1 200")
+    assert b"Connection: close" in response